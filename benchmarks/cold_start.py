@@ -0,0 +1,784 @@
+"""Cold start benchmark for the AutoBot lambda handlers.
+
+Each run imports lambda_function / response_sub_handler in a brand new interpreter and drives one
+request through `handler` / `main`, so every run pays a real cold start. Secrets Manager, DynamoDB,
+Lambda (lazy listener invokes) and the Slack API are replaced with local stand-ins so this runs offline.
+Libraries that aren't installed at all are replaced with stand-in modules and flagged in the report.
+
+Reported per target:
+- Import time per module (inclusive of the modules it imports, and "self" time without them)
+- Time spent in get_secret(), Bolt App construction and SlackRequestHandler creation
+- Time for the ack path of the first request (the part that has to beat Slack's 3 second limit)
+  and for the lazy follow-up invocation
+
+Usage:
+    python benchmarks/cold_start.py --runs 5 --output bench_report.json
+    python benchmarks/cold_start.py --latency-ms 40   # pretend every AWS/Slack call takes 40ms
+"""
+import argparse
+import datetime
+import hashlib
+import hmac
+import http.cookiejar
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from urllib.parse import urlparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = ["lambda_function", "response_sub_handler"]
+STAND_IN_CANDIDATES = ["boto3", "botocore", "requests", "slack_sdk", "slack_bolt", "pymongo"]
+
+BENCH_USER = "UBENCH0001"
+BENCH_CHANNEL = "CBENCH0001"
+SIGNING_SECRET = "benchmark-signing-secret"
+# Every key any module reads out of the secret
+FAKE_SECRETS = {
+    key: f"benchmark-{key}"
+    for key in [
+        "token",
+        "signing_secret",
+        "*****_key_us",
+        "*****_key_eu",
+        "***_auth",
+        "app_id",
+        "app_key",
+        "us_***_api_key",
+        "eu_***_api_key",
+        "stg_***_api_key",
+        "sms_primary_user",
+        "sms_primary_pass",
+        "DD-API-KEY",
+        "DD-APPLICATION-KEY",
+        "alertsite_user",
+        "alertsite_pass",
+        "sumo_access_id",
+        "sumo_access_key",
+        "digicert_api_key",
+    ]
+}
+FAKE_SECRETS["signing_secret"] = SIGNING_SECRET
+
+
+# ---------------------------------------------------------------------------------------------
+# Child process side: stand-ins, import timing and phase timing
+# ---------------------------------------------------------------------------------------------
+
+
+class Recorder:
+    """Collects everything a single cold start run measures"""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.imports = {}  # module -> {"inclusive_ms", "self_ms"}
+        self.phases = {}  # phase -> {"ms", "count"}
+        self.calls = {}  # stand-in service -> number of calls
+        self.lazy_invocations = []
+        self._stack = []
+
+    def phase(self, name: str, seconds: float) -> None:
+        entry = self.phases.setdefault(name, {"ms": 0.0, "count": 0})
+        entry["ms"] += seconds * 1000
+        entry["count"] += 1
+
+    def call(self, service: str) -> None:
+        """Counts a call to a stand-in service and simulates network latency"""
+        self.calls[service] = self.calls.get(service, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def start_import(self) -> None:
+        self._stack.append(0.0)
+
+    def end_import(self, name: str, seconds: float) -> None:
+        children = self._stack.pop()
+        if self._stack:
+            self._stack[-1] += seconds
+        self.imports[name] = {
+            "inclusive_ms": seconds * 1000,
+            "self_ms": max(seconds - children, 0.0) * 1000,
+        }
+
+
+class TimedLoader:
+    """Wraps a module loader to time exec_module and run any post-import patches"""
+
+    def __init__(self, loader, recorder, post_import) -> None:
+        self._loader = loader
+        self._recorder = recorder
+        self._post_import = post_import
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._recorder.start_import()
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._recorder.end_import(module.__name__, time.perf_counter() - start)
+        patch = self._post_import.get(module.__name__)
+        if patch is not None:
+            patch(module)
+
+
+class ImportTimer:
+    """Meta path finder that hands every other finder's spec back with a TimedLoader"""
+
+    def __init__(self, recorder, post_import) -> None:
+        self.recorder = recorder
+        self.post_import = post_import
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = TimedLoader(spec.loader, self.recorder, self.post_import)
+            return spec
+        return None
+
+
+def timed(recorder, phase, func):
+    """Wraps a callable so every call is added to the given phase"""
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            recorder.phase(phase, time.perf_counter() - start)
+
+    wrapper.__name__ = getattr(func, "__name__", phase)
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def fake_slack_api(api_method: str, params: dict) -> dict:
+    """Canned Slack Web API answers"""
+    params = params or {}
+    if api_method == "auth.test":
+        return {
+            "ok": True,
+            "url": "https://benchmark.slack.com/",
+            "team": "benchmark",
+            "user": "autobot",
+            "team_id": "TBENCH0001",
+            "user_id": "UBOT000001",
+            "bot_id": "BBOT000001",
+        }
+    if api_method == "usergroups.users.list":
+        return {"ok": True, "users": [BENCH_USER]}
+    if api_method in ["chat.postMessage", "chat.update"]:
+        return {"ok": True, "channel": params.get("channel", BENCH_CHANNEL), "ts": "1700000000.000100"}
+    return {"ok": True}
+
+
+class FakeSecretsManager:
+    def __init__(self, recorder) -> None:
+        self.recorder = recorder
+
+    def get_secret_value(self, SecretId):  # pylint: disable=invalid-name
+        self.recorder.call("secretsmanager")
+        return {"SecretString": json.dumps(FAKE_SECRETS)}
+
+
+class FakeTable:
+    def __init__(self, recorder, name) -> None:
+        self.recorder = recorder
+        self.name = name
+
+    def get_item(self, Key, **kwargs):  # pylint: disable=invalid-name
+        self.recorder.call("dynamodb")
+        return {
+            "Item": {
+                "id": Key["id"],
+                "channel_id": BENCH_CHANNEL,
+                "delivery_url": "https://example.invalid/report",
+            }
+        }
+
+    def put_item(self, Item, **kwargs):  # pylint: disable=invalid-name
+        self.recorder.call("dynamodb")
+        return {}
+
+    def update_item(self, **kwargs):
+        self.recorder.call("dynamodb")
+        return {"Attributes": {}}
+
+    def delete_item(self, **kwargs):
+        self.recorder.call("dynamodb")
+        return {}
+
+
+class FakeDynamoDB:
+    def __init__(self, recorder) -> None:
+        self.recorder = recorder
+        self.meta = types.SimpleNamespace(client=self)
+
+    def Table(self, name):  # pylint: disable=invalid-name
+        return FakeTable(self.recorder, name)
+
+    def batch_write_item(self, RequestItems, **kwargs):  # pylint: disable=invalid-name
+        self.recorder.call("dynamodb")
+        return {"UnprocessedItems": {}}
+
+
+class FakeLambda:
+    """Stands in for the lambda client Bolt uses to kick off lazy listeners"""
+
+    def __init__(self, recorder) -> None:
+        self.recorder = recorder
+
+    def invoke(self, FunctionName, InvocationType, Payload):  # pylint: disable=invalid-name
+        self.recorder.call("lambda")
+        self.recorder.lazy_invocations.append(json.loads(Payload))
+        return {"StatusCode": 202}
+
+
+class FakeAWSClient:
+    """Anything else boto3 might be asked for"""
+
+    def __init__(self, recorder, service) -> None:
+        self.recorder = recorder
+        self.service = service
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.recorder.call(self.service)
+            return {}
+
+        return call
+
+
+def make_aws_client(recorder, service_name):
+    if service_name == "secretsmanager":
+        return FakeSecretsManager(recorder)
+    if service_name == "lambda":
+        return FakeLambda(recorder)
+    if service_name == "dynamodb":
+        return FakeDynamoDB(recorder)
+    return FakeAWSClient(recorder, service_name)
+
+
+class FakeHTTPResponse:
+    """Minimal requests.Response look-alike used when requests itself is a stand-in"""
+
+    def __init__(self, url, data) -> None:
+        self.url = url
+        self.status_code = 200
+        self.headers = {"Content-Type": "application/json"}
+        self.text = json.dumps(data)
+        self.content = self.text.encode()
+        self.elapsed = datetime.timedelta(0)
+        self._data = data
+
+    def json(self, **kwargs):
+        return self._data
+
+    def raise_for_status(self):
+        return None
+
+
+def fake_http(recorder, method, url, kwargs):
+    """Answers outbound HTTP. Slack gets canned Web API answers, everyone else gets {"ok": true}"""
+    parsed = urlparse(url)
+    if parsed.hostname and parsed.hostname.endswith("slack.com"):
+        recorder.call("slack")
+        api_method = parsed.path.rsplit("/", 1)[-1]
+        return fake_slack_api(api_method, kwargs.get("json") or kwargs.get("params") or kwargs.get("data"))
+    recorder.call(parsed.hostname or "http")
+    return {"ok": True}
+
+
+def build_stand_in_modules(recorder) -> dict:
+    """Minimal modules for libraries that aren't installed so the harness still runs"""
+    modules = {}
+
+    boto3 = types.ModuleType("boto3")
+    boto3_session = types.ModuleType("boto3.session")
+
+    class Session:
+        def client(self, service_name, **kwargs):
+            return make_aws_client(recorder, service_name)
+
+        def resource(self, service_name, **kwargs):
+            return make_aws_client(recorder, service_name)
+
+    boto3_session.Session = Session
+    boto3.session = boto3_session
+    boto3.client = lambda service_name, **kwargs: make_aws_client(recorder, service_name)
+    boto3.resource = lambda service_name, **kwargs: make_aws_client(recorder, service_name)
+    modules.update({"boto3": boto3, "boto3.session": boto3_session})
+
+    botocore = types.ModuleType("botocore")
+    botocore_exceptions = types.ModuleType("botocore.exceptions")
+
+    class ClientError(Exception):
+        def __init__(self, error_response, operation_name) -> None:
+            super().__init__(f"{operation_name}: {error_response}")
+            self.response = error_response
+
+    class ReadTimeoutError(Exception):
+        def __init__(self, **kwargs) -> None:
+            super().__init__(f"Read timeout on endpoint URL: {kwargs.get('endpoint_url')}")
+
+    class EndpointConnectionError(Exception):
+        def __init__(self, **kwargs) -> None:
+            super().__init__(f"Could not connect to the endpoint URL: {kwargs.get('endpoint_url')}")
+
+    botocore_exceptions.ClientError = ClientError
+    botocore_exceptions.ReadTimeoutError = ReadTimeoutError
+    botocore_exceptions.EndpointConnectionError = EndpointConnectionError
+    botocore.exceptions = botocore_exceptions
+    botocore_config = types.ModuleType("botocore.config")
+    botocore_config.Config = lambda **kwargs: types.SimpleNamespace(**kwargs)
+    botocore.config = botocore_config
+    modules.update(
+        {"botocore": botocore, "botocore.exceptions": botocore_exceptions, "botocore.config": botocore_config}
+    )
+
+    requests = types.ModuleType("requests")
+    requests_exceptions = types.ModuleType("requests.exceptions")
+
+    class RequestException(IOError):
+        pass
+
+    requests_exceptions.RequestException = RequestException
+    requests_exceptions.HTTPError = type("HTTPError", (RequestException,), {})
+    requests_exceptions.ConnectionError = type("ConnectionError", (RequestException,), {})
+    requests_exceptions.Timeout = type("Timeout", (RequestException,), {})
+
+    class RequestsSession:
+        def __init__(self) -> None:
+            self.headers = {}
+            self.auth = None
+            self.verify = True
+            self.cookies = http.cookiejar.CookieJar()
+            self.hooks = {"response": []}
+
+        def mount(self, prefix, adapter):
+            return None
+
+        def request(self, method, url, **kwargs):
+            response = FakeHTTPResponse(url, fake_http(recorder, method, url, kwargs))
+            for hook in self.hooks.get("response", []):
+                hook(response)
+            return response
+
+        def get(self, url, **kwargs):
+            return self.request("GET", url, **kwargs)
+
+        def head(self, url, **kwargs):
+            return self.request("HEAD", url, **kwargs)
+
+        def post(self, url, **kwargs):
+            return self.request("POST", url, **kwargs)
+
+        def put(self, url, **kwargs):
+            return self.request("PUT", url, **kwargs)
+
+        def patch(self, url, **kwargs):
+            return self.request("PATCH", url, **kwargs)
+
+        def delete(self, url, **kwargs):
+            return self.request("DELETE", url, **kwargs)
+
+        def close(self):
+            return None
+
+    requests.Session = RequestsSession
+    requests.Response = FakeHTTPResponse
+    requests.exceptions = requests_exceptions
+    for name in ["RequestException", "HTTPError", "ConnectionError", "Timeout"]:
+        setattr(requests, name, getattr(requests_exceptions, name))
+    for verb in ["get", "post", "put", "patch", "delete"]:
+        setattr(requests, verb, getattr(RequestsSession(), verb))
+    requests_adapters = types.ModuleType("requests.adapters")
+    requests_adapters.HTTPAdapter = lambda **kwargs: None
+    requests.adapters = requests_adapters
+    modules.update(
+        {"requests": requests, "requests.exceptions": requests_exceptions, "requests.adapters": requests_adapters}
+    )
+
+    slack_sdk = types.ModuleType("slack_sdk")
+    slack_sdk_errors = types.ModuleType("slack_sdk.errors")
+
+    class SlackApiError(Exception):
+        def __init__(self, message, response) -> None:
+            super().__init__(message)
+            self.response = response
+
+    slack_sdk_errors.SlackApiError = SlackApiError
+
+    class WebClient:
+        def __init__(self, token=None, **kwargs) -> None:
+            self.token = token
+
+        def api_call(self, api_method, **kwargs):
+            recorder.call("slack")
+            return fake_slack_api(api_method, kwargs.get("json") or kwargs.get("params"))
+
+        def __getattr__(self, name):
+            return lambda **kwargs: self.api_call(name.replace("_", "."), json=kwargs)
+
+    slack_sdk.WebClient = WebClient
+    slack_sdk.errors = slack_sdk_errors
+    modules.update({"slack_sdk": slack_sdk, "slack_sdk.errors": slack_sdk_errors})
+
+    slack_bolt = types.ModuleType("slack_bolt")
+    slack_bolt_adapter = types.ModuleType("slack_bolt.adapter")
+    slack_bolt_lambda = types.ModuleType("slack_bolt.adapter.aws_lambda")
+    slack_bolt_authorization = types.ModuleType("slack_bolt.authorization")
+
+    class App:
+        def __init__(self, **kwargs) -> None:
+            self.client = WebClient(token=kwargs.get("token"))
+            # Like Bolt, a token given up front is checked straight away, an authorize callback isn't
+            if kwargs.get("token"):
+                self.client.auth_test()
+
+        def _register(self, *args, **kwargs):
+            def register(*functions, ack=None, lazy=None, **kwargs):
+                return ack or (functions[0] if functions else None)
+
+            return register
+
+        event = action = options = command = view = _register
+
+    class SlackRequestHandler:
+        def __init__(self, app) -> None:
+            self.app = app
+
+        def handle(self, event, context):
+            return {"statusCode": 200, "body": ""}
+
+    class AuthorizeResult(dict):
+        def __init__(self, **kwargs) -> None:
+            super().__init__(**kwargs)
+
+    slack_bolt.App = App
+    slack_bolt_lambda.SlackRequestHandler = SlackRequestHandler
+    slack_bolt_authorization.AuthorizeResult = AuthorizeResult
+    modules.update(
+        {
+            "slack_bolt": slack_bolt,
+            "slack_bolt.adapter": slack_bolt_adapter,
+            "slack_bolt.adapter.aws_lambda": slack_bolt_lambda,
+            "slack_bolt.authorization": slack_bolt_authorization,
+        }
+    )
+
+    pymongo = types.ModuleType("pymongo")
+    pymongo_errors = types.ModuleType("pymongo.errors")
+    pymongo_errors.ConnectionFailure = type("ConnectionFailure", (Exception,), {})
+    pymongo.errors = pymongo_errors
+    pymongo.ASCENDING = 1
+    pymongo.MongoClient = lambda *args, **kwargs: types.SimpleNamespace(close=lambda: None)
+    modules.update({"pymongo": pymongo, "pymongo.errors": pymongo_errors})
+
+    return modules
+
+
+def install_stand_ins(recorder) -> list:
+    """Puts stand-in modules in place for any candidate library that isn't installed"""
+    missing = [name for name in STAND_IN_CANDIDATES if importlib.util.find_spec(name) is None]
+    if missing:
+        for name, module in build_stand_in_modules(recorder).items():
+            if name.split(".")[0] in missing:
+                sys.modules[name] = module
+    if "slack_bolt" in missing:
+        app_class = sys.modules["slack_bolt"].App
+        app_class.__init__ = timed(recorder, "bolt_app_init", app_class.__init__)
+        handler_class = sys.modules["slack_bolt.adapter.aws_lambda"].SlackRequestHandler
+        handler_class.__init__ = timed(recorder, "slack_request_handler_init", handler_class.__init__)
+    return missing
+
+
+def build_post_import_patches(recorder) -> dict:
+    """Patches applied to the real libraries (and our own modules) right after they are imported"""
+
+    def patch_boto3(module):
+        module.session.Session.client = lambda self, service_name, **kwargs: make_aws_client(recorder, service_name)
+        module.session.Session.resource = lambda self, service_name, **kwargs: make_aws_client(recorder, service_name)
+        module.client = lambda service_name, **kwargs: make_aws_client(recorder, service_name)
+        module.resource = lambda service_name, **kwargs: make_aws_client(recorder, service_name)
+
+    def patch_requests(module):
+        def request(self, method, url, **kwargs):
+            data = fake_http(recorder, method, url, kwargs)
+            response = module.Response()
+            response.status_code = 200
+            response._content = json.dumps(data).encode()  # pylint: disable=protected-access
+            response.url = url
+            response.encoding = "utf-8"
+            response.headers["Content-Type"] = "application/json"
+            response.elapsed = datetime.timedelta(0)
+            for hook in (kwargs.get("hooks") or {}).get("response", []) + self.hooks.get("response", []):
+                hook(response)
+            return response
+
+        module.Session.request = request
+
+    def patch_slack_sdk_base_client(module):
+        def api_call(self, api_method, *, http_verb="POST", **kwargs):
+            recorder.call("slack")
+            data = fake_slack_api(api_method, kwargs.get("json") or kwargs.get("params") or kwargs.get("data"))
+            from slack_sdk.web.slack_response import SlackResponse  # pylint: disable=import-outside-toplevel
+
+            return SlackResponse(
+                client=self,
+                http_verb=http_verb,
+                api_url=f"https://slack.com/api/{api_method}",
+                req_args={},
+                data=data,
+                headers={},
+                status_code=200,
+            )
+
+        module.BaseClient.api_call = api_call
+
+    def patch_bolt_app(module):
+        module.App.__init__ = timed(recorder, "bolt_app_init", module.App.__init__)
+
+    def patch_bolt_lambda_handler(module):
+        module.SlackRequestHandler.__init__ = timed(
+            recorder, "slack_request_handler_init", module.SlackRequestHandler.__init__
+        )
+
+    def patch_get_secret(module):
+        module.get_secret = timed(recorder, "get_secret", module.get_secret)
+
+    return {
+        "boto3": patch_boto3,
+        "requests": patch_requests,
+        "slack_sdk.web.base_client": patch_slack_sdk_base_client,
+        "slack_bolt.app.app": patch_bolt_app,
+        "slack_bolt.adapter.aws_lambda.handler": patch_bolt_lambda_handler,
+        "scripts.get_secret": patch_get_secret,
+    }
+
+
+class FakeLambdaContext:
+    function_name = "autobot-benchmark"
+    aws_request_id = "benchmark"
+    invoked_function_arn = "arn:aws:lambda:local:000000000000:function:autobot-benchmark"
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+
+def build_slack_event() -> dict:
+    """A signed API Gateway event carrying an app_mention, as Slack would send it"""
+    body = json.dumps(
+        {
+            "type": "event_callback",
+            "token": "benchmark",
+            "team_id": "TBENCH0001",
+            "api_app_id": "ABENCH0001",
+            "event_id": "EvBENCH0001",
+            "event_time": int(time.time()),
+            "event": {
+                "type": "app_mention",
+                "user": BENCH_USER,
+                "text": "<@***************** help",
+                "channel": BENCH_CHANNEL,
+                "ts": "1700000000.000100",
+                "event_ts": "1700000000.000100",
+            },
+        }
+    )
+    timestamp = str(int(time.time()))
+    signature = hmac.new(
+        SIGNING_SECRET.encode(), f"v0:{timestamp}:{body}".encode(), hashlib.sha256
+    ).hexdigest()
+    return {
+        "requestContext": {"httpMethod": "POST"},
+        "headers": {
+            "content-type": "application/json",
+            "x-slack-request-timestamp": timestamp,
+            "x-slack-signature": f"v0={signature}",
+        },
+        "body": body,
+        "isBase64Encoded": False,
+    }
+
+
+def build_confirmation_event() -> dict:
+    """A *** response subscription webhook for one confirmation"""
+    body = {
+        "id": 123456789,
+        "organizationId": "*****************",
+        "name": "SMS",
+        "responses": [{"externalId": BENCH_USER}],
+    }
+    return {"body": json.dumps(body)}
+
+
+def run_child(target: str, latency_ms: float) -> dict:
+    """One cold start of the given target. Runs inside a fresh interpreter."""
+    recorder = Recorder(latency_ms / 1000)
+    sys.path.insert(0, REPO_ROOT)
+    stand_ins = install_stand_ins(recorder)
+    sys.meta_path.insert(0, ImportTimer(recorder, build_post_import_patches(recorder)))
+    context = FakeLambdaContext()
+
+    # The bot prints a lot; keep it out of the way of the report.
+    real_stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        start = time.perf_counter()
+        module = __import__(target)
+        recorder.phase("module_import", time.perf_counter() - start)
+
+        if target == "lambda_function":
+            start = time.perf_counter()
+            module.handler(build_slack_event(), context)
+            recorder.phase("first_request_ack", time.perf_counter() - start)
+            # Replay what Bolt handed to the lambda client, i.e. the lazy second invocation
+            for payload in list(recorder.lazy_invocations):
+                start = time.perf_counter()
+                module.handler(payload, context)
+                recorder.phase("lazy_invocation", time.perf_counter() - start)
+        else:
+            start = time.perf_counter()
+            module.main(build_confirmation_event(), context)
+            recorder.phase("first_request", time.perf_counter() - start)
+    finally:
+        sys.stdout = real_stdout
+
+    return {
+        "target": target,
+        "stand_in_modules": stand_ins,
+        "imports": recorder.imports,
+        "phases": recorder.phases,
+        "calls": recorder.calls,
+    }
+
+
+# ---------------------------------------------------------------------------------------------
+# Parent process side: run children, aggregate and report
+# ---------------------------------------------------------------------------------------------
+
+
+def median(values: list) -> float:
+    return round(statistics.median(values), 3) if values else 0.0
+
+
+def aggregate(runs: list, top: int) -> dict:
+    """Medians across runs for every phase and module"""
+    phase_names = sorted({name for run in runs for name in run["phases"]})
+    phases = {
+        name: {
+            "median_ms": median([run["phases"][name]["ms"] for run in runs if name in run["phases"]]),
+            "count": max(run["phases"].get(name, {"count": 0})["count"] for run in runs),
+        }
+        for name in phase_names
+    }
+    module_names = {name for run in runs for name in run["imports"]}
+    imports = {
+        name: {
+            "inclusive_ms": median([run["imports"][name]["inclusive_ms"] for run in runs if name in run["imports"]]),
+            "self_ms": median([run["imports"][name]["self_ms"] for run in runs if name in run["imports"]]),
+        }
+        for name in module_names
+    }
+    ranked = sorted(imports.items(), key=lambda item: item[1]["inclusive_ms"], reverse=True)
+    return {
+        "runs": len(runs),
+        "stand_in_modules": runs[0]["stand_in_modules"] if runs else [],
+        "phases": phases,
+        "calls": runs[0]["calls"] if runs else {},
+        "top_imports": [{"module": name, **timing} for name, timing in ranked[:top]],
+        "imports": imports,
+    }
+
+
+def format_table(report: dict) -> str:
+    """Human readable version of the report"""
+    lines = []
+    for target, result in report["targets"].items():
+        lines.append(f"=== {target} ({result['runs']} cold starts, medians) ===")
+        if result["stand_in_modules"]:
+            lines.append(f"NOTE: not installed, timed against stand-ins: {', '.join(result['stand_in_modules'])}")
+        lines.append(f"{'Phase':<32}{'ms':>12}{'calls':>8}")
+        for name, phase in result["phases"].items():
+            lines.append(f"{name:<32}{phase['median_ms']:>12.2f}{phase['count']:>8}")
+        lines.append("")
+        lines.append(f"{'Module':<56}{'incl ms':>12}{'self ms':>12}")
+        for entry in result["top_imports"]:
+            lines.append(f"{entry['module']:<56}{entry['inclusive_ms']:>12.2f}{entry['self_ms']:>12.2f}")
+        lines.append("")
+        calls = ", ".join(f"{service}={count}" for service, count in sorted(result["calls"].items()))
+        lines.append(f"Stand-in service calls (per run): {calls or 'none'}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per target")
+    parser.add_argument("--targets", nargs="+", default=TARGETS, choices=TARGETS)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency per AWS/Slack call")
+    parser.add_argument("--top", type=int, default=25, help="number of modules to show in the table")
+    parser.add_argument("--output", default="bench_report.json", help="where to write the JSON report")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_child(args.child, args.latency_ms)
+        with open(args.result_file, "w", encoding="utf-8") as result_file:
+            json.dump(result, result_file)
+        return
+
+    report = {"latency_ms": args.latency_ms, "python": sys.version.split()[0], "targets": {}}
+    for target in args.targets:
+        runs = []
+        for _ in range(args.runs):
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as handle:
+                result_path = handle.name
+            try:
+                subprocess.run(
+                    [
+                        sys.executable,
+                        os.path.abspath(__file__),
+                        "--child",
+                        target,
+                        "--result-file",
+                        result_path,
+                        "--latency-ms",
+                        str(args.latency_ms),
+                    ],
+                    check=True,
+                    cwd=REPO_ROOT,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+                with open(result_path, encoding="utf-8") as result_file:
+                    runs.append(json.load(result_file))
+            finally:
+                os.remove(result_path)
+        report["targets"][target] = aggregate(runs, args.top)
+
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(format_table(report))
+    print(f"JSON report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""Lambda handler deployed next to a non-US stack, running the stack specific work units that
+scripts/regions.py sends it (*** API calls, MongoDB lookups) so they don't cross the Atlantic"""
+from scripts import regions, resources, warmup  # pylint: disable=import-error
+from scripts.get_secret import get_secret  # pylint: disable=import-error
+
+# Need to have secrets available before any other execution happens.
+secrets = get_secret()
+
+
+def handler(event, context):
+    """Handler for AWS lambda, invoked directly by scripts/regions.py"""
+    if warmup.is_warmup_event(event):
+        print("Received warm-up ping")
+        resources.get_session()
+        return warmup.WARMUP_RESPONSE
+    call = event["region_call"]
+    print(f"Running {call['target']}")
+    return regions.handle(call)
@@ -1,8 +1,8 @@
 """Lambda handler file to receive response subscriptions from ***"""
 import json
-import boto3
-from scripts.get_secret import get_secret  # pylint: disable=import-error
-from slack_sdk import WebClient
+from scripts import confirmations, deadline, resources, slack, state, warmup  # pylint: disable=import-error
+from scripts.get_secret import get_secret, refresh_secret_after_auth_failure  # pylint: disable=import-error
+from slack_sdk.errors import SlackApiError
 
 # Need to have secrets available before any other execution happens.
 secrets = get_secret()
@@ -10,14 +10,85 @@ secrets = get_secret()
 
 def lookup_db_info(ebid: int) -> str:
     """Takes an EB incident ID and looks up the associated row in the dynamoDB"""
-    dynamodb = boto3.resource("dynamodb")
-    table = dynamodb.Table("*****************")
-    response = table.get_item(Key={"id": ebid})
-    return response
+    return resources.with_credential_retry(
+        lambda: resources.get_table("*****************").get_item(Key={"id": ebid})
+    )
+
+
+def call_slack(method: str, **kwargs) -> dict:
+    """Calls a Slack Web API method, re-fetching the token and retrying once if it was rotated"""
+    try:
+        return getattr(resources.get_web_client(), method)(**kwargs)
+    except SlackApiError as err:
+        # An auth error most likely means the slack token was rotated, so re-fetch and retry once
+        if err.response.get("error") not in slack.AUTH_ERRORS or not refresh_secret_after_auth_failure():
+            raise
+        return getattr(resources.get_web_client(), method)(**kwargs)
+
+
+def report_confirmations(run_id: str, slack_channel: str, stack: str, delivery_method: str, user_list: list) -> None:
+    """Adds these confirmations to the run's message, posting it if nobody has yet"""
+    confirmations.record(run_id, slack_channel, stack, delivery_method, user_list)
+    wait = confirmations.claim_report(run_id)
+    if wait is None:
+        print(f"Confirmations for {run_id} are already being reported for this window")
+        return
+    # Let the other confirmations of this window come in, so one edit covers them all. This is at most
+    # DEBOUNCE seconds and never eats into the time we keep back for reporting.
+    deadline.current().sleep(wait)
+    # A second attempt in case whoever claimed the message gave up on it while we were waiting
+    for _ in range(2):
+        if confirmations.claim_message(run_id):
+            item = state.get(confirmations.run_key(run_id))
+            message = confirmations.render(item)
+            print(f"Posting confirmations message: {message}")
+            try:
+                response = call_slack(
+                    "chat_postMessage", channel=slack_channel, thread_ts=item.get("thread_ts"), text=message
+                )
+            except BaseException:
+                confirmations.release_message(run_id)
+                raise
+            confirmations.save_message(run_id, response["ts"])
+            return
+        posted = confirmations.wait_for_message(run_id)
+        if posted is not None:
+            # Read the responses now, so the edit includes everything up to the moment it was posted
+            message = confirmations.render(state.get(confirmations.run_key(run_id)))
+            print(f"Updating confirmations message {posted['message_ts']}: {message}")
+            call_slack("chat_update", channel=slack_channel, ts=posted["message_ts"], text=message)
+            return
+    print(f"The confirmations message for {run_id} was never posted, a later confirmation will report these")
+
+
+_warm_state = {"primed": False}
+
+
+def prime_caches() -> None:
+    """Builds the DynamoDB table and Slack client ahead of the first confirmation"""
+    warmup.prime(
+        {
+            "dynamodb": lambda: resources.get_table("*****************"),
+            "web_client": resources.get_web_client,
+            "dns": lambda: warmup.resolve_hosts(["slack.com"]),
+        }
+    )
+    _warm_state["primed"] = True
+
+
+# Provisioned concurrency runs init ahead of traffic, so do the expensive work now.
+if warmup.is_provisioned_init():
+    prime_caches()
 
 
 def main(event, context):
     """Response Subscription Lambda Handler"""
+    if warmup.is_warmup_event(event):
+        print("Received warm-up ping")
+        if _warm_state["primed"] is False:
+            prime_caches()
+        return warmup.WARMUP_RESPONSE
+    deadline.start(context)
     print(f"Received event:\n{event}")
     print(f"Received context:\n{context}")
     body = json.loads(event["body"])
@@ -63,10 +134,14 @@ def main(event, context):
             return
 
     stack = "US" if str(org_id) == "*****************" else "EU"
-    client = WebClient(token=secrets["token"])
+    run_id = db_info["Item"].get("run_id")
+    if run_id is not None:
+        report_confirmations(run_id, slack_channel, stack, delivery_method, user_list)
+        return
+
+    # Tests sent before confirmations were grouped by run get a message per confirmation
     if len(user_list) == 1:
         message = f"Received {delivery_method} confirmation response from <@{user_list[0]}> on {stack} stack! :meowparty:"
     else:
         message = f"Received {delivery_method} confirmation response from the following users on {stack} stack:\n{', '.join(['<@'+user+'>' for user in user_list])} :meowparty:"
-
-    _ = client.chat_postMessage(channel=slack_channel, text=message)
+    _ = call_slack("chat_postMessage", channel=slack_channel, text=message)
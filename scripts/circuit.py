@@ -0,0 +1,131 @@
+"""Circuit breakers for upstream dependencies.
+
+Each upstream (*** API, ***** ingestion, TelQ, Slack, MongoDB, the onboarding services...) has a breaker
+watching its recent calls. When too many of them fail or are too slow, the breaker opens and calls fail
+straight away with CircuitOpenError instead of each command waiting on timeouts. After OPEN_SECONDS one
+probe call is let through (half-open); if it works the breaker closes again, otherwise it stays open."""
+import os
+import threading
+import time
+from collections import deque
+from scripts.registry import call_with_args  # pylint: disable=import-error
+
+# Only calls within the last WINDOW seconds count, and at least MIN_CALLS of them are needed to open.
+WINDOW = float(os.environ.get("AUTOBOT_CIRCUIT_WINDOW", "60"))
+MIN_CALLS = int(os.environ.get("AUTOBOT_CIRCUIT_MIN_CALLS", "5"))
+# Open once this share of recent calls failed, or took longer than SLOW_CALL seconds.
+ERROR_RATE = float(os.environ.get("AUTOBOT_CIRCUIT_ERROR_RATE", "0.5"))
+SLOW_CALL = float(os.environ.get("AUTOBOT_CIRCUIT_SLOW_CALL", "10"))
+SLOW_RATE = float(os.environ.get("AUTOBOT_CIRCUIT_SLOW_RATE", "0.8"))
+# How long to fail fast before probing again
+OPEN_SECONDS = float(os.environ.get("AUTOBOT_CIRCUIT_OPEN_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+    def __init__(self, name: str, retry_in: float) -> None:
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(
+            f"{name} seems to be having problems right now, so I'm not calling it again for about {max(retry_in, 1):.0f} seconds. Please try again shortly."
+        )
+
+
+class CircuitBreaker:
+    """Rolling error rate/latency tracker for one upstream"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.calls = deque()  # (finished at, ok, seconds)
+        self.lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raises CircuitOpenError if calls should not be made right now"""
+        with self.lock:
+            if self.state == CLOSED:
+                return
+            retry_in = self.opened_at + OPEN_SECONDS - time.monotonic()
+            if self.state == OPEN and retry_in <= 0:
+                print(f"Circuit for {self.name} is half-open, letting a probe call through")
+                self.state = HALF_OPEN
+                return
+            # Open, or half-open with the probe still in flight
+            raise CircuitOpenError(self.name, max(retry_in, 0))
+
+    def record(self, ok: bool, seconds: float) -> None:
+        """Records the outcome of a call and opens/closes the circuit accordingly"""
+        now = time.monotonic()
+        with self.lock:
+            if self.state == HALF_OPEN:
+                if ok and seconds < SLOW_CALL:
+                    print(f"Probe call to {self.name} worked, closing circuit")
+                    self.state = CLOSED
+                    self.calls.clear()
+                else:
+                    print(f"Probe call to {self.name} failed, circuit stays open")
+                    self.state = OPEN
+                    self.opened_at = now
+                return
+            self.calls.append((now, ok, seconds))
+            while self.calls and self.calls[0][0] < now - WINDOW:
+                self.calls.popleft()
+            if self.state == OPEN or len(self.calls) < MIN_CALLS:
+                return
+            failed = len([call for call in self.calls if not call[1]]) / len(self.calls)
+            slow = len([call for call in self.calls if call[2] >= SLOW_CALL]) / len(self.calls)
+            if failed >= ERROR_RATE or slow >= SLOW_RATE:
+                print(f"Opening circuit for {self.name}: {failed:.0%} of recent calls failed, {slow:.0%} were slow")
+                self.state = OPEN
+                self.opened_at = now
+
+    def call(self, func: object) -> object:
+        """Runs func() through the breaker. Anything it raises counts as a failure."""
+        self.before_call()
+        start = time.perf_counter()
+        try:
+            result = func()
+        except BaseException:
+            self.record(False, time.perf_counter() - start)
+            raise
+        self.record(True, time.perf_counter() - start)
+        return result
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """The breaker for the named upstream, shared by everything in this process"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def get_states() -> dict:
+    """Current state of every breaker, for logging"""
+    with _breakers_lock:
+        return {name: breaker.state for name, breaker in _breakers.items()}
+
+
+def reporting(listener: object) -> object:
+    """Wraps a Bolt listener so an open circuit is reported to the channel instead of failing silently"""
+
+    def report_open_circuits(args):
+        try:
+            return call_with_args(listener, args)
+        except CircuitOpenError as err:
+            print(f"Failing fast: {err}")
+            args.say(f"Sorry, {err}")
+            return None
+
+    report_open_circuits.__name__ = listener.__name__
+    return report_open_circuits
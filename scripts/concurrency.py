@@ -0,0 +1,25 @@
+"""Runs independent blocking calls side by side, so fan-outs (onboarders, per-stack calls...) take as long
+as the slowest call rather than the sum of them. Everything here spends its time waiting on upstream APIs,
+so threads overlap the I/O just as well as coroutines would without rewriting every client."""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Upper bound on calls in flight for a single fan-out
+MAX_WORKERS = int(os.environ.get("AUTOBOT_FANOUT_WORKERS", "8"))
+
+
+def run_concurrently(tasks: list, max_workers: int = MAX_WORKERS) -> list:
+    """Runs every task() at once and returns their results in the same order as tasks.
+    A task that raises has its exception returned in place of a result, so one failure doesn't lose the rest."""
+    if not tasks:
+        return []
+
+    def run(task):
+        try:
+            return task()
+        except BaseException as err:
+            print(f"Concurrent task failed: {err}")
+            return err
+
+    with ThreadPoolExecutor(max_workers=min(len(tasks), max_workers), thread_name_prefix="autobot-fanout") as executor:
+        return list(executor.map(run, tasks))
@@ -0,0 +1,117 @@
+"""Aggregates the confirmations of one path test run into a single Slack message.
+
+Each confirmation webhook used to post its own message, so a rollout or a team wide test flooded the
+channel. Now every notification's tracking record carries the run_id of the path test that sent it.
+Responders are collected per run in the shared state store, and one message per run (threaded under
+the path test's summary when we know it) is posted and then edited as more confirmations come in.
+Edits are debounced: within each DEBOUNCE second window only the first confirmation to arrive
+reports, once the window has closed, so it includes everyone who confirmed during it. Reports from
+consecutive windows can overlap, so the first to report claims posting the message (claim_message) and
+the others wait for it to be posted, then edit it."""
+import os
+import time
+from scripts import polling, state  # pylint: disable=import-error
+
+# Same lifetime as the path test tracking records
+RUN_TTL = 3600
+DEBOUNCE = float(os.environ.get("AUTOBOT_CONFIRMATION_DEBOUNCE", "2"))
+# Longest we wait for another invocation to finish posting the run's message
+MESSAGE_WAIT = 5
+# Clock the debounce windows are counted in. Wall clock time, as every invocation has to agree on the window.
+_now = time.time
+
+
+def run_key(run_id: str) -> str:
+    """State store key of a path test run"""
+    return f"confirmations:{run_id}"
+
+
+def message_key(run_id: str) -> str:
+    """State store key of the run's confirmation message"""
+    return f"{run_key(run_id)}:message"
+
+
+def save_run(run_id: str, values: dict) -> dict:
+    """Sets values on the run's item, creating it if this is the first we've heard of the run"""
+    item = state.update(run_key(run_id), values)
+    if item is not None:
+        return item
+    if state.put_if_absent(run_key(run_id), values, RUN_TTL):
+        return dict(values)
+    # Someone else created it in the meantime
+    return state.update(run_key(run_id), values)
+
+
+def set_thread(run_id: str, channel: str, thread_ts: str) -> None:
+    """Records the path test's summary message, which confirmations for the run are threaded under"""
+    save_run(run_id, {"channel": channel, "thread_ts": thread_ts})
+
+
+def record(run_id: str, channel: str, stack: str, path: str, users: list) -> None:
+    """Adds the users who confirmed path from stack to the run's responders"""
+    for user in users:
+        response = f"{stack}|{path}|{user}"
+        if state.add_to_set(run_key(run_id), "responses", response) is None:
+            save_run(run_id, {"channel": channel})
+            state.add_to_set(run_key(run_id), "responses", response)
+
+
+def claim_report(run_id: str) -> float:
+    """Returns how long to wait before reporting if this invocation should report for the current window,
+    or None if another one already is (and will include our confirmation)"""
+    now = _now()
+    window = int(now // DEBOUNCE)
+    if not state.put_if_absent(f"{run_key(run_id)}:report:{window}", {"status": "claimed"}, DEBOUNCE * 2 + 60):
+        return None
+    return (window + 1) * DEBOUNCE - now
+
+
+def claim_message(run_id: str) -> bool:
+    """True if this invocation should post the run's message. Only one ever gets to, the rest edit it."""
+    return state.put_if_absent(message_key(run_id), {"status": "posting"}, RUN_TTL)
+
+
+def save_message(run_id: str, message_ts: str) -> None:
+    """Records where the run's message was posted, for the invocations waiting to edit it"""
+    state.update(message_key(run_id), {"message_ts": message_ts})
+
+
+def release_message(run_id: str) -> None:
+    """Gives up the claim on posting the run's message (e.g. because posting failed) so another can"""
+    state.delete(message_key(run_id))
+
+
+def message_status(item: dict) -> str:
+    """Tells polling.poll whether the run's message has been posted"""
+    if item is None:
+        # The claim was released without posting
+        return polling.FAILED
+    return polling.READY if "message_ts" in item else polling.PENDING
+
+
+def wait_for_message(run_id: str) -> dict:
+    """Waits for the invocation that claimed the run's message to post it. Returns the message's item
+    (with its message_ts), or None if it wasn't posted in time or the claim was released."""
+    # Usually it was posted in an earlier window, so there's nothing to wait for
+    item = state.get(message_key(run_id))
+    if message_status(item) != polling.PENDING:
+        return item
+    outcome = polling.poll(
+        "confirmations message", lambda: state.get(message_key(run_id)), message_status, MESSAGE_WAIT
+    )
+    return outcome["result"] if outcome["status"] == polling.READY else None
+
+
+def render(item: dict) -> str:
+    """The aggregated confirmation message, with who responded per stack and path"""
+    by_path = {}
+    for response in sorted(item.get("responses", [])):
+        stack, path, user = response.split("|", 2)
+        by_path.setdefault(f"{stack} Stack {path}", []).append(user)
+    users = {response.split("|", 2)[2] for response in item.get("responses", [])}
+    lines = [
+        f"*{label}*: {len(responders)} confirmation(s) from {', '.join(['<@' + user + '>' for user in responders])}"
+        for label, responders in by_path.items()
+    ]
+    newline = "\n"
+    return f"Received confirmation responses from {len(users)} user(s) :meowparty:\n{newline.join(lines)}"
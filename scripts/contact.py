@@ -1,11 +1,16 @@
 """This script will scan and import contact data for users in Slack"""
-import time
 import requests
+from scripts import deadline as invocation_deadline  # pylint: disable=import-error
+from scripts import concurrency, http_client, regions  # pylint: disable=import-error
 from scripts.get_secret import get_secret  # pylint: disable=import-error
+from scripts.slack import do_say  # pylint: disable=import-error
 
 # Need to have secrets available before any other execution happens.
 secrets = get_secret()
 
+# Rough worst case for one user: slack lookup plus a create in each stack, with retries.
+SECONDS_PER_USER = 15
+
 
 def index_in_list(a_list: list, index: int) -> bool:
     """Verifies if a given index exists in a list"""
@@ -17,24 +22,17 @@ def get_noc_users() -> dict:
     # This function isn't currently in use and may need tweaking to re-enable
     header_data = {"Authorization": f"Bearer {secrets['token']}"}
     payload = {"usergroup": "*********"}
-    tries = 3
-    for i in range(tries):
-        try:
-            response = requests.get(
-                "https://slack.com/api/usergroups.users.list",
-                headers=header_data,
-                params=payload,
-                timeout=15,
-            ).json()
-        except BaseException as err:
-            if i < tries:
-                print(err)
-                print("Trying again...")
-                continue
-            else:
-                print("That's three tries. Giving up now.")
-                response = {"ok": False, "error": err}
-        break
+    # http_client retries and fails fast on its own, anything it raises is final
+    try:
+        response = http_client.get(
+            "https://slack.com/api/usergroups.users.list",
+            headers=header_data,
+            params=payload,
+            timeout=15,
+        ).json()
+    except requests.RequestException as err:
+        print(err)
+        response = {"ok": False, "error": err}
     return response
 
 
@@ -42,21 +40,13 @@ def get_user_info(uid: str) -> dict:
     """Returns dict containing interested information about a slack user"""
     header_data = {"Authorization": f"Bearer {secrets['token']}"}
     payload = {"user": uid}
-    tries = 3
-    for i in range(tries):
-        try:
-            response = requests.get(
-                "https://slack.com/api/users.info", headers=header_data, params=payload, timeout=15
-            ).json()
-        except BaseException as err:
-            if i < tries:  # i is zero indexed
-                print(err)
-                print("Trying again...")
-                continue
-            else:
-                print("That's three tries. Giving up now.")
-                response = {"ok": False, "error": err}
-        break
+    try:
+        response = http_client.get(
+            "https://slack.com/api/users.info", headers=header_data, params=payload, timeout=15
+        ).json()
+    except requests.RequestException as err:
+        print(err)
+        response = {"ok": False, "error": err}
     if response["ok"] is True:
         profile = {}
         profile["ok"] = response["ok"]
@@ -122,23 +112,14 @@ def create_contact(
         ],
     }
     header_data = {"Authorization": secrets["***_auth"]}
-    tries = 3
-    for i in range(tries):  # We need to retry because sometimes *** just decides to ignore us.
-        try:
-            response = requests.post(
-                api_endpoint, headers=header_data, json=contact_data, timeout=15
-            ).json()
-        except BaseException as err:
-            if i < tries:  # i is zero indexed
-                print(err)
-                print("Trying again...")
-                continue
-            else:
-                print("That's three tries. Giving up now.")
-                response = {}
-                response["message"] = "Error"
-                response["error"] = err
-        break
+    # http_client retries the calls *** ignores (and is rate limited on), so one call is all we make here
+    try:
+        response = http_client.post(api_endpoint, headers=header_data, json=contact_data, timeout=15).json()
+    except requests.RequestException as err:
+        print(err)
+        response = {}
+        response["message"] = "Error"
+        response["error"] = err
     return response
 
 
@@ -151,12 +132,15 @@ def format_phone(number: str) -> str:
     return numerical[-10:]
 
 
-def handler(options, user_id):
-    """Primary function handler"""
+def handler(options, user_id, deadline=None):
+    """Primary function handler. Stops before the deadline runs out and returns the users
+    it didn't get to under "deferred"."""
+    deadline = deadline or invocation_deadline.current()
     final_result = {}
     errors = []
     fail_steps = []
     successful_users = []
+    deferred_users = []
 
     if index_in_list(options, 2) is True:
         # If user specified options we assume it's a list of names.
@@ -174,9 +158,11 @@ def handler(options, user_id):
     else:  # If no options specified, update the invokers profile instead
         user_list = [user_id]
 
-    for user in user_list:
-        # Helps keep *** from freaking out on us but does increase the time for this to run :(
-        time.sleep(2)
+    for index, user in enumerate(user_list):
+        if deadline.expired(needed=SECONDS_PER_USER):
+            deferred_users = user_list[index:]
+            print(f"Running out of time ({deadline}), deferring users: {deferred_users}")
+            break
         user_info = get_user_info(user)
         if user_info["ok"] is True:
             print(f"Successfully obtained {user} data from Slack")
@@ -184,19 +170,34 @@ def handler(options, user_id):
                 user_phone = format_phone(user_info["phone"])
             else:
                 user_phone = "555"  # If no phone number, use a dummy number so we trigger an error
-            for stack in ["US", "EU"]:
+            stacks = ["US", "EU"]
+            for stack in stacks:
                 print(
                     f"Sending the following data to ***:\nFN: {user_info['first_name']}, LN: {user_info['last_name']}, PN: {user_phone}, EM: {user_info['email']}, STACK: {stack}, UID: {user}, CC: {user_info['tz']}"
                 )
-                create_contact_response = create_contact(
-                    user_info["first_name"],
-                    user_info["last_name"],
-                    user_phone,
-                    user_info["email"],
-                    stack,
-                    user,
-                    user_info["tz"],
-                )
+            # Each stack is its own API, so create both contacts at once
+            responses = concurrency.run_concurrently(
+                [
+                    lambda stack=stack: regions.run(
+                        stack,
+                        "scripts.contact:create_contact",
+                        user_info["first_name"],
+                        user_info["last_name"],
+                        user_phone,
+                        user_info["email"],
+                        stack,
+                        user,
+                        user_info["tz"],
+                    )
+                    for stack in stacks
+                ]
+            )
+            for stack, create_contact_response in zip(stacks, responses):
+                if isinstance(create_contact_response, BaseException):
+                    # e.g. the region worker failed or the stack's circuit is open. Report it like any other
+                    # failed update and carry on with the other users.
+                    print(f"Error updating *** contact for {user} in {stack} stack: {create_contact_response}")
+                    create_contact_response = {"message": "Error", "error": str(create_contact_response)}
                 if create_contact_response["message"] != "OK":
                     errors.append(str(create_contact_response))
                     fail_steps.append(f"Update *** Contact info for <@{user}> in {stack} stack")
@@ -224,4 +225,29 @@ def handler(options, user_id):
     final_result["errors"] = errors
     final_result["step"] = fail_steps
     final_result["users"] = successful_users
+    final_result["deferred"] = deferred_users
     return final_result
+
+
+def update(options, user_id, channel, say):
+    """Handles the "update" keyword and reports the outcome of the contact update to slack"""
+    response = "Kicking off a contact update! Please note that this process can take up to 60 seconds per contact."
+    do_say(response, say)
+
+    update_contacts_response = handler(options, user_id)
+    if update_contacts_response["ok"] is True:
+        response = f"Contacts have been updated in *** and no errors have been detected! :data_party:\n\nI have successfully updated the following contacts:\n{', '.join(update_contacts_response['users'])}."
+        do_say(response, say)
+    else:
+        new_line = "\n"  # Ugh. No backslashes allowed in f string brackets so we do this...
+        response = f"There has been some error during the contact update process :cry:\nWe failed at the following step(s):\n{new_line.join(update_contacts_response['step'])}\n\nHere are the corresponding error message(s) encountered:\n{new_line.join(update_contacts_response['errors'])}\n\n"
+        if update_contacts_response["users"]:
+            addendum = f"I have successfully updated the following contacts:\n{', '.join(update_contacts_response['users'])}.\n<*****************|See the documentation for common errors and how to resolve them.>"
+        else:
+            addendum = "I do not seem to have updated any users in ***.\n<*****************|See the documentation for common errors and how to resolve them.>"
+        response = response + addendum
+        do_say(response, say)
+    if update_contacts_response["deferred"]:
+        deferred = " ".join([f"<@{user}>" for user in update_contacts_response["deferred"]])
+        response = f"I ran out of time before I could update the following contacts, so I haven't touched them:\n{deferred}\n\nTo finish up, run `@AutoBot update {deferred}`."
+        do_say(response, say)
@@ -0,0 +1,60 @@
+"""Tracks how much of the lambda time budget is left so long running commands can stop cleanly
+and report what they didn't get to, instead of being killed part way through by the timeout."""
+import math
+import os
+import time
+
+# Seconds kept back for telling slack what we did (and didn't) finish once we stop.
+RESERVE = float(os.environ.get("AUTOBOT_DEADLINE_RESERVE", "5"))
+
+
+class Deadline:
+    """Point in time (time.monotonic) by which work must be wrapped up. None means no limit,
+    which is what we get outside of lambda (e.g. server.py)."""
+
+    def __init__(self, expires_at: float = None, reserve: float = RESERVE) -> None:
+        self.expires_at = expires_at
+        self.reserve = reserve
+
+    @classmethod
+    def from_context(cls, context: object) -> "Deadline":
+        """Builds a deadline from the lambda context's remaining time budget"""
+        try:
+            remaining_ms = context.get_remaining_time_in_millis()
+        except AttributeError:
+            return cls()
+        return cls(time.monotonic() + remaining_ms / 1000)
+
+    def remaining(self) -> float:
+        """Seconds left before the hard limit"""
+        if self.expires_at is None:
+            return math.inf
+        return self.expires_at - time.monotonic()
+
+    def expired(self, needed: float = 0.0) -> bool:
+        """True if a step expected to take `needed` seconds would eat into the reserve"""
+        return self.remaining() - self.reserve < needed
+
+    def sleep(self, seconds: float) -> bool:
+        """Sleeps for up to `seconds` without eating into the reserve. Returns False if cut short."""
+        allowed = max(min(seconds, self.remaining() - self.reserve), 0)
+        time.sleep(allowed)
+        return allowed >= seconds
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.1f}s, reserve={self.reserve}s)"
+
+
+_current = {"deadline": Deadline()}
+
+
+def start(context: object) -> Deadline:
+    """Sets the deadline for this invocation from the lambda context"""
+    _current["deadline"] = Deadline.from_context(context)
+    print(f"Invocation {_current['deadline']}")
+    return _current["deadline"]
+
+
+def current() -> Deadline:
+    """Deadline of the invocation currently running"""
+    return _current["deadline"]
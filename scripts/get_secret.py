@@ -1,16 +1,107 @@
-"""Common function to obtain the required secrets from AWS secrets manager"""
+"""Common function to obtain the required secrets from AWS secrets manager.
+Secrets are fetched once per container and served from memory to every module afterwards."""
 import json
-import boto3
+import os
+import threading
+import time
+from scripts import resources  # pylint: disable=import-error
 
+SECRET_NAME = "*****************"
+REGION_NAME = "*****************"
 
-def get_secret() -> dict:
-    """Retrieves the various keys from AWS secrets manager"""
-    secret_name = "*****************"
-    region_name = "*****************"
+# Seconds to serve secrets from memory before kicking off a background refresh.
+SECRET_TTL = int(os.environ.get("AUTOBOT_SECRET_TTL", "3600"))
+# Minimum seconds between refreshes triggered by auth failures so a bad key can't hammer AWS.
+ROTATION_COOLDOWN = int(os.environ.get("AUTOBOT_SECRET_ROTATION_COOLDOWN", "60"))
 
-    session = boto3.session.Session()
-    client = session.client(service_name="secretsmanager", region_name=region_name)
+# Every caller receives this same dict. Refreshes update it in place so module level
+# `secrets = get_secret()` references always see the current values.
+_secrets = {}
+_lock = threading.Lock()
+_state = {"fetched_at": None, "refreshing": False, "rotation_refreshed_at": None}
+# Counters, only changed while holding _lock
+_stats = {"fetches": 0, "hits": 0, "background_refreshes": 0, "rotation_refreshes": 0, "errors": 0}
 
-    get_secret_value_response = client.get_secret_value(SecretId=secret_name)
+
+def _fetch_secret() -> dict:
+    """Retrieves the various keys from AWS secrets manager"""
+    get_secret_value_response = resources.with_credential_retry(
+        lambda: resources.get_secrets_client(REGION_NAME).get_secret_value(SecretId=SECRET_NAME)
+    )
     secret = get_secret_value_response["SecretString"]
     return json.loads(secret)
+
+
+def _store(new_secrets: dict) -> bool:
+    """Swaps new values into the shared dict. Returns True if anything changed."""
+    changed = new_secrets != _secrets
+    if changed:
+        _secrets.clear()
+        _secrets.update(new_secrets)
+    _state["fetched_at"] = time.monotonic()
+    return changed
+
+
+def _background_refresh() -> None:
+    """Refreshes secrets off the request path. On failure we keep serving the old values."""
+    try:
+        new_secrets = _fetch_secret()
+    except BaseException as err:
+        with _lock:
+            _stats["errors"] += 1
+        print(f"Background secret refresh failed, continuing with cached secrets:\n{err}")
+    else:
+        with _lock:
+            _stats["fetches"] += 1
+            _stats["background_refreshes"] += 1
+            if _store(new_secrets):
+                print("Background secret refresh picked up new secret values")
+    finally:
+        _state["refreshing"] = False
+
+
+def get_secret() -> dict:
+    """Returns the process-wide secrets dict, fetching it from AWS secrets manager on first use.
+    Once older than SECRET_TTL a background refresh is started and cached values are served meanwhile."""
+    with _lock:
+        if _state["fetched_at"] is None:
+            _store(_fetch_secret())
+            _stats["fetches"] += 1
+            return _secrets
+        _stats["hits"] += 1
+        stale = time.monotonic() - _state["fetched_at"] > SECRET_TTL
+        if stale and not _state["refreshing"]:
+            _state["refreshing"] = True
+            threading.Thread(target=_background_refresh, daemon=True).start()
+    return _secrets
+
+
+def refresh_secret_after_auth_failure() -> bool:
+    """Called when an upstream rejects our credentials, which usually means the secret was rotated.
+    Re-fetches synchronously (at most once per ROTATION_COOLDOWN) and returns True only if the
+    values actually changed, so the caller knows whether a single retry is worthwhile."""
+    with _lock:
+        last = _state["rotation_refreshed_at"]
+        if last is not None and time.monotonic() - last < ROTATION_COOLDOWN:
+            print("Skipping rotation refresh, secrets were re-fetched moments ago")
+            return False
+        _state["rotation_refreshed_at"] = time.monotonic()
+        try:
+            new_secrets = _fetch_secret()
+        except BaseException as err:
+            _stats["errors"] += 1
+            print(f"Rotation refresh of secrets failed:\n{err}")
+            return False
+        _stats["fetches"] += 1
+        _stats["rotation_refreshes"] += 1
+        changed = _store(new_secrets)
+    print(f"Re-fetched secrets after an auth failure. Values changed: {changed}")
+    return changed
+
+
+def get_secret_stats() -> dict:
+    """Returns counters for secret fetches and cache hits, mostly for logging/benchmarks"""
+    stats = dict(_stats)
+    if _state["fetched_at"] is not None:
+        stats["age_seconds"] = round(time.monotonic() - _state["fetched_at"], 3)
+    return stats
@@ -0,0 +1,186 @@
+"""Shared HTTP client for every upstream API (Slack, ***, *****, TelQ and the on/offboarding services).
+
+Calls go through one keep-alive session per host, so warm invocations reuse TCP/TLS connections instead of
+opening a new one per call. Every call gets default connect/read timeouts, is rate limited and retried per
+upstream (see scripts/ratelimit.py) and fails fast while its upstream is down (see scripts/circuit.py).
+response.json() only parses the body once however often it's called, and each call is timed (see
+add_timing_hook and get_stats)."""
+import os
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from scripts import circuit, ratelimit, resources  # pylint: disable=import-error
+
+# (connect, read) seconds, used unless a call passes its own timeout
+DEFAULT_TIMEOUT = (
+    float(os.environ.get("AUTOBOT_HTTP_CONNECT_TIMEOUT", "5")),
+    float(os.environ.get("AUTOBOT_HTTP_READ_TIMEOUT", "30")),
+)
+# Connections kept open per host. Sized for server.py's worker pool, lambda only needs one or two.
+POOL_SIZE = int(os.environ.get("AUTOBOT_HTTP_POOL_SIZE", "10"))
+
+# Called as hook(method, url, status_code, seconds) after every call. status_code is None if the call failed.
+_timing_hooks = []
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def add_timing_hook(hook: object) -> None:
+    """Registers hook(method, url, status_code, seconds) to be called after every call"""
+    _timing_hooks.append(hook)
+
+
+def record_stats(method: str, url: str, status_code: int, seconds: float) -> None:
+    """Default timing hook, keeping call counts and times per host for get_stats()"""
+    host = urlsplit(url).hostname
+    with _stats_lock:
+        stats = _stats.setdefault(host, {"calls": 0, "errors": 0, "seconds": 0.0, "slowest": 0.0})
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["slowest"] = max(stats["slowest"], seconds)
+        if status_code is None or status_code >= 400:
+            stats["errors"] += 1
+
+
+add_timing_hook(record_stats)
+
+
+def get_stats() -> dict:
+    """Call counts, errors and total/slowest seconds per host since the container started"""
+    with _stats_lock:
+        return {
+            host: dict(stats, seconds=round(stats["seconds"], 3), slowest=round(stats["slowest"], 3))
+            for host, stats in _stats.items()
+        }
+
+
+def cache_json(response: object, *args, **kwargs) -> object:
+    """Response hook making response.json() parse the body once and hand back the same result after that"""
+    parse = response.json
+    parsed = {}
+
+    def json(**json_kwargs):
+        if "value" not in parsed:
+            parsed["value"] = parse(**json_kwargs)
+        return parsed["value"]
+
+    response.json = json
+    return response
+
+
+class Session(requests.Session):
+    """requests.Session with our default timeouts, circuit breakers, rate limits and retries,
+    parse-once JSON and timing hooks"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.hooks["response"].append(cache_json)
+        # Sessions are shared by every caller of a host, so don't let cookies carry over between them.
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    def request(self, method, url, **kwargs):  # pylint: disable=arguments-differ
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        breaker = circuit.get_breaker(breaker_name(url))
+        attempt = 0
+        while True:
+            # Fails straight away with CircuitOpenError if the upstream has been failing
+            breaker.before_call()
+            ratelimit.acquire(url)
+            start = time.perf_counter()
+            try:
+                response = self.timed_request(method, url, **kwargs)
+            except BaseException as err:
+                breaker.record(False, time.perf_counter() - start)
+                if not isinstance(err, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                    raise
+                # Only repeat calls that can't have reached the upstream, or are safe to repeat if they did
+                safe = isinstance(err, requests.exceptions.ConnectTimeout) or method.upper() in ratelimit.IDEMPOTENT_METHODS
+                if not safe or attempt >= ratelimit.MAX_RETRIES:
+                    raise
+                delay = ratelimit.backoff_delay(attempt)
+                print(f"Error calling {urlsplit(url).hostname}, retrying in {delay:.2f}s: {err}")
+            else:
+                breaker.record(response.status_code < 500, time.perf_counter() - start)
+                delay = ratelimit.retry_delay(method, url, response, attempt)
+                if delay is None:
+                    return response
+            time.sleep(delay)
+            attempt += 1
+
+    def connect(self, url: str) -> None:
+        """Opens a pooled connection to url's host with a HEAD request that isn't rate limited, retried,
+        timed or counted by the circuit breaker, since it isn't a real call to the upstream"""
+        super().request("HEAD", url, allow_redirects=False, timeout=DEFAULT_TIMEOUT)
+
+    def timed_request(self, method, url, **kwargs):
+        """A single call, reported to the timing hooks"""
+        start = time.perf_counter()
+        status_code = None
+        try:
+            response = super().request(method, url, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            seconds = time.perf_counter() - start
+            for hook in _timing_hooks:
+                hook(method, url, status_code, seconds)
+
+
+def breaker_name(url: str) -> str:
+    """Circuit breaker an upstream call is tracked by. Slack is one service whatever its rate limit tier."""
+    host = urlsplit(url).hostname
+    upstream = ratelimit.upstream_for(url) or ""
+    if upstream.startswith("slack:") or host == "slack.com":
+        return "Slack"
+    if upstream:
+        return f"{upstream} ({host})"
+    return host
+
+
+def get_session(url: str) -> Session:
+    """Shared session for the host of url"""
+    host = urlsplit(url).netloc
+    return resources.get_or_create(f"http:{host}", Session)
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """Makes a call on the shared session for url's host. Takes the same arguments as requests.request."""
+    return get_session(url).request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """GET on the shared session for url's host"""
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    """POST on the shared session for url's host"""
+    return request("POST", url, **kwargs)
+
+
+def put(url: str, **kwargs) -> requests.Response:
+    """PUT on the shared session for url's host"""
+    return request("PUT", url, **kwargs)
+
+
+def patch(url: str, **kwargs) -> requests.Response:
+    """PATCH on the shared session for url's host"""
+    return request("PATCH", url, **kwargs)
+
+
+def delete(url: str, **kwargs) -> requests.Response:
+    """DELETE on the shared session for url's host"""
+    return request("DELETE", url, **kwargs)
+
+
+def preconnect(hosts: list) -> None:
+    """Opens (and keeps) a connection to each host so the first real call skips DNS and the TCP/TLS
+    handshake. Any response will do, we only want the connection."""
+    for host in hosts:
+        get_session(f"https://{host}/").connect(f"https://{host}/")
@@ -0,0 +1,50 @@
+"""Drops duplicate deliveries of the same Slack event or action.
+
+Slack redelivers an event (with an X-Slack-Retry-Num header) whenever it doesn't see our ack in time,
+which is easy to hit on a cold start. Each delivery would otherwise get its own lazy invocation and
+e.g. send a second round of rollout notifications or burn TelQ credits twice. The first delivery claims
+the event_id (or the action's trigger_id) in the shared state store and any later copy is discarded,
+whether the original has finished or is still running."""
+import os
+from scripts import state  # pylint: disable=import-error
+from scripts.registry import call_with_args  # pylint: disable=import-error
+
+# Slack gives up retrying an event after about 5 minutes and lambda runs for at most 15.
+CLAIM_TTL = int(os.environ.get("AUTOBOT_IDEMPOTENCY_TTL", "1800"))
+
+
+def delivery_key(body: dict) -> str:
+    """Identifies the event or action a delivery belongs to, or None if Slack didn't give us one"""
+    if "event_id" in body:
+        return f"event:{body['event_id']}"
+    if "trigger_id" in body:
+        return f"trigger:{body['trigger_id']}"
+    return None
+
+
+def claim(body: dict) -> bool:
+    """True if this is the first time we've seen this event/action and we should handle it"""
+    key = delivery_key(body)
+    if key is None:
+        return True
+    try:
+        return state.put_if_absent(key, {"status": "claimed"}, CLAIM_TTL)
+    except BaseException as err:
+        # Redeliveries are rare (only when the ack was slow), so handling this one is the safe bet. Dropping it
+        # could lose the only delivery of the command.
+        print(f"Unable to record {key} in the state store, handling it anyway:\n{err}")
+        return True
+
+
+def once(func: object) -> object:
+    """Wraps a Bolt (lazy) listener so it only runs for the first delivery of each event/action"""
+
+    def listener(args):
+        if claim(args.body) is False:
+            print(f"Discarding duplicate delivery of {delivery_key(args.body)} for {func.__name__}")
+            return None
+        return call_with_args(func, args)
+
+    # Bolt finds lazy functions again on the second lambda invocation by name, so keep the original one.
+    listener.__name__ = func.__name__
+    return listener
@@ -0,0 +1,196 @@
+"""Durable queue for long running commands.
+
+When a queue is configured, `update`, `rollout`, `test`, `onboard`, offboarding and TelQ submissions are
+enqueued as typed jobs instead of running inside the lazy listener, and worker.py runs them with bounded
+concurrency. Jobs that fail are retried (per type, as some of them can't safely be run twice) and the
+outcome is posted back to the channel they came from.
+
+AUTOBOT_JOB_BACKEND selects the queue:
+    sqs     - AWS SQS, queue URL from AUTOBOT_JOB_QUEUE_URL
+    sqlite  - a local SQLite file (AUTOBOT_JOB_DB, default autobot_jobs.db), for tests and single hosts
+    (unset) - no queue, commands run inline as before
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from scripts import resources, singleflight  # pylint: disable=import-error
+from scripts.registry import call_with_args, resolve  # pylint: disable=import-error
+from scripts.slack import do_say  # pylint: disable=import-error
+
+BACKEND = os.environ.get("AUTOBOT_JOB_BACKEND", "")
+QUEUE_URL = os.environ.get("AUTOBOT_JOB_QUEUE_URL", "")
+JOB_DB = os.environ.get("AUTOBOT_JOB_DB", "autobot_jobs.db")
+# How long a received job is hidden from other workers before it's handed out again (worker died, etc).
+VISIBILITY_TIMEOUT = int(os.environ.get("AUTOBOT_JOB_VISIBILITY_TIMEOUT", "900"))
+# Seconds before a failed job is retried, multiplied by the attempt number
+RETRY_DELAY = 30
+
+# Job type -> handler and how many times it may be retried after failing. Command jobs are called like
+# COMMANDS targets (options, user_id, channel, say), action jobs like Bolt listeners (body, say, respond).
+# Anything that notifies people, spends TelQ credits or creates accounts is not retried, as a failure part
+# way through would otherwise repeat whatever had already been done.
+JOB_TYPES = {
+    "rollout": {"target": "scripts.pathtest:rollout", "retries": 0},
+    "test": {"target": "scripts.pathtest:path_test", "retries": 0},
+    "update": {"target": "scripts.contact:update", "retries": 2},
+    "onboard": {"target": "scripts.onboarding:onboard", "retries": 0},
+    "offboard": {"target": "scripts.onboarding:handle_offboarding", "retries": 1},
+    "telq_submit": {"target": "scripts.telq:handle_submit_networks", "retries": 0},
+}
+
+_sqlite_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    """True if a job queue has been configured"""
+    return BACKEND in ["sqs", "sqlite"]
+
+
+def _sqlite() -> sqlite3.Connection:
+    def connect():
+        connection = sqlite3.connect(JOB_DB, check_same_thread=False, isolation_level=None)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, job TEXT, attempts INTEGER, available_at REAL)"
+        )
+        return connection
+
+    return resources.get_or_create(f"sqlite:{JOB_DB}", connect)
+
+
+def enqueue(job_type: str, channel: str, user_id: str, **payload) -> str:
+    """Queues a job and returns its ID. Command jobs pass options (and their single-flight key as
+    flight), action jobs pass the Bolt body."""
+    job = dict(payload, id=uuid.uuid4().hex, type=job_type, channel=channel, user_id=user_id)
+    if BACKEND == "sqs":
+        resources.with_credential_retry(
+            lambda: resources.get_sqs_client().send_message(QueueUrl=QUEUE_URL, MessageBody=json.dumps(job))
+        )
+    else:
+        with _sqlite_lock:
+            _sqlite().execute("INSERT INTO jobs VALUES (?, ?, 0, ?)", (job["id"], json.dumps(job), time.time()))
+    print(f"Queued {job_type} job {job['id']} for {channel}")
+    return job["id"]
+
+
+def receive(max_jobs: int, wait: int = 20) -> list:
+    """Takes up to max_jobs jobs off the queue, waiting up to `wait` seconds for one to turn up.
+    Returns (job, attempt, receipt) tuples. Jobs not completed within VISIBILITY_TIMEOUT are handed out again."""
+    if BACKEND == "sqs":
+        response = resources.with_credential_retry(
+            lambda: resources.get_sqs_client().receive_message(
+                QueueUrl=QUEUE_URL,
+                MaxNumberOfMessages=min(max_jobs, 10),
+                WaitTimeSeconds=wait,
+                VisibilityTimeout=VISIBILITY_TIMEOUT,
+                AttributeNames=["ApproximateReceiveCount"],
+            )
+        )
+        return [
+            (json.loads(message["Body"]), int(message["Attributes"]["ApproximateReceiveCount"]), message["ReceiptHandle"])
+            for message in response.get("Messages", [])
+        ]
+
+    give_up_at = time.monotonic() + wait
+    while True:
+        now = time.time()
+        with _sqlite_lock:
+            connection = _sqlite()
+            connection.execute("BEGIN IMMEDIATE")  # Other worker processes may share the file
+            try:
+                rows = connection.execute(
+                    "SELECT id, job, attempts FROM jobs WHERE available_at <= ? ORDER BY available_at LIMIT ?",
+                    (now, max_jobs),
+                ).fetchall()
+                for job_id, _, _ in rows:
+                    connection.execute(
+                        "UPDATE jobs SET attempts = attempts + 1, available_at = ? WHERE id = ?",
+                        (now + VISIBILITY_TIMEOUT, job_id),
+                    )
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        if rows or time.monotonic() >= give_up_at:
+            return [(json.loads(job), attempts + 1, job_id) for job_id, job, attempts in rows]
+        time.sleep(1)
+
+
+def complete(receipt: str) -> None:
+    """Removes a finished job from the queue"""
+    if BACKEND == "sqs":
+        resources.with_credential_retry(
+            lambda: resources.get_sqs_client().delete_message(QueueUrl=QUEUE_URL, ReceiptHandle=receipt)
+        )
+        return
+    with _sqlite_lock:
+        _sqlite().execute("DELETE FROM jobs WHERE id = ?", (receipt,))
+
+
+def retry_later(receipt: str, delay: int) -> None:
+    """Hands a failed job out again after delay seconds"""
+    if BACKEND == "sqs":
+        resources.with_credential_retry(
+            lambda: resources.get_sqs_client().change_message_visibility(
+                QueueUrl=QUEUE_URL, ReceiptHandle=receipt, VisibilityTimeout=delay
+            )
+        )
+        return
+    with _sqlite_lock:
+        _sqlite().execute("UPDATE jobs SET available_at = ? WHERE id = ?", (time.time() + delay, receipt))
+
+
+def run(job: dict, say: object) -> None:
+    """Runs a job's handler, raising whatever it raises"""
+    from slack_bolt.context.respond import Respond  # pylint: disable=import-outside-toplevel
+
+    func = resolve(JOB_TYPES[job["type"]]["target"])
+    if "body" in job:
+        args = SimpleNamespace(body=job["body"], say=say, respond=Respond(response_url=job["body"].get("response_url")))
+        call_with_args(func, args)
+        return
+    # Identical commands queued close together still only run once.
+    singleflight.run(
+        job["channel"],
+        tuple(job["flight"]),
+        job["user_id"],
+        say,
+        lambda: func(job["options"], job["user_id"], job["channel"], say),
+    )
+
+
+def process(job: dict, attempt: int) -> bool:
+    """Runs a job, telling its channel if it failed. Returns False if it should be retried."""
+    from slack_bolt.context.say import Say  # pylint: disable=import-outside-toplevel
+
+    say = Say(client=resources.get_web_client(), channel=job["channel"])
+    retries = JOB_TYPES[job["type"]]["retries"]
+    print(f"Running {job['type']} job {job['id']} (attempt {attempt} of {retries + 1})")
+    try:
+        run(job, say)
+    except BaseException as err:
+        print(f"{job['type']} job {job['id']} failed:\n{err}")
+        if attempt <= retries:
+            do_say(f"Sorry <@{job['user_id']}>, something went wrong running your {job['type']} request. I'll try again shortly.\n\nError: {err}", say)
+            return False
+        do_say(f"Sorry <@{job['user_id']}>, your {job['type']} request failed and I've given up on it.\n\nError: {err}", say)
+    return True
+
+
+def deferrable(job_type: str, listener: object) -> object:
+    """Wraps a Bolt action listener so that, when a queue is configured, it's queued as a job_type job
+    instead of being run in place"""
+
+    def queue_or_run(args):
+        if enabled() is False:
+            return call_with_args(listener, args)
+        body = args.body
+        channel = body.get("channel", {}).get("id") or body["container"]["channel_id"]
+        enqueue(job_type, channel, body["user"]["id"], body=body)
+        return None
+
+    queue_or_run.__name__ = listener.__name__
+    return queue_or_run
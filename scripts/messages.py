@@ -0,0 +1,93 @@
+"""Collects everything a command says and posts it to Slack as one message.
+
+Commands report each step with its own do_say, which is a chat.postMessage call (and a place in Slack's
+rate limit) per line. MessageBuffer can be passed anywhere a Bolt `say` is expected: plain text is kept
+back and posted together as one Block Kit message when the buffer is flushed, either at the end of the
+command or at a checkpoint where the user should see progress straight away (flush())."""
+import functools
+import inspect
+import os
+
+# Slack allows 50 blocks per message and 3000 characters per section
+MAX_BLOCKS = 50
+MAX_SECTION = 3000
+# Set to "false" to post every line as its own message again
+ENABLED = os.environ.get("AUTOBOT_BUFFER_MESSAGES", "true").lower() != "false"
+
+
+def sections(text: str) -> list:
+    """Splits text into chunks that fit in a section block, breaking on lines where possible"""
+    chunks = []
+    while len(text) > MAX_SECTION:
+        cut = text.rfind("\n", 0, MAX_SECTION)
+        if cut <= 0:
+            cut = MAX_SECTION
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    chunks.append(text)
+    return chunks
+
+
+class MessageBuffer:
+    """A `say` that keeps text back until flush(). Anything other than plain text (blocks, attachments...)
+    is posted straight away, after whatever was already buffered, so messages keep their order."""
+
+    def __init__(self, say: object) -> None:
+        self.say = say
+        self.parts = []
+
+    def __call__(self, text: str = "", **kwargs) -> object:
+        if kwargs or not ENABLED:
+            self.flush()
+            return self.say(text, **kwargs) if text else self.say(**kwargs)
+        self.parts.append(text)
+        return None
+
+    def flush(self) -> object:
+        """Posts everything said since the last flush, in as few messages as Slack allows.
+        Returns Slack's response for the last message posted, or None if there was nothing to post."""
+        parts, self.parts = self.parts, []
+        if not parts:
+            return None
+        if len(parts) == 1 and len(parts[0]) <= MAX_SECTION:
+            return self.say(parts[0])
+        blocks = []
+        for part in parts:
+            for chunk in sections(part):
+                blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": chunk}})
+        response = None
+        for start in range(0, len(blocks), MAX_BLOCKS):
+            batch = blocks[start : start + MAX_BLOCKS]
+            # The text is only shown in notifications, the blocks are what's displayed
+            response = self.say(text=batch[0]["text"]["text"], blocks=batch)
+        return response
+
+    def __enter__(self) -> "MessageBuffer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        # Post what we have even if the command failed part way, it's usually the useful bit
+        self.flush()
+
+
+def buffered(func: object) -> object:
+    """Decorates a command taking a `say` argument so everything it says is posted as one message
+    when it returns. The command can call say.flush() to post what it has so far."""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        with MessageBuffer(bound.arguments["say"]) as buffer:
+            bound.arguments["say"] = buffer
+            return func(*bound.args, **bound.kwargs)
+
+    return wrapper
+
+
+def checkpoint(say: object) -> object:
+    """Posts whatever has been buffered so far, if say is a MessageBuffer, and returns Slack's response
+    for the last message posted (or None)"""
+    if isinstance(say, MessageBuffer):
+        return say.flush()
+    return None
@@ -0,0 +1,100 @@
+"""Membership of the @nocteam usergroup (*****************), used to lock keywords to CloudOps.
+
+The member list is cached in memory for MEMBERSHIP_TTL seconds and in the shared state store for
+SHARED_TTL seconds, so a new container normally reads it from there instead of asking Slack. Both are
+dropped when Slack tells us the group changed (a subteam_members_changed event, see invalidate)."""
+import os
+import time
+from scripts import http_client, slack, state  # pylint: disable=import-error
+from scripts.get_secret import get_secret, refresh_secret_after_auth_failure  # pylint: disable=import-error
+
+# Need to have secrets available before any other execution happens.
+secrets = get_secret()
+
+NOC_GROUP = "*****************"
+# Seconds a member list is trusted in memory before looking again. Looking again is normally a read from
+# the shared store rather than a slack call, and is how other containers notice a change to the group.
+MEMBERSHIP_TTL = int(os.environ.get("AUTOBOT_NOC_CACHE_TTL", "60"))
+# Seconds the member list is kept in the shared state store. Changes to the group clear it straight away,
+# so this only matters if an event is missed. 0 turns the shared copy off.
+SHARED_TTL = int(os.environ.get("AUTOBOT_NOC_SHARED_TTL", "3600"))
+SHARED_KEY = f"nocteam:{NOC_GROUP}"
+
+_cache = {"users": None, "fetched_at": None}
+
+
+def get_noc_user_list() -> dict:
+    """Pulls the member list of the @nocteam usergroup from slack"""
+    header_data = {"Authorization": f"Bearer {secrets['token']}"}
+    payload = {"usergroup": NOC_GROUP}
+    return http_client.get(
+        "https://slack.com/api/usergroups.users.list", headers=header_data, params=payload
+    ).json()
+
+
+def get_shared_users() -> set:
+    """The member list from the shared state store, or None if it isn't there (or can't be reached)"""
+    if SHARED_TTL <= 0:
+        return None
+    try:
+        item = state.get(SHARED_KEY)
+    except BaseException as err:
+        print(f"Unable to read the @nocteam members from the state store:\n{err}")
+        return None
+    if item is None:
+        return None
+    return set(item["users"])
+
+
+def put_shared_users(users: set) -> None:
+    """Saves the member list to the shared state store for other containers"""
+    if SHARED_TTL <= 0:
+        return
+    try:
+        state.put(SHARED_KEY, {"users": sorted(users)}, SHARED_TTL)
+    except BaseException as err:
+        print(f"Unable to save the @nocteam members to the state store:\n{err}")
+
+
+def get_noc_users() -> set:
+    """Returns the set of @nocteam members, from memory if we looked within MEMBERSHIP_TTL,
+    then from the shared state store and otherwise from slack"""
+    fetched_at = _cache["fetched_at"]
+    if fetched_at is not None and time.monotonic() - fetched_at < MEMBERSHIP_TTL:
+        return _cache["users"]
+    users = get_shared_users()
+    if users is None:
+        response = get_noc_user_list()
+        # An auth error here most likely means the slack token was rotated underneath us
+        if response.get("error") in slack.AUTH_ERRORS and refresh_secret_after_auth_failure():
+            response = get_noc_user_list()
+        users = set(response["users"])
+        put_shared_users(users)
+    _cache["users"] = users
+    _cache["fetched_at"] = time.monotonic()
+    return _cache["users"]
+
+
+def invalidate(event: dict) -> None:
+    """Handles Slack's subteam_members_changed event, dropping the cached member list if it was @nocteam
+    that changed. Other containers pick up the change once their in-memory copy expires."""
+    if event.get("subteam_id") != NOC_GROUP:
+        return
+    print(f"@nocteam membership changed (added {event.get('added_users', [])}, removed {event.get('removed_users', [])})")
+    _cache["users"] = None
+    _cache["fetched_at"] = None
+    if SHARED_TTL <= 0:
+        return
+    try:
+        state.delete(SHARED_KEY)
+    except BaseException as err:
+        print(f"Unable to clear the @nocteam members from the state store:\n{err}")
+
+
+def check_user_is_noc(user: str) -> bool:
+    """Check if user invoking tool is a member of the @nocteam usergroup (*****************) in slack"""
+    if user in get_noc_users():
+        print("User appears to be in the @nocteam")
+        return True
+    print("User is NOT in the @nocteam")
+    return False
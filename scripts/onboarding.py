@@ -1,7 +1,7 @@
 """CloudOps Only utility to quickly on/offboard members of SaaSOps"""
-import re
-import requests
+from scripts import concurrency, progress, validation  # pylint: disable=import-error
 from scripts.get_secret import get_secret  # pylint: disable=import-error
+from scripts.slack import do_say  # pylint: disable=import-error
 from scripts.services.datadog import DataDogOnBoarder  # pylint: disable=import-error
 from scripts.services.alertsite import AlertSiteOnBoarder  # pylint: disable=import-error
 from scripts.services.sumologic import SumoLogicOnBoarder  # pylint: disable=import-error
@@ -11,204 +11,98 @@ from scripts.services.digicert import DigiCertOnBoarder  # pylint: disable=impor
 secrets = get_secret()
 
 
-def do_say(thing: str, say: object) -> object:
-    """Does a "say" to slack while printing that say to the logs"""
-    print(f"Doing say: {thing}")
-    say_response = say(thing)
-    return say_response
-
-
-def delete_slack_message(message_id, channel_id):
-    """Deletes a slack message for situations in which we have no
-    response URL and cannot override previous messages"""
-    url = "https://slack.com/api/chat.delete"
-    headers = {"authorization": f"Bearer {secrets['token']}"}
-    payload = {"channel": f"{channel_id}", "ts": f"{message_id}"}
-    response = requests.post(url, json=payload, headers=headers)
-    output = response.json()
-    return output
-
-
-def index_in_list(a_list: list, index: int) -> bool:
-    """Verifies if a given index exists in a list"""
-    return index < len(a_list)
-
-
-def onboard(options: list, user_id: str, say: object) -> None:
+def onboard(options: list, user_id: str, channel: str, say: object) -> None:
     """Primary onboard function handler"""
-    if index_in_list(options, 3) is False or index_in_list(options, 5) is True:
-        response = f"Sorry <@{user_id}>, You seem to have provided the wrong number of options!\n\nThis keyword takes two (2) arguments: *First Name* and *Last Name*.\n\nExample: `@AutoBot onboard Billie Jean.`\n\nYou can optionally supply a custom email address as a third argument if different than usual.`\nTry `@AutoBot onboard help` for help."
+    response = validation.onboard_options(options, user_id)
+    if response is not None:
         do_say(response, say)
         return
     first_name = options[2].title()
     last_name = options[3].title()
-    if index_in_list(options, 4) is True:  # options[4] is likely to be a custom email address
-        email = re.search("mailto:(.+)\|", options[4].lower())  # pylint: disable=anomalous-backslash-in-string
-        if email is None:
-            response = f"Sorry <@{user_id}>, I'm having trouble deciphering the email you've specified. Note that you may only offboard `@*****************.com` email addresses.\n\nYou specified: {options[2]}\n\nExample: `@AutoBot onboard Billie Jean billie.jean@*****************.com`\n\nTry `@AutoBot onboard help` for help."
-            do_say(response, say)
-            return
-        else:
-            email = email.group(1)
-        if "@*****************.com" not in email[-15:]:
-            response = f"Sorry <@{user_id}>, You may only onboard `@*****************.com` email addresses!\nYou specified '{options[4]}'\n\nExample: `@AutoBot onboard Billie Jean billie.jean@*****************.com`\n\nTry `@AutoBot onboard help` for help."
-            do_say(response, say)
-            return
-        elif "@" in options[2] or "@" in options[3]:
-            response = f"Sorry <@{user_id}>, You may possibly be trying to specify things in the wrong order...\nYou specified the following values, please double check and try again:\nFirst Name: {first_name}\nLast Name: {last_name}\nEmail Address: {email}\n\nExample: `@AutoBot onboard Billie Jean billie.jean@*****************.com`\n\nTry `@AutoBot onboard help` for help."
-            do_say(response, say)
-            return
-        elif email == "*****************":
-            response = f"Sorry <@{user_id}>, I cannot on/offboard ***************** it would break stuff."
-            do_say(response, say)
-            return
+    email = validation.boarding_email(options)
+    if email:
         response = (
             f'Starting the onboarding process for "{first_name} {last_name}", using "{email}."'
         )
-        do_say(response, say)
     else:
         email = None
         response = f"Starting the onboarding process for \"{first_name} {last_name}\", using computed email \"{first_name.lower()+'.'+last_name.lower()+'@*****************.com'}.\""
-        do_say(response, say)
+    print(f"Doing progress say: {response}")
+    progress_message = progress.ProgressMessage.post(say, response, list(boarders(first_name, last_name, email)))
 
-    onboarder_list = []
-    if email:
-        datadog = DataDogOnBoarder(
+    run_boarders(first_name, last_name, email, "onboard", progress_message)
+
+    progress_message.finish(f"{response}\n\nOnboarding process completed! :party_chewbacca:")
+
+
+def boarders(first_name, last_name, email) -> dict:
+    """Service name -> function building that service's on/offboarder. Building some of them already
+    calls out to the service (e.g. for an auth token), so that's done concurrently too.
+    email may be None, in which case each service computes it from the user's name."""
+    return {
+        "DataDog": lambda: DataDogOnBoarder(
             api_key=secrets["DD-API-KEY"],
             app_key=secrets["DD-APPLICATION-KEY"],
             first_name=first_name,
             last_name=last_name,
             email=email,
-        )
-        alertsite = AlertSiteOnBoarder(
+        ),
+        "AlertSite": lambda: AlertSiteOnBoarder(
             user=secrets["alertsite_user"],
             passwd=secrets["alertsite_pass"],
             first_name=first_name,
             last_name=last_name,
             email=email,
-        )
-        sumologic = SumoLogicOnBoarder(
+        ),
+        "SumoLogic": lambda: SumoLogicOnBoarder(
             access_id=secrets["sumo_access_id"],
             access_key=secrets["sumo_access_key"],
             first_name=first_name,
             last_name=last_name,
             email=email,
-        )
-        digicert = DigiCertOnBoarder(
-            api_key=secrets["digicert_api_key"],
-            first_name=first_name,
-            last_name=last_name,
-            email=email,
-        )
-    else:
-        datadog = DataDogOnBoarder(
-            api_key=secrets["DD-API-KEY"],
-            app_key=secrets["DD-APPLICATION-KEY"],
-            first_name=first_name,
-            last_name=last_name,
-        )
-        alertsite = AlertSiteOnBoarder(
-            user=secrets["alertsite_user"],
-            passwd=secrets["alertsite_pass"],
-            first_name=first_name,
-            last_name=last_name,
-        )
-        sumologic = SumoLogicOnBoarder(
-            access_id=secrets["sumo_access_id"],
-            access_key=secrets["sumo_access_key"],
-            first_name=first_name,
-            last_name=last_name,
-        )
-        digicert = DigiCertOnBoarder(
-            api_key=secrets["digicert_api_key"], first_name=first_name, last_name=last_name
-        )
-    onboarder_list.append(datadog)
-    onboarder_list.append(alertsite)
-    onboarder_list.append(sumologic)
-    onboarder_list.append(digicert)
-
-    for service in onboarder_list:
-        onboard_result = service.onboard()
-        response = onboard_result["message"]
-        do_say(response, say)
-
-    response = "Onboarding process completed! :party_chewbacca:"
-    do_say(response, say)
-
-
-def offboard(first_name, last_name, email, say) -> None:
-    """Primary offboard function handler"""
-    offboarder_list = []
-
-    datadog = DataDogOnBoarder(
-        api_key=secrets["DD-API-KEY"],
-        app_key=secrets["DD-APPLICATION-KEY"],
-        first_name=first_name,
-        last_name=last_name,
-        email=email,
-    )
-    alertsite = AlertSiteOnBoarder(
-        user=secrets["alertsite_user"],
-        passwd=secrets["alertsite_pass"],
-        first_name=first_name,
-        last_name=last_name,
-        email=email,
-    )
-    sumologic = SumoLogicOnBoarder(
-        access_id=secrets["sumo_access_id"],
-        access_key=secrets["sumo_access_key"],
-        first_name=first_name,
-        last_name=last_name,
-        email=email,
-    )
-    digicert = DigiCertOnBoarder(
-        api_key=secrets["digicert_api_key"], first_name=first_name, last_name=last_name, email=email
+        ),
+        "DigiCert": lambda: DigiCertOnBoarder(
+            api_key=secrets["digicert_api_key"], first_name=first_name, last_name=last_name, email=email
+        ),
+    }
+
+
+def run_boarders(first_name, last_name, email, action, progress_message) -> None:
+    """Runs every service's onboard() or offboard() (action) at the same time,
+    showing each one's result on progress_message as soon as it's done"""
+
+    def run_service(service_name, build):
+        try:
+            response = getattr(build(), action)()["message"]
+        except BaseException as err:
+            response = f"Something went wrong trying to {action} {first_name} {last_name} in {service_name}:\n{err}"
+        print(f"{service_name}: {response}")
+        progress_message.set(service_name, response)
+
+    services = boarders(first_name, last_name, email)
+    concurrency.run_concurrently(
+        [lambda name=name, build=build: run_service(name, build) for name, build in services.items()]
     )
 
-    offboarder_list.append(datadog)
-    offboarder_list.append(alertsite)
-    offboarder_list.append(sumologic)
-    offboarder_list.append(digicert)
 
-    for service in offboarder_list:
-        offboard_result = service.offboard()
-        response = offboard_result["message"]
-        do_say(response, say)
+def offboard(first_name, last_name, email, progress_message) -> None:
+    """Primary offboard function handler"""
+    run_boarders(first_name, last_name, email, "offboard", progress_message)
 
-    response = "Offboarding process completed! :bye_boo:"
-    do_say(response, say)
+    progress_message.finish(f"{progress_message.title}\n\nOffboarding process completed! :bye_boo:")
 
 
-def kickoff_offboard(options: list, user_id: str, say: object):
+def kickoff_offboard(options: list, user_id: str, channel: str, say: object):
     """Triggers the offboarding process after parsing and verifying user input
     Assuming all is well, this function will send an "are you sure" prompt to be handled later"""
-    if index_in_list(options, 3) is False or index_in_list(options, 5) is True:
-        response = f"Sorry <@{user_id}>, You seem to have provided the wrong number of options!\n\nThis keyword takes two (2) arguments: *First Name* and *Last Name*.\n\nExample: `@AutoBot offboard Billie Jean.\n\nYou can optionally supply a custom email address as a third argument if different than usual.`\nTry `@AutoBot offboard help` for help."
+    response = validation.offboard_options(options, user_id)
+    if response is not None:
         do_say(response, say)
         return
     first_name = options[2].title()
     last_name = options[3].title()
-    if index_in_list(options, 4) is True:  # options[4] is likely to be a custom email address
-        email = re.search("mailto:(.+)\|", options[4].lower())  # pylint: disable=anomalous-backslash-in-string
-        if email is None:
-            response = f"Sorry <@{user_id}>, I'm having trouble deciphering the email you've specified. Note that you may only offboard `@*****************.com` email addresses.\n\nYou specified: {options[2]}\n\nExample: `@AutoBot offboard Billie Jean billie.jean@*****************.com`\n\nTry `@AutoBot offboard help` for help."
-            do_say(response, say)
-            return
-        else:
-            email = email.group(1)
-        if "@*****************.com" not in email[-15:].casefold():
-            response = f"Sorry <@{user_id}>, You may only offboard `@*****************.com` email addresses!\nYou specified '{options[4]}'\n\nExample: `@AutoBot offboard Billie Jean billie.jean@*****************.com`\n\nTry `@AutoBot offboard help` for help."
-            do_say(response, say)
-            return
-        elif "@" in options[2] or "@" in options[3]:
-            response = f"Sorry <@{user_id}>, You may possibly be trying to specify things in the wrong order...\nYou specified the following values, please double check and try again:\nFirst Name: {first_name}\nLast Name: {last_name}\nEmail Address: {email}\n\nExample: `@AutoBot offboard Billie Jean billie.jean@*****************.com`\n\nTry `@AutoBot offboard help` for help."
-            do_say(response, say)
-            return
-        elif email == "*****************":
-            response = f"Sorry <@{user_id}>, I cannot on/offboard *****************, it would break stuff."
-            do_say(response, say)
-            return
-    else:
+    email = validation.boarding_email(options)
+    if email is None:
         email = f"{first_name.lower()}.{last_name.lower()}@*****************.com"
     blocks = [
         {
@@ -261,11 +155,6 @@ def kickoff_offboard(options: list, user_id: str, say: object):
 
 def handle_offboarding(body, say):
     """Triggers when the user confirms the "are you sure" prompt"""
-    # Container section of the body has message ID and channel ID needed to delete the block we sent previously
-    container = body["container"]
-    channel_id = container["channel_id"]
-    message_id = container["message_ts"]
-
     # Actions section of body contains the values of the button(s) the user clicked, which we parse for first_name, last_name and email
     actions = body["actions"]  # Returns a list
     actions_payload = actions[0]  # Returns dict
@@ -276,20 +165,23 @@ def handle_offboarding(body, say):
     email = options[2]
     print(f"Detected Options:\nFirst Name: {first_name}\nLast Name: {last_name}\nEmail: {email}")
 
-    delete_slack_message(message_id, channel_id)
+    # Turn the "are you sure" prompt into the offboarding status, rather than deleting it and posting again
     response = f'Starting the offboarding process for "{first_name} {last_name}", using "{email}".'
-    do_say(response, say)
+    print(f"Doing progress update: {response}")
+    progress_message = progress.ProgressMessage.replace(
+        body, response, list(boarders(first_name, last_name, email)), say
+    )
 
-    offboard(first_name, last_name, email, say)
+    offboard(first_name, last_name, email, progress_message)
 
 
 def handle_offboarding_nevermind(body, say):
     """Triggers if the user changes their mind and elects not to proceed on the "are you sure" warning."""
-    # Container section of the body has message ID and channel ID needed to delete the block we sent previously
+    # Container section of the body has message ID and channel ID needed to edit the block we sent previously
     container = body["container"]
     channel_id = container["channel_id"]
     message_id = container["message_ts"]
 
-    delete_slack_message(message_id, channel_id)
     response = "Okay :ok_hand: I wont offboard the user."
-    do_say(response, say)
+    print(f"Doing progress update: {response}")
+    progress.update_message(channel_id, message_id, response)
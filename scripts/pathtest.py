@@ -1,40 +1,94 @@
 """Module to send path tests via ***"""
+import os
 import random
 import string
+import threading
 import time
+import uuid
 import json
 import calendar
 import datetime
-import boto3
-import requests
+from scripts import deadline as invocation_deadline  # pylint: disable=import-error
+from scripts import concurrency, confirmations, http_client, messages, polling, ratelimit, regions, resources  # pylint: disable=import-error
 from scripts.get_secret import get_secret  # pylint: disable=import-error
+from scripts.slack import do_say  # pylint: disable=import-error
 
 # Need to have secrets available before any other execution happens.
 secrets = get_secret()
 
+PATH_LABELS = {"SMS": "SMS", "VOICE": "Voice", "EMAIL": "Email"}
+# Longest we poll ***** for a new incident's details, and a rough worst case for one notification.
+INCIDENT_POLL_TIMEOUT = float(os.environ.get("AUTOBOT_INCIDENT_POLL_TIMEOUT", "12"))
+SECONDS_PER_NOTIFICATION = INCIDENT_POLL_TIMEOUT + 3
+# Path test tracking records, looked up by response_sub_handler.py when confirmations come in
+TRACKING_TABLE = "autobot_path_testing"
+# batch_write_item takes at most 25 items, and may leave some unprocessed when throttled
+BATCH_SIZE = 25
+BATCH_ATTEMPTS = 4
 
-def store_test_info(ebid: int, delivery_url: str, channel_id: str) -> None:
-    """Stores incidentID (ebid), Calculated TTL, Delivery URL and Channel ID for future lookup"""
+
+def test_info_item(ebid: int, delivery_url: str, channel_id: str, run_id: str) -> dict:
+    """Tracking record of incidentID (ebid), Calculated TTL, Delivery URL, Channel ID and the path test
+    run it belongs to for future lookup"""
     ttl_time = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
     ttl_utc_time = calendar.timegm(ttl_time.utctimetuple())
 
-    dynamodb = boto3.resource("dynamodb")
-    table = dynamodb.Table("autobot_path_testing")
-    table.put_item(
-        Item={
-            "id": ebid,
-            "TTL": ttl_utc_time,
-            "delivery_url": delivery_url,
-            "channel_id": channel_id,
-        }
-    )
+    return {
+        "id": ebid,
+        "TTL": ttl_utc_time,
+        "delivery_url": delivery_url,
+        "channel_id": channel_id,
+        "run_id": run_id,
+    }
+
 
+class TestInfoWriter:
+    """Stores the tracking records of a command's notifications with batch_write_item, instead of a
+    put_item per notification. Each notification is flushed as soon as it has been sent, since its
+    recipients can confirm straight away and response_sub_handler needs the record by then. Records
+    of notifications that finish at the same time go out in the same batch."""
 
-def do_say(thing: str, say: object) -> None:
-    """Does a "say" to slack while printing that say to the logs"""
-    print(f"Doing say: {thing}")
-    say_response = say(thing)
-    return say_response
+    def __init__(self, run_id: str) -> None:
+        self.run_id = run_id
+        self.items = []
+        self.unwritten = []
+        self.lock = threading.Lock()
+
+    def add(self, ebid: int, delivery_url: str, channel_id: str) -> None:
+        """Queues the tracking record for one notification"""
+        with self.lock:
+            self.items.append(test_info_item(ebid, delivery_url, channel_id, self.run_id))
+
+    def flush(self) -> list:
+        """Stores everything queued so far, retrying whatever DynamoDB leaves unprocessed.
+        Returns the items that couldn't be stored, which are also kept in self.unwritten."""
+        with self.lock:
+            items, self.items = self.items, []
+        if not items:
+            return []
+        unwritten = []
+        for start in range(0, len(items), BATCH_SIZE):
+            pending = {TRACKING_TABLE: [{"PutRequest": {"Item": item}} for item in items[start : start + BATCH_SIZE]]}
+            try:
+                for attempt in range(BATCH_ATTEMPTS):
+                    print(f"Storing {len(pending[TRACKING_TABLE])} test record(s) in DB")
+                    response = resources.with_credential_retry(
+                        lambda: resources.get_dynamodb().batch_write_item(RequestItems=pending)
+                    )
+                    pending = response.get("UnprocessedItems") or {}
+                    if not pending.get(TRACKING_TABLE):
+                        break
+                    if attempt < BATCH_ATTEMPTS - 1:
+                        # Unprocessed items mean we're being throttled, so give the table a moment
+                        time.sleep(ratelimit.backoff_delay(attempt))
+            except BaseException as err:
+                print(f"Error storing test records in DB:\n{err}")
+            unwritten += [request["PutRequest"]["Item"] for request in pending.get(TRACKING_TABLE, [])]
+        if unwritten:
+            print(f"Unable to store test records in DB: {unwritten}")
+            with self.lock:
+                self.unwritten += unwritten
+        return unwritten
 
 
 def send_notification(slack_users: list, test_type: str, stack: str) -> dict:
@@ -59,7 +113,7 @@ def send_notification(slack_users: list, test_type: str, stack: str) -> dict:
     payload = {}
     print(f"Sending the following notification payload to ***: {notification_data.items()}")
     try:
-        response = requests.post(api_endpoint, headers=header_data, json=notification_data)
+        response = http_client.post(api_endpoint, headers=header_data, json=notification_data)
     except BaseException as err:
         payload["ok"] = False
         payload[
@@ -86,65 +140,114 @@ def send_notification(slack_users: list, test_type: str, stack: str) -> dict:
         ] = f"I received an unexpected response from ***** :trynottocry:\nThis likely means the notification wasn't sent. Specifically, ***** did not indicate that the incident is in progress like we expect it to. Here's what I received:\n```{response.text}```"
         return payload
 
-    # This delay helps ensure the notification/incident actually kicked off. Might need to increase.
-    # We don't receive the delivery details URL or incidentID until the second query.
-    print("Waiting 3 seconds to retrieve incidentID")
-    time.sleep(3)
+    # ***** only has the incidentID and delivery details URL once the incident has been created,
+    # which can take anywhere from under a second to several, so poll for them.
+    def fetch_status():
+        updated_response = http_client.get(f"{api_endpoint}/status/{random_id}", headers=header_data)
+        print(f"Received the following response from ***: {json.dumps(updated_response.text, indent=4)}")
+        return updated_response
 
-    try:
-        updated_response = requests.get(f"{api_endpoint}/status/{random_id}", headers=header_data)
-        print(
-            f"Received the following response from ***: {json.dumps(updated_response.text, indent=4)}"
-        )
-    except BaseException as err:
+    outcome = polling.poll("incident status", fetch_status, incident_status, INCIDENT_POLL_TIMEOUT)
+    updated_response = outcome["result"]
+
+    if outcome["status"] == polling.ERROR:
+        err = outcome["error"]
         payload["ok"] = False
-        payload = {
-            "message": f"I encountered an error connecting to ***** on the followup, which is required to obtain incident information. :trynottocry:\nThis likely means the notification wasn't sent. Here's the error:\n```{err}```"
-        }
+        payload[
+            "message"
+        ] = f"I encountered an error connecting to ***** on the followup, which is required to obtain incident information. :trynottocry:\nThis likely means the notification wasn't sent. Here's the error:\n```{err}```"
         print(f"Received error connecting:\n{err}")
         return payload
 
-    try:
-        status = updated_response.json()["incidentStatus"]
-    except:
+    if updated_response is None or "incidentStatus" not in status_fields(updated_response):
         payload["ok"] = False
         payload[
             "message"
-        ] = f"I received an unexpected response from ***** :trynottocry:\nThis likely means the notification wasn't sent. Specifically I was unable to detect a 'incidentStatus' field on the second response. Here's what I received:\n```{updated_response.text}```"
+        ] = f"I received an unexpected response from ***** :trynottocry:\nThis likely means the notification wasn't sent. Specifically I was unable to detect a 'incidentStatus' field on the second response. Here's what I received:\n```{updated_response.text if updated_response is not None else None}```"
         return payload
 
-    if status == "NOTCREATED":
+    fields = status_fields(updated_response)
+    if fields["incidentStatus"] == "NOTCREATED":
         payload["ok"] = False
         payload[
             "message"
         ] = f"***** indicates that the incident is stuck on 'NOTCREATED' status. :trynottocry:\nThis usually mean the payload we sent to ***** could not be processed. Did someone mess with the Webhook configs? \nThis basically guarantees that the notification wasn't sent. Here's the response I received:\n```{response.text}```"
         return payload
 
-    for i in range(1, 3):
-        try:
-            incident_id = updated_response.json()["*****************ID"]
-            delivery_url = updated_response.json()["deliveryDetailsURL"]
-        except:
-            print(f"Failed to detect either incidentID or deliveryURL, backing off for {i} seconds...")
-            time.sleep(i)
-            continue
-        else:
-            if incident_id is None or delivery_url is None:
-                payload["ok"] = False
-                payload[
-                    "message"
-                ] = f"I was unable to obtain an incidentID or the deliveryDetailsURL from ***** :trynottocry:\nThis could mean an invalid contact was used. Try using the 'update' keyword to update your contact info.\n\nIt's possible the notification wasn't sent, but even if it was I wont be able to properly detect confirmations, even if they are working. Here's what I received from *****:\n```{response.text}```"
-                return payload
-            else:
-                payload["ok"] = True
-                payload["incident_id"] = incident_id
-                payload["delivery_url"] = delivery_url
-                payload["message"] = "ok"
-                return payload
+    if "*****************ID" not in fields or "deliveryDetailsURL" not in fields:
+        payload["ok"] = False
+        payload[
+            "message"
+        ] = f"***** never gave me an incidentID or deliveryDetailsURL :trynottocry:\nIt's possible the notification was sent, but I wont be able to properly detect confirmations. Here's the last response I received:\n```{updated_response.text}```"
+        return payload
+
+    incident_id = fields["*****************ID"]
+    delivery_url = fields["deliveryDetailsURL"]
+    if incident_id is None or delivery_url is None:
+        payload["ok"] = False
+        payload[
+            "message"
+        ] = f"I was unable to obtain an incidentID or the deliveryDetailsURL from ***** :trynottocry:\nThis could mean an invalid contact was used. Try using the 'update' keyword to update your contact info.\n\nIt's possible the notification wasn't sent, but even if it was I wont be able to properly detect confirmations, even if they are working. Here's what I received from *****:\n```{response.text}```"
+        return payload
+    payload["ok"] = True
+    payload["incident_id"] = incident_id
+    payload["delivery_url"] = delivery_url
+    payload["message"] = "ok"
+    return payload
+
+
+def status_fields(status_response: object) -> dict:
+    """The body of an incident status response, or {} if it isn't a JSON object"""
+    try:
+        fields = status_response.json()
+    except BaseException:
+        return {}
+    return fields if isinstance(fields, dict) else {}
 
 
-def path_test(options, uid, channel, say):
-    """Sends SMS/Email/Voice messages from *** to confirm messages are leaving the platform"""
+def incident_status(status_response: object) -> str:
+    """Tells polling.poll whether an incident status response is final"""
+    fields = status_fields(status_response)
+    if "incidentStatus" not in fields:
+        return polling.PENDING
+    if fields["incidentStatus"] == "NOTCREATED":
+        return polling.FAILED
+    if "*****************ID" in fields and "deliveryDetailsURL" in fields:
+        # Both present: either we have what we need or ***** is telling us it has nothing for us (None)
+        if fields["*****************ID"] is None or fields["deliveryDetailsURL"] is None:
+            return polling.FAILED
+        return polling.READY
+    return polling.PENDING
+
+
+def rollout(options, uid, channel, say):
+    """Fires all three path tests from both stacks to the invoker"""
+    rollout_options = ["<@*****************>", "test", "sms", "voice", "email", "us", "eu"]
+    path_test(rollout_options, uid, channel, say)
+
+
+def send_path_test(users: list, path: str, stack: str, channel: str, deadline: object, tracking: TestInfoWriter) -> dict:
+    """Sends one path from one stack and stores its record for confirmation reporting.
+    Returns send_notification's result, or None if there wasn't time left to send it."""
+    if deadline.expired(needed=SECONDS_PER_NOTIFICATION):
+        print(f"Running out of time ({deadline}), skipping {PATH_LABELS[path]} from {stack}")
+        return None
+    result = regions.run(stack, "scripts.pathtest:send_notification", users, path.lower(), stack)
+    if result["ok"] is True:
+        print(
+            f"Storing info in DB:\nincident_id: {result['incident_id']}\ndelivery_url: {result['delivery_url']}\nchannel: {channel}"
+        )
+        tracking.add(int(result["incident_id"]), result["delivery_url"], channel)
+        # Its recipients may confirm before the other notifications are sent, so don't wait for them
+        tracking.flush()
+    return result
+
+
+@messages.buffered
+def path_test(options, uid, channel, say, deadline=None):
+    """Sends SMS/Email/Voice messages from *** to confirm messages are leaving the platform.
+    Notifications we don't have time left for are skipped and reported."""
+    deadline = deadline or invocation_deadline.current()
     paths = []
     stacks = []
     users = []
@@ -177,7 +280,7 @@ def path_test(options, uid, channel, say):
     users_to_send = "<@" + users_to_send + ">"
     if len(stacks) == 0:  # If no stack is specified, default to US
         stacks.append("US")
-    stacks_trimmed = set(stacks) # To ensure that we are only sending to 2 stacks maximum
+    stacks_trimmed = list(dict.fromkeys(stacks))  # To ensure that we are only sending to 2 stacks maximum, in a fixed order
     stacks_to_send = ", ".join(stacks_trimmed)
 
     if len(bad_options) > 0:
@@ -193,70 +296,62 @@ def path_test(options, uid, channel, say):
     else:
         response = f"Sending a test message to following path(s):\n{paths_to_send}.\n\nTo the following users:\n{users_to_send}\n\nFrom the following stack(s): {stacks_to_send}\n"
         do_say(response, say)
+        # Post that straight away, errors and the reports are posted together once everything is sent
+        messages.checkpoint(say)
         results = []
         urls_list = []
-        for path in paths:
-            if path == "SMS":
-                for stack in stacks_trimmed:
-                    sms_result = send_notification(users, "sms", stack)
-                    if sms_result["ok"] is False:
-                        results.append("bad")
-                        response = f"Error sending SMS from {stack} stack:\n{sms_result['message']}"
-                        do_say(response, say)
-                    else:
-                        print(
-                            f"Storing info in DB:\nincident_id: {sms_result['incident_id']}\ndelivery_url: {sms_result['delivery_url']}\nchannel: {channel}"
-                        )
-                        store_test_info(
-                            int(sms_result["incident_id"]), sms_result["delivery_url"], channel
-                        )
-                        urls_list.append(
-                            {"stack": stack, "type": "SMS", "url": sms_result["delivery_url"]}
-                        )
-            elif path == "VOICE":
-                for stack in stacks_trimmed:
-                    voice_result = send_notification(users, "voice", stack)
-                    if voice_result["ok"] is False:
-                        results.append("bad")
-                        response = (
-                            f"Error sending Voice from {stack} stack:\n{voice_result['message']}"
-                        )
-                        do_say(response, say)
-                    else:
-                        print(
-                            f"Storing info in DB:\nincident_id: {voice_result['incident_id']}\ndelivery_url: {voice_result['delivery_url']}\nchannel: {channel}"
-                        )
-                        store_test_info(
-                            int(voice_result["incident_id"]), voice_result["delivery_url"], channel
-                        )
-                        urls_list.append(
-                            {"stack": stack, "type": "Voice", "url": voice_result["delivery_url"]}
-                        )
-            elif path == "EMAIL":
-                for stack in stacks_trimmed:
-                    email_result = send_notification(users, "email", stack)
-                    if email_result["ok"] is False:
-                        results.append("bad")
-                        response = (
-                            f"Error sending Email from {stack} stack:\n{email_result['message']}"
-                        )
-                        do_say(response, say)
-                    else:
-                        print(
-                            f"Storing info in DB:\nincident_id: {email_result['incident_id']}\ndelivery_url: {email_result['delivery_url']}\nchannel: {channel}"
-                        )
-                        store_test_info(
-                            int(email_result["incident_id"]), email_result["delivery_url"], channel
-                        )
-                        urls_list.append(
-                            {"stack": stack, "type": "Email", "url": email_result["delivery_url"]}
-                        )
+        skipped = []
+        # Every path and stack is sent at once, then reported in the order they were asked for
+        matrix = [(path, stack) for path in paths for stack in stacks_trimmed]
+        # Confirmations of this run's notifications are reported together, see scripts/confirmations.py
+        run_id = uuid.uuid4().hex[:12]
+        tracking = TestInfoWriter(run_id)
+        outcomes = concurrency.run_concurrently(
+            [
+                lambda path=path, stack=stack: send_path_test(users, path, stack, channel, deadline, tracking)
+                for path, stack in matrix
+            ]
+        )
+        # Each record was stored as its notification was sent, this only reports the ones that failed
+        tracking.flush()
+        unrecorded = tracking.unwritten
+        for (path, stack), result in zip(matrix, outcomes):
+            label = PATH_LABELS[path]
+            if isinstance(result, BaseException):
+                result = {"ok": False, "message": f"I ran into an unexpected error :trynottocry:\n```{result}```"}
+            if result is None:
+                skipped.append(f"{label} from {stack} stack")
+            elif result["ok"] is False:
+                results.append("bad")
+                response = f"Error sending {label} from {stack} stack:\n{result['message']}"
+                do_say(response, say)
+            else:
+                urls_list.append({"stack": stack, "type": label, "url": result["delivery_url"]})
+        if unrecorded:
+            unrecorded_urls = [item["delivery_url"] for item in unrecorded]
+            unrecorded_labels = [f"{i['stack']} Stack {i['type']}" for i in urls_list if i["url"] in unrecorded_urls]
+            response = f"I wasn't able to record the following notifications, so I won't be able to tell you about their confirmations:\n{', '.join(unrecorded_labels)}"
+            do_say(response, say)
+        if skipped:
+            response = f"I ran out of time before I could send the following, so they were *not* sent:\n{', '.join(skipped)}\n\nPlease run them again separately."
+            do_say(response, say)
+        response_2 = "\n".join([f"{i['stack']} Stack {i['type']}: <{i['url']}|Click Here for Delivery Report>" for i in urls_list])
+        summary = None
         if "bad" in results:
             response = "One or more errors have occurred sending to ***. Please see above errors. Any paths that did not report an error were successfully sent!"
-            do_say(response, say)
-        else:
-            response_2 = "\n".join([f"{i['stack']} Stack {i['type']}: <{i['url']}|Click Here for Delivery Report>" for i in urls_list])
+            summary = do_say(response, say)
+        elif skipped and urls_list:
+            response = f"Successfully sent the rest of the requested notifications.\n\nHere are the available notification reports. I will let you know if/when I receive any confirmations.\n{response_2}"
+            summary = do_say(response, say)
+        elif not skipped:
             response = (
                 f"Successfully sent all requested notifications! :data_party:\n\nHere are the available notification reports. I will let you know if/when I receive any confirmations.\n{response_2}"
             )
-            do_say(response, say)
+            summary = do_say(response, say)
+        if urls_list:
+            # Confirmations for the run are reported in a thread under the summary
+            summary = messages.checkpoint(say) or summary
+            try:
+                confirmations.set_thread(run_id, channel, summary["ts"])
+            except BaseException as err:
+                print(f"Unable to record the summary message for run {run_id}, confirmations won't be threaded:\n{err}")
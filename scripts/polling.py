@@ -0,0 +1,114 @@
+"""Polls an upstream until something it's working on is ready, e.g. an incident ***** is creating.
+
+Instead of sleeping for a fixed time and then checking a couple of times, poll() checks early (after
+INITIAL_INTERVAL) and backs off exponentially up to MAX_INTERVAL, stopping as soon as the result says
+it's ready or has failed, when the poll's timeout is up or the invocation's deadline is close.
+Every attempt is counted in a histogram of seconds since the poll started (see get_histograms), which
+is logged after each poll so the intervals can be tuned against how long things really take."""
+import os
+import random
+import threading
+import time
+from scripts import circuit, deadline as invocation_deadline  # pylint: disable=import-error
+
+INITIAL_INTERVAL = float(os.environ.get("AUTOBOT_POLL_INITIAL_INTERVAL", "0.5"))
+MAX_INTERVAL = float(os.environ.get("AUTOBOT_POLL_MAX_INTERVAL", "4"))
+BACKOFF_FACTOR = 2
+
+# What classify() says about a result
+READY = "ready"
+FAILED = "failed"
+PENDING = "pending"
+# Outcomes of a poll besides READY and FAILED
+TIMED_OUT = "timed out"
+ERROR = "error"  # fetch() raised
+
+# Upper bounds (seconds since the poll started) of the histogram buckets
+BUCKETS = [0.5, 1, 2, 4, 8, 16, 32]
+LABELS = [f"<={bound}s" for bound in BUCKETS] + [f">{BUCKETS[-1]}s"]
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def bucket_label(seconds: float) -> str:
+    """Histogram bucket an attempt made `seconds` into a poll falls in"""
+    for bound, label in zip(BUCKETS, LABELS):
+        if seconds <= bound:
+            return label
+    return LABELS[-1]
+
+
+def record_attempt(name: str, seconds: float, status: str) -> None:
+    """Counts an attempt of the named poll in its histogram"""
+    with _histograms_lock:
+        buckets = _histograms.setdefault(name, {})
+        counts = buckets.setdefault(bucket_label(seconds), {})
+        counts[status] = counts.get(status, 0) + 1
+
+
+def get_histograms() -> dict:
+    """Attempts per poll name, by seconds since the poll started and what the attempt found"""
+    with _histograms_lock:
+        return {
+            name: {label: dict(buckets[label]) for label in LABELS if label in buckets}
+            for name, buckets in _histograms.items()
+        }
+
+
+def poll(
+    name: str,
+    fetch: object,
+    classify: object,
+    timeout: float,
+    initial_interval: float = INITIAL_INTERVAL,
+    max_interval: float = MAX_INTERVAL,
+) -> dict:
+    """Calls fetch() until classify(result) returns READY or FAILED, or timeout seconds have passed.
+    Exceptions from fetch() are retried like a PENDING result, except an open circuit breaker, which
+    stops the poll straight away.
+
+    Returns {"status": READY/FAILED/TIMED_OUT/ERROR, "result": the last result (or None),
+    "error": the last exception (or None), "attempts": number of calls, "seconds": time taken}."""
+    deadline = invocation_deadline.current()
+    start = time.monotonic()
+    interval = initial_interval
+    outcome = {"status": TIMED_OUT, "result": None, "error": None, "attempts": 0}
+    while True:
+        # Jittered, so concurrent polls (e.g. a rollout's notifications) don't all call at the same moment
+        wait = random.uniform(interval / 2, interval)
+        elapsed = time.monotonic() - start
+        if elapsed + wait > timeout or deadline.expired(needed=wait):
+            break
+        time.sleep(wait)
+        outcome["attempts"] += 1
+        try:
+            result = fetch()
+        except circuit.CircuitOpenError as err:
+            # The breaker won't close again before we'd give up, so polling on would only burn the time left
+            print(f"Polling {name} stopped on attempt {outcome['attempts']}: {err}")
+            outcome["error"] = err
+            outcome["status"] = ERROR
+            record_attempt(name, time.monotonic() - start, ERROR)
+            break
+        except Exception as err:
+            print(f"Polling {name} failed on attempt {outcome['attempts']}: {err}")
+            outcome["error"] = err
+            status = ERROR
+        else:
+            outcome["result"] = result
+            outcome["error"] = None
+            status = classify(result)
+        record_attempt(name, time.monotonic() - start, status)
+        if status in [READY, FAILED]:
+            outcome["status"] = status
+            break
+        interval = min(interval * BACKOFF_FACTOR, max_interval)
+    if outcome["status"] == TIMED_OUT and outcome["result"] is None and outcome["error"] is not None:
+        outcome["status"] = ERROR
+    outcome["seconds"] = round(time.monotonic() - start, 3)
+    print(
+        f"Polling {name}: {outcome['status']} after {outcome['attempts']} attempt(s) in {outcome['seconds']}s. "
+        f"Attempts so far by seconds since start: {get_histograms().get(name, {})}"
+    )
+    return outcome
@@ -0,0 +1,111 @@
+"""Status messages that are posted once and then edited in place as work completes.
+
+Long running flows used to post a "working on it" message, then delete it and post the result (or only
+report at the very end). A ProgressMessage shows a line per step (per network, per service...) and
+edits the same message with chat.update as each step finishes. Edits are throttled to one per
+MIN_INTERVAL seconds, which keeps well inside chat.update's rate limit however many steps there are."""
+import os
+import threading
+import time
+from scripts import http_client, messages, slack  # pylint: disable=import-error
+from scripts.get_secret import get_secret, refresh_secret_after_auth_failure  # pylint: disable=import-error
+
+# Seconds between edits of the same message. chat.update is tier 3 (about 50 a minute).
+MIN_INTERVAL = float(os.environ.get("AUTOBOT_PROGRESS_INTERVAL", "1.5"))
+
+PENDING = ":hourglass_flowing_sand: Waiting..."
+
+
+def update_message(channel: str, ts: str, text: str, blocks: list = None) -> dict:
+    """Replaces the text (and blocks, if given) of a message we posted earlier"""
+
+    def call():
+        payload = {"channel": channel, "ts": ts, "text": text}
+        if blocks is not None:
+            payload["blocks"] = blocks
+        headers = {"authorization": f"Bearer {get_secret()['token']}"}
+        return http_client.post("https://slack.com/api/chat.update", json=payload, headers=headers).json()
+
+    output = call()
+    if output.get("error") in slack.AUTH_ERRORS and refresh_secret_after_auth_failure():
+        output = call()
+    if output.get("ok") is not True:
+        print(f"Unable to update message {ts} in {channel}:\n{output}")
+    return output
+
+
+class ProgressMessage:
+    """A message with a title and a status line per step, kept up to date with chat.update.
+    Safe to update from several threads at once."""
+
+    def __init__(self, channel: str, ts: str, title: str, steps: list = (), say: object = None) -> None:
+        self.channel = channel
+        self.ts = ts
+        self.title = title
+        self.steps = {step: PENDING for step in steps}
+        self.say = say
+        self.updated_at = 0.0
+        self.timer = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def post(cls, say: object, title: str, steps: list = ()) -> "ProgressMessage":
+        """Posts a new progress message with say"""
+        progress = cls(None, None, title, steps, say)
+        response = say(text=title, blocks=progress.blocks())
+        progress.channel = response["channel"]
+        progress.ts = response["ts"]
+        progress.updated_at = time.monotonic()
+        return progress
+
+    @classmethod
+    def replace(cls, body: dict, title: str, steps: list = (), say: object = None) -> "ProgressMessage":
+        """Turns the message an action was clicked in (e.g. an "are you sure" prompt) into a progress message"""
+        container = body["container"]
+        progress = cls(container["channel_id"], container["message_ts"], title, steps, say)
+        progress.flush()
+        return progress
+
+    def blocks(self) -> list:
+        """The message as Block Kit blocks"""
+        blocks = [{"type": "section", "text": {"type": "mrkdwn", "text": chunk}} for chunk in messages.sections(self.title)]
+        if self.steps:
+            lines = "\n".join([f"*{step}*: {status}" for step, status in self.steps.items()])
+            blocks += [{"type": "divider"}] + [
+                {"type": "section", "text": {"type": "mrkdwn", "text": chunk}} for chunk in messages.sections(lines)
+            ]
+        return blocks[: messages.MAX_BLOCKS]
+
+    def set(self, step: str, status: str) -> None:
+        """Sets the status of a step, editing the message now or once MIN_INTERVAL has passed"""
+        with self.lock:
+            self.steps[step] = status
+            wait = self.updated_at + MIN_INTERVAL - time.monotonic()
+            if wait > 0:
+                # Another edit is due soon anyway, it will pick this change up
+                if self.timer is None:
+                    self.timer = threading.Timer(wait, self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+        self.flush()
+
+    def flush(self) -> dict:
+        """Edits the message to show the current status of every step"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.updated_at = time.monotonic()
+            text = self.title
+            blocks = self.blocks()
+        return update_message(self.channel, self.ts, text, blocks)
+
+    def finish(self, title: str = None) -> None:
+        """Shows the final status (with a new title, if given) straight away. If the message can't
+        be edited, the title is posted as a new message instead so the outcome isn't lost."""
+        if title is not None:
+            self.title = title
+        output = self.flush()
+        if output.get("ok") is not True and self.say is not None:
+            self.say(self.title)
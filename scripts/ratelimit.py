@@ -0,0 +1,255 @@
+"""Per-upstream rate limiting and retry backoff for scripts/http_client.py.
+
+Each upstream gets a token bucket (RATE calls per second on average, bursts of up to BURST) so calls only
+wait once the budget is actually used up, rather than sleeping before every call. Calls rejected with a 429
+(or a 5xx for calls that are safe to repeat) are retried with exponential backoff and jitter, waiting for
+Retry-After when the upstream gives one. Limits can be overridden with AUTOBOT_RATE_LIMITS, e.g.
+"telq=2:5,***=1:2" for (calls per second):(burst).
+
+Upstreams in SHARED (*** and TelQ by default) get one budget for all lambda containers rather than one
+each, kept as atomic counters in the shared state store (see scripts/state.py). Their budget is handed out
+per window of burst/rate seconds, and each container running a command gets a fair share of it: with
+three rollouts running at once, none of them can use up the whole window while the others wait."""
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from scripts import deadline as invocation_deadline  # pylint: disable=import-error
+from scripts import state  # pylint: disable=import-error
+
+# Upstream -> (calls per second, burst). Hosts not listed in UPSTREAMS aren't limited.
+LIMITS = {
+    "***": (0.5, 2),  # Contact API, per stack. Starts ignoring us if pushed much harder.
+    "*****": (1, 3),
+    "telq": (2, 5),
+    "slack:tier2": (20 / 60, 3),
+    "slack:tier3": (50 / 60, 5),
+    "slack:tier4": (100 / 60, 10),
+    "datadog": (5, 10),
+    "alertsite": (1, 3),
+    "sumologic": (4, 4),
+    "digicert": (3, 5),
+}
+for override in filter(None, os.environ.get("AUTOBOT_RATE_LIMITS", "").split(",")):
+    name, limit = override.split("=")
+    rate, burst = limit.split(":")
+    LIMITS[name.strip()] = (float(rate), int(burst))
+
+UPSTREAMS = {
+    "api.*****************.net": "***",
+    "api.*****************.eu": "***",
+    "api-stage.*****************.net": "***",
+    "*****-ingestion.*****************.net": "*****",
+    "*****-ingestion.*****************.eu": "*****",
+    "api.telqtele.com": "telq",
+    "api.datadoghq.com": "datadog",
+    "api.alertsite.com": "alertsite",
+    "api.sumologic.com": "sumologic",
+    "www.digicert.com": "digicert",
+}
+# Slack limits by API method, see https://api.slack.com/docs/rate-limits
+SLACK_TIERS = {
+    "usergroups.users.list": "slack:tier2",
+    "chat.delete": "slack:tier3",
+    "chat.update": "slack:tier3",
+    "users.info": "slack:tier4",
+}
+
+# Upstreams whose limits apply to all containers together, e.g. "***,telq". Set to "" to only limit per container.
+SHARED = [name.strip() for name in os.environ.get("AUTOBOT_SHARED_RATE_LIMITS", "***,telq").split(",") if name.strip()]
+# Identifies this container's calls in the shared counters. Each container runs one command at a time
+# on lambda, so sharing budget fairly between containers shares it between concurrent commands.
+CALLER_ID = uuid.uuid4().hex[:12]
+# Clock the shared windows are counted in. Wall clock time, as every container has to agree on the window.
+_now = time.time
+
+MAX_RETRIES = int(os.environ.get("AUTOBOT_HTTP_MAX_RETRIES", "3"))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20
+# Statuses worth retrying. Anything but a 429 might mean the call went through, so only repeat safe methods.
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+IDEMPOTENT_METHODS = ["GET", "HEAD", "OPTIONS", "PUT", "DELETE"]
+
+
+class TokenBucket:
+    """Hands out up to `burst` tokens at once, refilled at `rate` tokens per second"""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token and returns how long to wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(wait, self.paused_until - now)
+
+    def pause(self, seconds: float) -> None:
+        """Holds everyone off for `seconds`, e.g. when the upstream tells us to with Retry-After"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+# Bucket key -> how many containers were sharing it in the current and previous window
+_callers = {}
+_callers_lock = threading.Lock()
+
+
+def upstream_for(url: str) -> str:
+    """Name of the LIMITS entry that applies to url, or None"""
+    parts = urlsplit(url)
+    if parts.hostname == "slack.com":
+        return SLACK_TIERS.get(parts.path.rsplit("/", 1)[-1])
+    if parts.hostname and parts.hostname.endswith(".sumologic.com"):
+        return "sumologic"
+    return UPSTREAMS.get(parts.hostname)
+
+
+def bucket_key(url: str) -> str:
+    """Budget url's calls count against (one per host, as each stack has its own limits), or None"""
+    upstream = upstream_for(url)
+    if upstream not in LIMITS:
+        return None
+    return upstream if upstream.startswith("slack:") else f"{upstream}:{urlsplit(url).hostname}"
+
+
+def get_bucket(url: str) -> TokenBucket:
+    """This container's bucket for url's upstream, or None"""
+    key = bucket_key(url)
+    if key is None:
+        return None
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(*LIMITS[upstream_for(url)])
+        return _buckets[key]
+
+
+def fair_share(key: str, burst: int, window: int) -> int:
+    """How many of the window's `burst` calls this container may make, split evenly between the
+    containers seen using the budget lately"""
+    with _callers_lock:
+        seen = _callers.get(key)
+    callers = 1
+    if seen is not None and seen["window"] == window:
+        callers = max(seen["current"], seen["previous"])
+    elif seen is not None and seen["window"] == window - 1:
+        callers = seen["current"]
+    return max(1, math.ceil(burst / callers))
+
+
+def record_callers(key: str, window: int, callers: int) -> None:
+    """Remembers how many containers shared the budget in `window`"""
+    with _callers_lock:
+        seen = _callers.get(key)
+        if seen is not None and seen["window"] == window:
+            seen["current"] = max(seen["current"], callers)
+            return
+        previous = seen["current"] if seen is not None and seen["window"] == window - 1 else 1
+        _callers[key] = {"window": window, "current": callers, "previous": previous}
+
+
+def take_shared(key: str, upstream: str) -> float:
+    """Takes a call from the budget shared by all containers. Returns 0 if we got one,
+    otherwise how long to wait before trying again (when the next window starts)."""
+    rate, burst = LIMITS[upstream]
+    length = burst / rate
+    now = _now()
+    window = int(now // length)
+    item = state.take(f"ratelimit:{key}:{window}", burst, CALLER_ID, fair_share(key, burst, window), length * 2 + 60)
+    if item is not None:
+        record_callers(key, window, len([name for name in item if name.startswith("m_")]))
+        return 0.0
+    # Spread out the containers that were turned away so they don't all come back at once
+    return (window + 1) * length - now + random.uniform(0, 1 / rate)
+
+
+def acquire_shared(url: str, bucket: TokenBucket) -> bool:
+    """Waits until there is shared budget for another call to url's upstream.
+    Returns False if the shared counters can't be reached, so the caller can fall back to its own bucket."""
+    key = bucket_key(url)
+    upstream = upstream_for(url)
+    while True:
+        # Retry-After pauses are still per container
+        wait = bucket.paused_until - time.monotonic()
+        if wait <= 0:
+            try:
+                wait = take_shared(key, upstream)
+            except BaseException as err:
+                print(f"Unable to use the shared rate limit for {upstream}, limiting this container only:\n{err}")
+                return False
+            if wait <= 0:
+                return True
+        if invocation_deadline.current().expired(needed=wait):
+            # Going over only earns a 429, which http_client retries, while waiting here would eat into the
+            # time the command keeps back to report what it did
+            print(f"Not enough time left to wait {wait:.2f}s for {upstream}, calling anyway")
+            return True
+        print(f"Rate limiting {upstream} across containers, waiting {wait:.2f}s")
+        time.sleep(wait)
+
+
+def acquire(url: str) -> None:
+    """Waits until the upstream for url has budget for another call"""
+    bucket = get_bucket(url)
+    if bucket is None:
+        return
+    if upstream_for(url) in SHARED and acquire_shared(url, bucket):
+        return
+    wait = bucket.reserve()
+    if wait > 0:
+        print(f"Rate limiting {upstream_for(url)}, waiting {wait:.2f}s")
+        time.sleep(wait)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given (zero based) retry"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+
+
+def retry_after(response: object) -> float:
+    """Seconds asked for by a Retry-After header (in seconds or as a date), or None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(method: str, url: str, response: object, attempt: int) -> float:
+    """How long to wait before retrying the call that got `response`, or None if it shouldn't be retried
+    (it worked, retries are used up, it's not safe to repeat or there isn't enough time left)"""
+    if response.status_code not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+        return None
+    if response.status_code != 429 and method.upper() not in IDEMPOTENT_METHODS:
+        return None
+    delay = retry_after(response)
+    if delay is None:
+        delay = backoff_delay(attempt)
+    elif response.status_code == 429:
+        bucket = get_bucket(url)
+        if bucket is not None:
+            bucket.pause(delay)
+    if invocation_deadline.current().expired(needed=delay):
+        return None
+    print(f"Received {response.status_code} from {urlsplit(url).hostname}, retrying in {delay:.2f}s")
+    return delay
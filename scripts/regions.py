@@ -0,0 +1,102 @@
+"""Runs stack specific work in the region the stack lives in.
+
+Everything used to run from the US lambda, so every call to the EU stack (and the EU MongoDB) paid a
+transatlantic round trip, many times over for the TelQ and contact flows. run() sends a single unit of work
+(one of the ROUTABLE "module:function" targets, with JSON arguments) to a region worker lambda deployed next
+to the stack (region_worker.py) and returns its result. Stacks without a worker run the work in-process.
+
+AUTOBOT_EU_WORKER is the EU worker's function name or ARN, in AUTOBOT_EU_WORKER_REGION. Setting it to
+"local" runs the work in-process but still round trips the call through JSON, for testing offline.
+
+Some work (e.g. swapping SMS routes) must not run twice, so an invoke is sent once and never retried.
+If no answer comes back the outcome is unknown and reported as such.
+"""
+import json
+import os
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
+from scripts import deadline, resources  # pylint: disable=import-error
+from scripts.registry import resolve  # pylint: disable=import-error
+
+REGION_WORKERS = {
+    "EU": {
+        "function": os.environ.get("AUTOBOT_EU_WORKER", ""),
+        "region": os.environ.get("AUTOBOT_EU_WORKER_REGION", "eu-west-1"),
+    },
+}
+
+# Work units that may run remotely. Each takes and returns plain JSON (no clients, say functions, etc).
+ROUTABLE = [
+    "scripts.pathtest:send_notification",
+    "scripts.telq:create_contact",
+    "scripts.telq:send_notification",
+    "scripts.telq:delete_contact",
+    "scripts.contact:create_contact",
+    "scripts.smsprimary:find_routes",
+    "scripts.smsprimary:swap_routes",
+]
+
+# Work units that only read, so they can be run in-process when the region worker can't be reached.
+LOCAL_FALLBACK = ["scripts.smsprimary:find_routes"]
+
+# Longest a region worker may run (its lambda timeout). Invokes never wait longer than this.
+WORKER_TIMEOUT = int(os.environ.get("AUTOBOT_REGION_WORKER_TIMEOUT", "900"))
+# Invoke read timeouts are whole multiples of this, so the few in use each share one client.
+TIMEOUT_STEP = 30
+
+
+class RegionCallError(Exception):
+    """The region worker ran the work but it raised, or couldn't be reached to run it"""
+
+
+class RegionCallUnknownError(RegionCallError):
+    """The work was sent to the region worker but no answer came back, so it may or may not have run"""
+
+
+def invoke_timeout() -> int:
+    """Read timeout for an invoke: what is left of this invocation's deadline, at most WORKER_TIMEOUT"""
+    remaining = min(deadline.current().remaining(), WORKER_TIMEOUT)
+    return max(int(remaining // TIMEOUT_STEP) * TIMEOUT_STEP, TIMEOUT_STEP)
+
+
+def handle(call: dict) -> dict:
+    """Runs a call sent by run(). This is what the region worker does with each event."""
+    if call.get("target") not in ROUTABLE:
+        raise ValueError(f"{call.get('target')} may not be run by a region worker")
+    result = resolve(call["target"])(*call["args"])
+    # Some results carry exception objects in them, which can't travel as JSON.
+    return json.loads(json.dumps({"result": result}, default=str))
+
+
+def run(stack: str, target: str, *args) -> object:
+    """Runs resolve(target)(*args) in the region of the given stack, or in-process if it has no worker"""
+    worker = REGION_WORKERS.get(stack, {})
+    if not worker.get("function") or target not in ROUTABLE:
+        return resolve(target)(*args)
+    call = {"target": target, "args": json.loads(json.dumps(args))}
+    if worker["function"] == "local":
+        return handle(call)["result"]
+
+    print(f"Running {target} in {worker['region']}")
+    read_timeout = invoke_timeout()
+    try:
+        response = resources.with_credential_retry(
+            lambda: resources.get_lambda_client(worker["region"], read_timeout).invoke(
+                FunctionName=worker["function"],
+                InvocationType="RequestResponse",
+                Payload=json.dumps({"region_call": call}),
+            )
+        )
+    except (ReadTimeoutError, EndpointConnectionError) as err:
+        raise RegionCallUnknownError(
+            f"Sent {target} to {worker['region']} but got no answer, it may or may not have run: {err}"
+        ) from err
+    except ClientError as err:
+        # Lambda refused the call (missing, throttled...) so the worker never ran it.
+        if target not in LOCAL_FALLBACK:
+            raise RegionCallError(f"Unable to reach the {stack} region worker to run {target}: {err}") from err
+        print(f"Unable to reach the {stack} region worker, running {target} locally:\n{err}")
+        return resolve(target)(*args)
+    output = json.loads(response["Payload"].read())
+    if "FunctionError" in response:
+        raise RegionCallError(f"{target} failed in {worker['region']}: {output.get('errorMessage', output)}")
+    return output["result"]
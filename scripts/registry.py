@@ -0,0 +1,38 @@
+"""Lazy loading of command and action handlers so each invocation only imports the subsystem it uses"""
+import importlib
+import inspect
+
+# "module:function" -> function, filled in the first time a target is dispatched to
+_resolved = {}
+
+
+def resolve(target: str) -> object:
+    """Imports a "module:function" target on first use and returns the function"""
+    if target not in _resolved:
+        module_name, func_name = target.split(":")
+        module = importlib.import_module(module_name)
+        _resolved[target] = getattr(module, func_name)
+        print(f"Lazily imported {target}")
+    return _resolved[target]
+
+
+def call_with_args(func: object, args: object) -> object:
+    """Calls a Bolt listener function with only the arguments (body, say, respond...) it asks for.
+    Parameters Bolt doesn't provide are left to their defaults. As in Bolt, `args` gets the whole Args object."""
+    arg_names = inspect.signature(func).parameters
+    kwargs = {name: getattr(args, name) for name in arg_names if hasattr(args, name)}
+    if "args" in arg_names:
+        kwargs["args"] = args
+    return func(**kwargs)
+
+
+def lazy_listener(target: str) -> object:
+    """Returns a Bolt listener that imports its "module:function" target the first time it runs.
+    Bolt injects everything via the single `args` parameter and we pass on what the target needs."""
+
+    def listener(args):
+        return call_with_args(resolve(target), args)
+
+    # Bolt finds lazy functions again on the second lambda invocation by name, so keep it unique.
+    listener.__name__ = target.split(":")[1]
+    return listener
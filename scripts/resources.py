@@ -0,0 +1,123 @@
+"""Registry of long lived clients (DynamoDB tables, Secrets Manager, Slack) shared across warm invocations.
+Each client is built once per container and rebuilt only if AWS tells us our credentials have expired."""
+import threading
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+# Error codes AWS returns when the credentials a client was built with are no longer valid
+CREDENTIAL_ERRORS = [
+    "ExpiredToken",
+    "ExpiredTokenException",
+    "RequestExpired",
+    "InvalidClientTokenId",
+    "UnrecognizedClientException",
+]
+
+_clients = {}
+_lock = threading.RLock()
+
+
+def get_or_create(name: str, factory: object) -> object:
+    """Returns the cached client registered under name, building it with factory() the first time"""
+    with _lock:
+        if name not in _clients:
+            print(f"Creating shared client: {name}")
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def reset(prefix: str = "") -> None:
+    """Drops cached clients whose name starts with prefix (all of them by default) so they get rebuilt"""
+    with _lock:
+        for name in [name for name in _clients if name.startswith(prefix)]:
+            print(f"Dropping shared client: {name}")
+            del _clients[name]
+
+
+def get_session() -> object:
+    """One boto3 session per container. Building sessions is the expensive part of boto3."""
+    return get_or_create("aws:session", boto3.session.Session)
+
+
+def get_dynamodb(region_name: str = None) -> object:
+    """Shared DynamoDB service resource, in the lambda's own region unless another is given"""
+    if region_name:
+        return get_or_create(
+            f"aws:dynamodb@{region_name}", lambda: get_session().resource("dynamodb", region_name=region_name)
+        )
+    return get_or_create("aws:dynamodb", lambda: get_session().resource("dynamodb"))
+
+
+def get_table(table_name: str, region_name: str = None) -> object:
+    """Shared DynamoDB Table object, in the lambda's own region unless another is given"""
+    if region_name:
+        return get_or_create(
+            f"aws:dynamodb@{region_name}:{table_name}", lambda: get_dynamodb(region_name).Table(table_name)
+        )
+    return get_or_create(f"aws:dynamodb:{table_name}", lambda: get_dynamodb().Table(table_name))
+
+
+def get_secrets_client(region_name: str) -> object:
+    """Shared Secrets Manager client"""
+    return get_or_create(
+        f"aws:secretsmanager:{region_name}",
+        lambda: get_session().client(service_name="secretsmanager", region_name=region_name),
+    )
+
+
+def get_lambda_client(region_name: str, read_timeout: int = 60) -> object:
+    """Shared Lambda client for invoking functions in the given region, one per read timeout.
+    botocore's retries are off: retrying an invoke that timed out would run the function a second time."""
+    return get_or_create(
+        f"aws:lambda:{region_name}:{read_timeout}",
+        lambda: get_session().client(
+            service_name="lambda",
+            region_name=region_name,
+            config=Config(retries={"max_attempts": 0}, read_timeout=read_timeout),
+        ),
+    )
+
+
+def get_sqs_client() -> object:
+    """Shared SQS client for the job queue"""
+    return get_or_create("aws:sqs", lambda: get_session().client(service_name="sqs"))
+
+
+def is_credential_error(err: BaseException) -> bool:
+    """True if err is AWS rejecting expired/invalid credentials"""
+    return isinstance(err, ClientError) and err.response.get("Error", {}).get("Code") in CREDENTIAL_ERRORS
+
+
+def with_credential_retry(func: object) -> object:
+    """Runs func(). If AWS reports expired credentials, rebuilds every AWS client and runs it once more."""
+    try:
+        return func()
+    except ClientError as err:
+        if not is_credential_error(err):
+            raise
+        print(f"AWS credentials appear to have expired, rebuilding clients:\n{err}")
+        reset("aws:")
+        return func()
+
+
+def get_web_client() -> object:
+    """Shared Slack WebClient. Rebuilt if the slack token has been rotated since it was created."""
+    from slack_sdk import WebClient  # pylint: disable=import-outside-toplevel
+    from scripts.get_secret import get_secret  # pylint: disable=import-outside-toplevel
+
+    token = get_secret()["token"]
+    with _lock:
+        client = get_or_create("slack:web_client", lambda: WebClient(token=token))
+        if client.token != token:
+            reset("slack:web_client")
+            client = get_or_create("slack:web_client", lambda: WebClient(token=token))
+    return client
+
+
+def get_request_handler(app: object) -> object:
+    """Shared Bolt SlackRequestHandler for the given app. Creating one also swaps in Bolt's
+    lambda lazy listener runner, which only needs doing once per container."""
+    from slack_bolt.adapter.aws_lambda import SlackRequestHandler  # pylint: disable=import-outside-toplevel
+
+    return get_or_create(f"slack:request_handler:{id(app)}", lambda: SlackRequestHandler(app=app))
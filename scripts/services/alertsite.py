@@ -1,7 +1,7 @@
 """Module to handle on and offboarding of users in AlertSite."""
 import random
 import string
-import requests
+from scripts import http_client  # pylint: disable=import-error
 
 
 class AlertSiteOnBoarder:
@@ -22,7 +22,7 @@ class AlertSiteOnBoarder:
         url = "https://api.alertsite.com/api/v3/access-tokens"
         print(f"Sending authentication payload to AlertSite ({url})")
         try:
-            response = requests.post(url, json=payload)
+            response = http_client.post(url, json=payload)
         except BaseException as err:
             print(f"Error obtaining AlertSite authentication token:\n{err}")
             self.token = {"ok": False, "payload": err}
@@ -49,7 +49,7 @@ class AlertSiteOnBoarder:
             "role": "READONLY",  # Policy decision. Can manually change if needed.
         }
         try:
-            response = requests.post(
+            response = http_client.post(
                 "https://api.alertsite.com/api/v3/users", headers=header_data, json=payload
             )
         except BaseException as err:
@@ -70,7 +70,7 @@ class AlertSiteOnBoarder:
         header_data = {"Authorization": f"Bearer {self.token['token']}"}
         print("Requesting user data from AlertSite for ID purposes...")
         try:
-            response = requests.get(
+            response = http_client.get(
                 "https://api.alertsite.com/api/v3/users", headers=header_data, json={}
             )
             print(f"Received response code {response.status_code} from AlertSite")
@@ -93,7 +93,7 @@ class AlertSiteOnBoarder:
         header_data = {"Authorization": f"Bearer {self.token['token']}"}
         print(f"Attempting to delete {guid} from AlertSite")
         try:
-            response = requests.delete(
+            response = http_client.delete(
                 f"https://api.alertsite.com/api/v3/users/{guid}", headers=header_data, json={}
             )
             print(f"Received status code {response.status_code} during delete attempt")
@@ -1,5 +1,5 @@
 """Module to handle on and offboarding of users in DataDog."""
-import requests
+from scripts import http_client  # pylint: disable=import-error
 
 
 class DataDogOnBoarder:
@@ -25,7 +25,7 @@ class DataDogOnBoarder:
         url = "https://api.datadoghq.com/api/v2/users"
         print(f"Sending create user payload to DataDog ({url}):\n{payload}")
         try:
-            response = requests.post(url, headers=self.header_data, json=payload)
+            response = http_client.post(url, headers=self.header_data, json=payload)
         except BaseException as err:
             print(f"Error creating DataDog User:\n{err}")
             return {"ok": False, "payload": err}
@@ -46,7 +46,7 @@ class DataDogOnBoarder:
 
         print(f"Sending re-enable user payload to DataDog ({url}):\n{payload}")
         try:
-            response = requests.patch(url, headers=self.header_data, json=payload)
+            response = http_client.patch(url, headers=self.header_data, json=payload)
         except BaseException as err:
             print(f"Error re-enabling DataDog User:\n{err}")
             return {"ok": False, "payload": err}
@@ -68,7 +68,7 @@ class DataDogOnBoarder:
 
         print(f"Sending find user ID params to DataDog ({url}):\n{payload}")
         try:
-            response = requests.get(url, headers=self.header_data, params=payload)
+            response = http_client.get(url, headers=self.header_data, params=payload)
         except BaseException as err:
             print(f"Error obtaining DataDog User ID:\n{err}")
             return {"ok": False, "payload": err}
@@ -105,7 +105,7 @@ class DataDogOnBoarder:
 
         print(f"Sending invite user payload to DataDog ({url}):\n{payload}")
         try:
-            response = requests.post(url, headers=self.header_data, json=payload)
+            response = http_client.post(url, headers=self.header_data, json=payload)
         except BaseException as err:
             print(f"Error Sending DataDog Invite Email:\n{err}")
             return {"ok": False, "payload": err}
@@ -122,7 +122,7 @@ class DataDogOnBoarder:
 
         print(f"Sending disable user to DataDog: ({url})")
         try:
-            response = requests.delete(url, headers=self.header_data)
+            response = http_client.delete(url, headers=self.header_data)
         except BaseException as err:
             print(f"Error Disabling DataDog User:\n{err}")
             return {"ok": False, "payload": err}
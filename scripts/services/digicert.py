@@ -1,5 +1,5 @@
 """Module to handle on and offboarding of users in DigiCert."""
-import requests
+from scripts import http_client  # pylint: disable=import-error
 
 
 class DigiCertOnBoarder:
@@ -21,7 +21,7 @@ class DigiCertOnBoarder:
         url = "https://www.digicert.com/services/v2/user"
         params = {"filters[search]": self.email}
 
-        response = requests.get(url, headers=self.headers, params=params)
+        response = http_client.get(url, headers=self.headers, params=params)
 
         if "users" not in response.json():
             print(f"Error looking for User ID:\n{response.text}")
@@ -53,7 +53,7 @@ class DigiCertOnBoarder:
         }
 
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = http_client.post(url, json=payload, headers=self.headers)
         except BaseException as err:
             print(f"Error connecting to DigiCert:\n{err}")
             return {
@@ -88,7 +88,7 @@ class DigiCertOnBoarder:
 
         try:
             url = f"https://www.digicert.com/services/v2/user/{user_id}"
-            response = requests.delete(url, headers=self.headers)
+            response = http_client.delete(url, headers=self.headers)
         except BaseException as err:
             print(f"Error Deleting DigiCert user:\n{err}")
             return {
@@ -2,7 +2,7 @@
 import json
 import sys
 import http.cookiejar as cookielib
-import requests
+from scripts import http_client  # pylint: disable=import-error
 
 
 class SumoLogicOnBoarder(object):
@@ -21,7 +21,7 @@ class SumoLogicOnBoarder(object):
         first_name,
         last_name,
     ):
-        self.session = requests.Session()
+        self.session = http_client.Session()
         self.session.auth = (access_id, access_key)
         self.DEFAULT_VERSION = "v1"
         self.session.headers = {"content-type": "application/json", "accept": "application/json"}
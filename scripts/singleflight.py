@@ -0,0 +1,73 @@
+"""Coalesces identical commands running at the same time in the same channel.
+
+The first request for a given (channel, command, arguments) takes a lock in the shared state store with a
+conditional write and does the work. Anyone asking for the same thing while it's running joins that run
+instead of starting a second fan-out against *** or TelQ: they're told so straight away and tagged once
+the results have been posted to the channel. This works across lambda containers as the lock is in DynamoDB."""
+import os
+from scripts import state  # pylint: disable=import-error
+from scripts.slack import do_say  # pylint: disable=import-error
+
+# Longest a lock can outlive a run that died without releasing it (lambda runs for at most 15 minutes).
+FLIGHT_TTL = int(os.environ.get("AUTOBOT_SINGLE_FLIGHT_TTL", "900"))
+
+
+def flight_key(channel: str, key: tuple) -> str:
+    """State store key for a normalized command in a channel"""
+    return f"flight:{channel}:{' '.join(key)}"
+
+
+def claim_or_join(name: str, user_id: str) -> dict:
+    """Takes the lock for name, or joins the run holding it. Returns the lock as stored: user_id is
+    listed in its "joiners" if we joined someone else's run. None if neither worked."""
+    # Two attempts, in case the run we try to join finishes between our claim and our join.
+    for _ in range(2):
+        if state.put_if_absent(name, {"leader": user_id}, FLIGHT_TTL) is True:
+            return {"leader": user_id}
+        flight = state.add_to_set(name, "joiners", user_id)
+        if flight is not None:
+            return flight
+    return None
+
+
+def release(name: str, say: object, succeeded: bool = True) -> None:
+    """Drops the lock for name and tags anyone who joined the run, telling them whether the run
+    finished or failed (in which case nothing above covers their request and they should ask again)"""
+    try:
+        flight = state.delete(name) or {}
+    except BaseException as err:
+        print(f"Unable to release {name}, it will expire on its own:\n{err}")
+        return
+    joiners = sorted(flight.get("joiners", []))
+    if joiners:
+        mentions = ", ".join([f"<@{joiner}>" for joiner in joiners])
+        if succeeded:
+            do_say(f"{mentions} you asked for the same thing while this was running, so the results above cover your request too.", say)
+        else:
+            do_say(f"{mentions} you asked for the same thing while this was running, but it failed before finishing. Please try your request again.", say)
+
+
+def run(channel: str, key: tuple, user_id: str, say: object, func: object) -> None:
+    """Runs func() unless an identical run is already in flight in this channel, in which case user_id joins it"""
+    name = flight_key(channel, key)
+    try:
+        flight = claim_or_join(name, user_id)
+    except BaseException as err:
+        # Without the lock the worst case is two identical runs, which is what happened before single-flight
+        print(f"Unable to use single-flight for {name}, running it anyway:\n{err}")
+        flight = None
+
+    if flight is None:
+        func()
+        return
+    if user_id in flight.get("joiners", []):
+        print(f"<@{user_id}> joined in-flight run {name}")
+        response = f"<@{user_id}>, <@{flight['leader']}> is already running that in this channel, so rather than running it twice I'll tag you here once it's done."
+        do_say(response, say)
+        return
+    succeeded = False
+    try:
+        func()
+        succeeded = True
+    finally:
+        release(name, say, succeeded)
@@ -0,0 +1,11 @@
+"""Helpers shared by everything that talks to Slack"""
+
+# Errors Slack returns when our token is no longer accepted, which usually means it was rotated
+AUTH_ERRORS = ["invalid_auth", "not_authed", "token_revoked", "token_expired"]
+
+
+def do_say(thing: str, say: object) -> object:
+    """Does a "say" to slack while printing that say to the logs"""
+    print(f"Doing say: {thing}")
+    say_response = say(thing)
+    return say_response
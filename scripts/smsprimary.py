@@ -1,39 +1,19 @@
 """Script to determine or swap the Primary and Secondary SMS service providers for a given stack"""
+import time
 from datetime import datetime
 import pymongo
-import requests
 from pymongo.errors import ConnectionFailure
+from scripts import circuit, messages, progress, regions, resources, validation  # pylint: disable=import-error
 from scripts.get_secret import get_secret  # pylint: disable=import-error
+from scripts.slack import do_say  # pylint: disable=import-error
 
 # Need to have secrets available before any other execution happens.
 secrets = get_secret()
 
 
-def do_say(thing: str, say: object) -> None:
-    """Does a "say" to slack while printing that say to the logs"""
-    print(f"Doing say: {thing}")
-    say_response = say(thing)
-    return say_response
-
-
-def delete_slack_message(message_id, channel_id):
-    """Deletes a slack message for situations in which we have no
-    response URL and cannot override previous messages"""
-    url = "https://slack.com/api/chat.delete"
-    headers = {"authorization": f"Bearer {secrets['token']}"}
-    payload = {"channel": f"{channel_id}", "ts": f"{message_id}"}
-    response = requests.post(url, json=payload, headers=headers)
-    output = response.json()
-    return output
-
-
-def index_in_list(a_list: list, index: int) -> bool:
-    """Verifies if a given index exists in a list"""
-    return index < len(a_list)
-
-
 def connect_mongodb(stack):
-    """Returns a mongoDB client and database object or None if errors"""
+    """Returns a mongoDB client and database object or None if errors.
+    Clients are shared per stack so warm invocations (and server.py) reuse the connection pool."""
     if stack == "US":
         db_seed = "*****************"
     elif stack == "EU":
@@ -47,7 +27,7 @@ def connect_mongodb(stack):
     uri = f"mongodb+srv://{db_user}:{db_pass}@{db_seed}/?readPreference=secondary&*****************"
 
     try:
-        client = pymongo.MongoClient(uri)
+        client = resources.get_or_create(f"mongo:{stack}", lambda: pymongo.MongoClient(uri))
         database = client[db_name]
     except ConnectionFailure as err:
         print("Failed to connect to Mongo DB")
@@ -65,25 +45,45 @@ def validate_country(database, country):
     return True
 
 
-def lookup_primary(country, stack, say) -> tuple:
-    """Returns (None,None) if fatal error, (primary,None) or (None,secondary) if one or the other is not found
-    or (primary,secondary) if both found successfully."""
+def with_breaker(stack, func, error_message=None) -> dict:
+    """Runs func(), which returns a find_routes/swap_routes style result, through the circuit breaker for the
+    stack's MongoDB. If error_message is given, errors are reported with it rather than raised."""
+    breaker = circuit.get_breaker(f"MongoDB ({stack})")
+    try:
+        breaker.before_call()
+    except circuit.CircuitOpenError as err:
+        return {"ok": False, "message": f"Sorry, {err}"}
+    start = time.perf_counter()
+    try:
+        result = func()
+    except BaseException as err:
+        breaker.record(False, time.perf_counter() - start)
+        if error_message is None:
+            raise
+        print(err)
+        return {"ok": False, "message": f"{error_message}\n{err}"}
+    breaker.record(True, time.perf_counter() - start)
+    return result
+
+
+def find_routes(country, stack) -> dict:
+    """Looks up the primary and secondary vendors for a country. Returns "ok" False and a "message" for the user
+    if we couldn't, otherwise "primary" and "secondary" (either of which may be None if not found).
+    Only returns plain JSON so it can run in the stack's region (see scripts/regions.py)."""
+    return with_breaker(stack, lambda: read_routes(country, stack))
+
+
+def read_routes(country, stack) -> dict:
+    """Does the find_routes lookup"""
     mongo_client, database = connect_mongodb(stack)
     if mongo_client is None:
         print("Error connecting to MongoDB")
-        response = (
-            "I have encountered an error connecting to MongoDB :trynottocry: I'm unable to proceed."
-        )
-        do_say(response, say)
-        return (None, None)
+        return {"ok": False, "message": "I have encountered an error connecting to MongoDB :trynottocry: I'm unable to proceed."}
 
     # validate the country code
     if validate_country(database, country) is False:
-        mongo_client.close()
         print("Country Not Found in DB")
-        response = f"I don't seem to be able to find an sms routing entry for {country}. I'm unable to proceed."
-        do_say(response, say)
-        return (None, None)
+        return {"ok": False, "message": f"I don't seem to be able to find an sms routing entry for {country}. I'm unable to proceed."}
 
     # validation - check to ensure country has both Primary and Secondary vendors
     result_count = database.DB.count_documents({"country": country, "seq": 1})
@@ -115,53 +115,82 @@ def lookup_primary(country, stack, say) -> tuple:
             primary["vendor"] = i["vendor"]
             primary["countryName"] = i["countryName"]
             primary["*****************"] = i["*****************"]
-            primary["lastModifiedDate"] = i["lastModifiedDate"]
+            primary["lastModifiedDate"] = str(i["lastModifiedDate"])
         else:
             secondary = {}  # Safe to do in loop since besides the primary there's only a secondary
             secondary["vendor"] = i["vendor"]
             secondary["countryName"] = i["countryName"]
             secondary["*****************"] = i["*****************"]
-            secondary["lastModifiedDate"] = i["lastModifiedDate"]
-    mongo_client.close()
-    return (primary, secondary)
+            secondary["lastModifiedDate"] = str(i["lastModifiedDate"])
+    return {"ok": True, "primary": primary, "secondary": secondary}
 
 
-def do_switch(country, stack, say):
-    """Does the actual primary/secondary swap task"""
+def lookup_primary(country, stack, say) -> tuple:
+    """Returns (None,None) if fatal error, (primary,None) or (None,secondary) if one or the other is not found
+    or (primary,secondary) if both found successfully."""
+    routes = regions.run(stack, "scripts.smsprimary:find_routes", country, stack)
+    if routes["ok"] is False:
+        do_say(routes["message"], say)
+        return (None, None)
+    return (routes["primary"], routes["secondary"])
+
+
+def swap_routes(country, stack) -> dict:
+    """Swaps the primary and secondary vendors for a country. Returns "ok" False and a "message" for the user
+    if that failed. Only returns plain JSON so it can run in the stack's region (see scripts/regions.py)."""
+    return with_breaker(
+        stack, lambda: write_swapped_routes(country, stack), "I have encountered an error updating the DB:"
+    )
+
+
+def write_swapped_routes(country, stack) -> dict:
+    """Does the swap_routes update"""
     mongo_client, database = connect_mongodb(stack)
     if mongo_client is None:
         print("Error connecting to MongoDB")
-        response = (
-            "I have encountered an error connecting to MongoDB :trynottocry: I'm unable to proceed."
+        return {"ok": False, "message": "I have encountered an error connecting to MongoDB :trynottocry: I'm unable to proceed."}
+    result = database.DB.find({"country": country}, {"seq": 1, "_id": 1})
+    for i in result:
+        v_seq = int(i["seq"])
+        v_id = i["_id"]
+        v_last_modified = datetime.now()
+
+        if v_seq == 1:
+            database.DB.update_one(
+                {"_id": v_id}, {"$set": {"seq": 2, "lastModifiedDate": v_last_modified}}
+            )
+
+        if v_seq == 2:
+            database.DB.update_one(
+                {"_id": v_id}, {"$set": {"seq": 1, "lastModifiedDate": v_last_modified}}
+            )
+    return {"ok": True}
+
+
+def do_switch(country, stack, say):
+    """Does the actual primary/secondary swap task"""
+    try:
+        result = regions.run(stack, "scripts.smsprimary:swap_routes", country, stack)
+    except regions.RegionCallUnknownError as err:
+        # Running it again could swap the routes straight back, so leave that to a person.
+        print(err)
+        do_say(
+            f"I sent the swap to the {stack} stack but never heard back, so it may or may not have happened. Check with `@AutoBot primary {stack} {country}` before trying again.",
+            say,
         )
-        do_say(response, say)
         return None
-    try:
-        result = database.DB.find({"country": country}, {"seq": 1, "_id": 1})
-        for i in result:
-            v_seq = int(i["seq"])
-            v_id = i["_id"]
-            v_last_modified = datetime.now()
-
-            if v_seq == 1:
-                database.DB.update_one(
-                    {"_id": v_id}, {"$set": {"seq": 2, "lastModifiedDate": v_last_modified}}
-                )
-
-            if v_seq == 2:
-                database.DB.update_one(
-                    {"_id": v_id}, {"$set": {"seq": 1, "lastModifiedDate": v_last_modified}}
-                )
-    except BaseException as err:
+    except regions.RegionCallError as err:
         print(err)
-        response = f"I have encountered an error updating the DB:\n{err}"
-        do_say(response, say)
+        do_say(f"I was unable to swap the routes in the {stack} stack:\n```{err}```", say)
         return None
-    else:
-        return True
+    if result["ok"] is False:
+        do_say(result["message"], say)
+        return None
+    return True
 
 
-def sms_route_check(options, user_id, say):
+@messages.buffered
+def sms_route_check(options, user_id, channel, say):
     """Checks current primary and secondary and returns response to use"""
     # Update this to whatever these companies have changed their name to.
     translation_dict = {
@@ -169,24 +198,8 @@ def sms_route_check(options, user_id, say):
         "*****************": "*****************"
         }
 
-    # Options[0] = "@AutoBot"
-    # Options[1] = "primary"
-    # Options[2] = Stack
-    # Options[3] = Country Code
-    if index_in_list(options, 3) is False or index_in_list(options, 4) is True:
-        response = f"Sorry <@{user_id}>, You seem to have provided the wrong number of options!\n\nThis keyword takes *exactly 2* arguments:\n1) An *** Production stack: [*US*, *EU*, *STG*] to check.\n2) A 2 letter country code.\n\nExample: `@AutoBot primary EU IN`\n\nTry `@AutoBot primary help` for help."
-        do_say(response, say)
-        return
-    if options[2].casefold() not in ["us", "eu", "stg"]:
-        response = f"Sorry <@{user_id}>, You have specified an invalid application stack. Valid options are [*US*, *EU*, *STG*].\n\nExample: `@AutoBot primary STG IN`\nTry `@AutoBot primary help` for help."
-        do_say(response, say)
-        return
-    if options[2].casefold() == "stg":
-        response = f"Sorry <@{user_id}>, I cannot currently look up the primary/secondary in stage. Please contact CloudOps for assistance."
-        do_say(response, say)
-        return
-    if len(options[3]) != 2:
-        response = f"Sorry <@{user_id}>, You must specify the 2 letter country code.\n\nExample: `@AutoBot primary us us`\n\nTry `@AutoBot primary help` for help."
+    response = validation.primary_options(options, user_id)
+    if response is not None:
         do_say(response, say)
         return
 
@@ -217,28 +230,11 @@ def sms_route_check(options, user_id, say):
     do_say(response, say)
 
 
-def switch_sms_primary(options: list, user_id: str, say: object):
+def switch_sms_primary(options: list, user_id: str, channel: str, say: object):
     """Handles switching primary and secondary providers.
     Sends an "are you sure" prompt which is handled later."""
-    # Options[0] = "@AutoBot"
-    # Options[1] = "primary"
-    # Options[2] = "switch"
-    # Options[3] = Stack
-    # Options[4] = Country Code
-    if index_in_list(options, 4) is False or index_in_list(options, 5) is True:
-        response = f"Sorry <@{user_id}>, You seem to have provided the wrong number of options!\n\nThis action takes *exactly 2* arguments:\n1) An *** Production stack: [*US*, *EU*, *STG*] to send from.\n2) A 2 letter country code.\n\nExample: `@AutoBot primary switch EU IN`\n\nTry `@AutoBot primary help` for help."
-        do_say(response, say)
-        return
-    if options[3].casefold() == "stg":
-        response = f"Sorry <@{user_id}>, I cannot currently switch the primary/secondary in stage."
-        do_say(response, say)
-        return
-    if options[3].casefold() not in ["us", "eu"]:
-        response = f"Sorry <@{user_id}>, You have specified an invalid application stack. Valid options are [*US*, *EU*].\n\nExample: `@AutoBot primary switch US MX`\nTry `@AutoBot primary help` for help."
-        do_say(response, say)
-        return
-    if len(options[4]) != 2:
-        response = f"Sorry <@{user_id}>, You must specify a 2 letter country code.\n\nExample: `@AutoBot primary switch us us`\n\nTry `@AutoBot primary help` for help."
+    response = validation.primary_switch_options(options, user_id)
+    if response is not None:
         do_say(response, say)
         return
 
@@ -303,11 +299,6 @@ def switch_sms_primary(options: list, user_id: str, say: object):
 def handle_primary_switch(body, say):
     """Triggered when someone confirms the "are you sure" prompt
     Actually calls the switch function"""
-    # Container section of the body has message ID and channel ID needed to delete the block we sent previously
-    container = body["container"]
-    channel_id = container["channel_id"]
-    message_id = container["message_ts"]
-
     # Actions section of body contains the values of the button(s) the user clicked, which we parse for first_name, last_name and email
     actions = body["actions"]  # Returns a list
     actions_payload = actions[0]  # Returns dict
@@ -317,25 +308,27 @@ def handle_primary_switch(body, say):
     country = options[1]
     print(f"Detected Options:\nStack: {stack}\nCountry: {country}")
 
-    delete_slack_message(message_id, channel_id)
+    # Turn the "are you sure" prompt into the switch status, rather than deleting it and posting again
     response = f"Swapping Primary/Secondary vendors for {country} in the {stack} stack..."
-    do_say(response, say)
+    print(f"Doing progress update: {response}")
+    progress_message = progress.ProgressMessage.replace(body, response, say=say)
 
     switch_result = do_switch(country, stack, say)
     if switch_result is None:
         response = "Vendor swap failed..."
     else:
         response = f"Successfully swapped primary and secondary vendors for {country} in the {stack} stack.\n\n*WARNING*: The SMS connectors still need to be restarted manually to pick up these changes!"
-    do_say(response, say)
+    print(f"Doing progress update: {response}")
+    progress_message.finish(response)
 
 
 def handle_primary_switch_nevermind(body, say):
     """Triggered if the user changes their mind on the "are you sure" prompt"""
-    # Container section of the body has message ID and channel ID needed to delete the block we sent previously
+    # Container section of the body has message ID and channel ID needed to edit the block we sent previously
     container = body["container"]
     channel_id = container["channel_id"]
     message_id = container["message_ts"]
 
-    delete_slack_message(message_id, channel_id)
     response = "Okay :ok_hand: Not switching vendors for now..."
-    do_say(response, say)
+    print(f"Doing progress update: {response}")
+    progress.update_message(channel_id, message_id, response)
@@ -0,0 +1,204 @@
+"""Small shared key/value store with expiry, for state that has to be seen by every lambda container
+(idempotency claims, shared rate limits and the like). Items live in the DynamoDB table already used for
+path test tracking, or in process memory when AUTOBOT_STATE_BACKEND=local (single process/server.py and
+local runs).
+
+The store has to be the same table for every lambda using it, so region workers (region_worker.py) set
+AUTOBOT_STATE_REGION to the main functions' region. Otherwise they would use a table in their own region,
+with its own separate counters."""
+import hashlib
+import os
+import threading
+import time
+from botocore.exceptions import ClientError
+from scripts import resources  # pylint: disable=import-error
+
+BACKEND = os.environ.get("AUTOBOT_STATE_BACKEND", "dynamodb")
+STATE_TABLE = os.environ.get("AUTOBOT_STATE_TABLE", "autobot_path_testing")
+# Region of STATE_TABLE, if it isn't in the lambda's own region
+STATE_REGION = os.environ.get("AUTOBOT_STATE_REGION", "")
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+def table_key(key: str) -> int:
+    """The tracking table is keyed by numeric *** incident IDs, so state keys are hashed into negative
+    numbers which can never collide with a real incident ID."""
+    return -int(hashlib.sha256(key.encode()).hexdigest()[:15], 16)
+
+
+def _table() -> object:
+    return resources.get_table(STATE_TABLE, STATE_REGION or None)
+
+
+def put_if_absent(key: str, value: dict, ttl: float) -> bool:
+    """Stores value under key for ttl seconds unless an unexpired item already exists.
+    Returns True if we stored it (i.e. we now own the key)."""
+    now = time.time()
+    if BACKEND == "local":
+        with _local_lock:
+            item = _local.get(key)
+            if item is not None and item["TTL"] > now:
+                return False
+            _local[key] = dict(value, TTL=now + ttl)
+            return True
+
+    item = dict(value, id=table_key(key), state_key=key, TTL=int(now + ttl))
+    try:
+        resources.with_credential_retry(
+            lambda: _table().put_item(
+                Item=item,
+                # DynamoDB only removes expired items eventually, so treat those as absent ourselves
+                ConditionExpression="attribute_not_exists(id) OR #ttl < :now",
+                ExpressionAttributeNames={"#ttl": "TTL"},
+                ExpressionAttributeValues={":now": int(now)},
+            )
+        )
+    except ClientError as err:
+        if err.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return False
+        raise
+    return True
+
+
+def put(key: str, value: dict, ttl: float) -> None:
+    """Stores value under key for ttl seconds, replacing anything already there"""
+    now = time.time()
+    if BACKEND == "local":
+        with _local_lock:
+            _local[key] = dict(value, TTL=now + ttl)
+        return
+    item = dict(value, id=table_key(key), state_key=key, TTL=int(now + ttl))
+    resources.with_credential_retry(lambda: _table().put_item(Item=item))
+
+
+def get(key: str) -> dict:
+    """Returns the unexpired value stored under key, or None"""
+    now = time.time()
+    if BACKEND == "local":
+        with _local_lock:
+            item = _local.get(key)
+    else:
+        item = resources.with_credential_retry(
+            lambda: _table().get_item(Key={"id": table_key(key)}, ConsistentRead=True)
+        ).get("Item")
+    if item is None or item["TTL"] <= now:
+        return None
+    return item
+
+
+def update(key: str, values: dict) -> dict:
+    """Sets the given attributes on an unexpired item and returns the updated item,
+    or None if there is no such item"""
+    now = time.time()
+    if BACKEND == "local":
+        with _local_lock:
+            item = _local.get(key)
+            if item is None or item["TTL"] <= now:
+                return None
+            item.update(values)
+            return dict(item)
+    names = {f"#attr{index}": name for index, name in enumerate(values)}
+    try:
+        response = resources.with_credential_retry(
+            lambda: _table().update_item(
+                Key={"id": table_key(key)},
+                UpdateExpression="SET " + ", ".join([f"#attr{index} = :value{index}" for index in range(len(values))]),
+                ConditionExpression="attribute_exists(id) AND #ttl > :now",
+                ExpressionAttributeNames=dict(names, **{"#ttl": "TTL"}),
+                ExpressionAttributeValues=dict(
+                    {f":value{index}": value for index, value in enumerate(values.values())}, **{":now": int(now)}
+                ),
+                ReturnValues="ALL_NEW",
+            )
+        )
+    except ClientError as err:
+        if err.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return None
+        raise
+    return response["Attributes"]
+
+
+def add_to_set(key: str, attribute: str, value: str) -> dict:
+    """Adds value to the string set attribute of an unexpired item and returns the updated item,
+    or None if there is no such item"""
+    now = time.time()
+    if BACKEND == "local":
+        with _local_lock:
+            item = _local.get(key)
+            if item is None or item["TTL"] <= now:
+                return None
+            item[attribute] = item.get(attribute, set()) | {value}
+            return dict(item)
+    try:
+        response = resources.with_credential_retry(
+            lambda: _table().update_item(
+                Key={"id": table_key(key)},
+                UpdateExpression="ADD #attr :value",
+                ConditionExpression="attribute_exists(id) AND #ttl > :now",
+                ExpressionAttributeNames={"#attr": attribute, "#ttl": "TTL"},
+                ExpressionAttributeValues={":value": {value}, ":now": int(now)},
+                ReturnValues="ALL_NEW",
+            )
+        )
+    except ClientError as err:
+        if err.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return None
+        raise
+    return response["Attributes"]
+
+
+def take(key: str, limit: int, member: str, member_limit: int, ttl: float) -> dict:
+    """Atomically counts one use of key by member, as long as key has been used fewer than limit times
+    and member fewer than member_limit times. Returns the updated item (the total under "used", each
+    member's count under "m_<member>"), or None if either limit has been reached."""
+    member_attribute = f"m_{member}"
+    if BACKEND == "local":
+        now = time.time()
+        with _local_lock:
+            if key not in _local:
+                # Counters are usually per time window, so clear out the old ones as new ones come along
+                for expired in [old for old, item in _local.items() if item["TTL"] <= now]:
+                    del _local[expired]
+                _local[key] = {"used": 0, "TTL": now + ttl}
+            item = _local[key]
+            if item["used"] >= limit or item.get(member_attribute, 0) >= member_limit:
+                return None
+            item["used"] += 1
+            item[member_attribute] = item.get(member_attribute, 0) + 1
+            return dict(item)
+    try:
+        response = resources.with_credential_retry(
+            lambda: _table().update_item(
+                Key={"id": table_key(key)},
+                UpdateExpression="ADD used :one, #member :one SET #ttl = if_not_exists(#ttl, :ttl), state_key = :key",
+                ConditionExpression="(attribute_not_exists(used) OR used < :limit) AND "
+                "(attribute_not_exists(#member) OR #member < :member_limit)",
+                ExpressionAttributeNames={"#member": member_attribute, "#ttl": "TTL"},
+                ExpressionAttributeValues={
+                    ":one": 1,
+                    ":ttl": int(time.time() + ttl),
+                    ":key": key,
+                    ":limit": limit,
+                    ":member_limit": member_limit,
+                },
+                ReturnValues="ALL_NEW",
+            )
+        )
+    except ClientError as err:
+        if err.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return None
+        raise
+    return response["Attributes"]
+
+
+def delete(key: str) -> dict:
+    """Removes key, if present, and returns the item that was removed (or None)"""
+    if BACKEND == "local":
+        with _local_lock:
+            return _local.pop(key, None)
+    response = resources.with_credential_retry(
+        lambda: _table().delete_item(Key={"id": table_key(key)}, ReturnValues="ALL_OLD")
+    )
+    return response.get("Attributes")
@@ -1,38 +1,49 @@
 """Module for TelQ SMS Testing"""
+import os
+import re
 import time
-import requests
+from scripts import deadline as invocation_deadline  # pylint: disable=import-error
+from scripts import http_client, progress, regions, state  # pylint: disable=import-error
 from scripts.get_secret import get_secret  # pylint: disable=import-error
+from scripts.slack import do_say  # pylint: disable=import-error
 
 # Need to have secrets available before any other execution happens.
 secrets = get_secret()
 
+# Seconds we reuse a TelQ bearer token and the downloaded network catalog for.
+TOKEN_TTL = int(os.environ.get("AUTOBOT_TELQ_TOKEN_TTL", "1200"))
+CATALOG_TTL = int(os.environ.get("AUTOBOT_TELQ_CATALOG_TTL", "3600"))
+# Slack shows at most 100 options per external select response
+OPTIONS_LIMIT = 100
+# Longest prefix kept in the network search index, longer queries are checked against the full names
+PREFIX_LENGTH = 8
 
-def do_say(thing: str, say: object) -> None:
-    """Does a "say" to slack while printing that say to the logs"""
-    print(f"Doing say: {thing}")
-    say_response = say(thing)
-    return say_response
+# Rough worst case for creating the test, contact and notification for one network.
+SECONDS_PER_NETWORK = 10
+# How long to leave contacts in place after sending, and a rough worst case for one delete
+# (spacing between deletes is handled by the *** rate limit in scripts/ratelimit.py).
+CONTACT_DELETE_DELAY = 15
+SECONDS_PER_DELETE = 4
 
-
-def delete_slack_message(message_id, channel_id):
-    """Deletes a slack message for situations in which
-    we have no response URL and cannot override previous messages"""
-    url = "https://slack.com/api/chat.delete"
-    headers = {"authorization": f"Bearer {secrets['token']}"}
-    payload = {"channel": f"{channel_id}", "ts": f"{message_id}"}
-    response = requests.post(url, json=payload, headers=headers)
-    output = response.json()
-    return output
+_token_cache = {"token": None, "fetched_at": None}
+_catalog_cache = {"networks": None, "fetched_at": None}
+_index_cache = {}  # country code -> {"index": NetworkIndex, "built_at": time.monotonic()}
 
 
 def obtain_bearer_token() -> dict:
     """Takes an app_id and appKey value input.
     Obtained from TelQ UI on a per-user level.
-    Outputs a bearer token which is required for all future API calls"""
+    Outputs a bearer token which is required for all future API calls.
+    Tokens are reused for TOKEN_TTL seconds."""
+    fetched_at = _token_cache["fetched_at"]
+    if fetched_at is not None and time.monotonic() - fetched_at < TOKEN_TTL:
+        return _token_cache["token"]
     url = "https://api.telqtele.com/v2/client/token"
     payload = {"appId": secrets["app_id"], "appKey": secrets["app_key"]}
-    response = requests.post(url, json=payload)
+    response = http_client.post(url, json=payload)
     output = response.json()["value"]
+    _token_cache["token"] = output
+    _token_cache["fetched_at"] = time.monotonic()
     return output
 
 
@@ -40,10 +51,22 @@ def get_networks(token) -> dict:
     """Downloads entire list of available networks"""
     auth_header = {"authorization": token}
     url = "https://api.telqtele.com/v2/client/networks"
-    response = requests.get(url, headers=auth_header)
+    # The full catalog is large and TelQ can take up to a minute to put it together.
+    response = http_client.get(url, headers=auth_header, timeout=(http_client.DEFAULT_TIMEOUT[0], 90))
     return response.json()
 
 
+def get_network_catalog() -> list:
+    """Returns the full network list, reusing a copy downloaded within CATALOG_TTL seconds"""
+    fetched_at = _catalog_cache["fetched_at"]
+    if fetched_at is not None and time.monotonic() - fetched_at < CATALOG_TTL:
+        return _catalog_cache["networks"]
+    networks = get_networks(obtain_bearer_token())
+    _catalog_cache["networks"] = networks
+    _catalog_cache["fetched_at"] = time.monotonic()
+    return networks
+
+
 def get_country_networks(country_name: str, networks: dict) -> list:
     """Return a list of non-ported network/test targets for a specific country.
     We do not currently test to ported numbers."""
@@ -55,6 +78,80 @@ def get_country_networks(country_name: str, networks: dict) -> list:
     return result_list
 
 
+class NetworkIndex:
+    """A country's networks, searchable by any prefix of the provider name's words, the MCC or MCC+MNC"""
+
+    def __init__(self, networks: list) -> None:
+        self.networks = sorted(networks, key=lambda network: network["providerName"].casefold())
+        self.terms = []
+        self.prefixes = {}
+        for position, network in enumerate(self.networks):
+            terms = re.findall(r"\w+", network["providerName"].casefold()) + [network["mcc"], network["mcc"] + network["mnc"]]
+            self.terms.append(terms)
+            for term in terms:
+                for length in range(1, min(len(term), PREFIX_LENGTH) + 1):
+                    self.prefixes.setdefault(term[:length], set()).add(position)
+
+    def search(self, query: str, limit: int = OPTIONS_LIMIT) -> list:
+        """Networks matching every word of query, in name order. An empty query matches everything."""
+        matches = None
+        for word in re.findall(r"\w+", query.casefold()):
+            found = self.prefixes.get(word[:PREFIX_LENGTH], set())
+            if len(word) > PREFIX_LENGTH:
+                found = {position for position in found if any(term.startswith(word) for term in self.terms[position])}
+            matches = found if matches is None else matches & found
+        if matches is None:
+            return self.networks[:limit]
+        return [self.networks[position] for position in sorted(matches)[:limit]]
+
+
+def share_country_networks(country_code: str, networks: list) -> None:
+    """Saves a country's networks to the shared state store, so whichever container answers the
+    form's type-ahead requests doesn't have to download the whole catalog within Slack's 3 seconds"""
+    compact = [{"providerName": net["providerName"], "mcc": net["mcc"], "mnc": net["mnc"]} for net in networks]
+    _index_cache[country_code] = {"index": NetworkIndex(compact), "built_at": time.monotonic()}
+    try:
+        state.put(f"telq:networks:{country_code}", {"networks": compact}, CATALOG_TTL)
+    except BaseException as err:
+        print(f"Unable to save the {country_code} networks to the state store:\n{err}")
+
+
+def get_network_index(country_code: str) -> NetworkIndex:
+    """Search index for a country's networks, built from memory or the shared state store.
+    Returns None rather than downloading the catalog, which takes far too long for type-ahead."""
+    cached = _index_cache.get(country_code)
+    if cached is not None and time.monotonic() - cached["built_at"] < CATALOG_TTL:
+        return cached["index"]
+    fetched_at = _catalog_cache["fetched_at"]
+    if fetched_at is not None and time.monotonic() - fetched_at < CATALOG_TTL:
+        networks = get_country_networks(find_country_name(country_code), _catalog_cache["networks"])
+    else:
+        item = state.get(f"telq:networks:{country_code}")
+        if item is None:
+            return None
+        networks = item["networks"]
+    _index_cache[country_code] = {"index": NetworkIndex(networks), "built_at": time.monotonic()}
+    return _index_cache[country_code]["index"]
+
+
+def network_options(body: dict) -> list:
+    """Answers a type-ahead request from the network selector with the matching networks as select options.
+    The country is carried in the selector's block_id."""
+    country_code = body["block_id"].split(":", 1)[1]
+    query = body.get("value", "")
+    index = get_network_index(country_code)
+    if index is None:
+        print(f"No {country_code} networks available to search for {query!r}")
+        return []
+    return [
+        {
+            "text": {"type": "plain_text", "text": network["providerName"][:75], "emoji": True},
+            "value": network["mcc"] + network["mnc"],
+        }
+        for network in index.search(query)
+    ]
+
+
 def set_env_vars(env: str) -> dict:
     """Set various environment variables depending on the
     selected *** environment we want to test from"""
@@ -97,7 +194,7 @@ def create_test(token: str, mcc: str, mnc: str) -> dict:
     the test id, 'testIdText' and destination phoneNumber."""
     auth_header = {"authorization": token}
     data = {"destinationNetworks": [{"mcc": mcc, "mnc": mnc}]}
-    response = requests.post(
+    response = http_client.post(
         "https://api.telqtele.com/v2/client/tests", headers=auth_header, json=data
     )
     output = response.json()
@@ -130,7 +227,7 @@ def create_contact(stack, country_code, phone_number) -> str:
     }
     header_data = {"Authorization": environment["apiKey"]}
     api_endpoint = str(environment["endpoint"]) + "/rest/contacts/" + environment["orgId"]
-    response = requests.post(api_endpoint, headers=header_data, json=contact_data)
+    response = http_client.post(api_endpoint, headers=header_data, json=contact_data)
     print(f"Received following response from *** when creating contact:\n{response.json()}")
     return response.json()
 
@@ -142,7 +239,7 @@ def delete_contact(stack, contact_id) -> str:
         f"{environment['endpoint']}/rest/contacts/{environment['orgId']}/{contact_id}?idType=id"
     )
     header_data = {"Authorization": environment["apiKey"]}
-    response = requests.delete(api_endpoint, headers=header_data)
+    response = http_client.delete(api_endpoint, headers=header_data)
     print(f"Received following response from *** when deleting contact:\n{response.json()}")
     return response.json()
 
@@ -183,7 +280,7 @@ def send_notification(stack, country_code, test_id_text, contact_id) -> str:
     }
     header_data = {"Authorization": environment["apiKey"]}
     api_endpoint = str(environment["endpoint"]) + "/rest/notifications/" + environment["orgId"]
-    response = requests.post(api_endpoint, headers=header_data, json=notification_data)
+    response = http_client.post(api_endpoint, headers=header_data, json=notification_data)
     notification_response = response.json()
     print(
         f"Received following response from *** when sending notification:\n{notification_response}"
@@ -455,7 +552,7 @@ def network_options_check(data: dict) -> list:
     outputs those options, the stack and the country code"""
     values = data["state"]["values"]
     stack = data["actions"][0]["value"]
-    block_id = next(iter(values.keys()))  # This value is unique to each interaction
+    block_id = next(iter(values.keys()))  # "networks:<country code>"
     selected_options = values[block_id]["network_select_action"]["selected_options"]
     network_list = []
     for opt in selected_options:
@@ -467,9 +564,12 @@ def network_options_check(data: dict) -> list:
         print(f"Detected Network Choice: {network_info}")
         network_list.append(network_info)
 
-    header_block_text = data["message"]["blocks"][0]["text"]["text"]  # Yuk ¯\_(ツ)_/¯
-    header_block_split = header_block_text.split()
-    country_code = header_block_split[2]
+    if block_id.startswith("networks:"):
+        country_code = block_id.split(":", 1)[1]
+    else:  # Forms posted before the country was kept in the block_id
+        header_block_text = data["message"]["blocks"][0]["text"]["text"]  # Yuk ¯\_(ツ)_/¯
+        header_block_split = header_block_text.split()
+        country_code = header_block_split[2]
 
     return [network_list, stack, country_code]
 
@@ -479,66 +579,88 @@ def handle_network_select_action():
     return
 
 
-def handle_submit_networks(body, respond, say):
+def handle_submit_networks(body, respond, say, deadline=None):
     """Once the network list form is submitted, create telq test,
-    create contact, send notification, delete contact"""
+    create contact, send notification, delete contact.
+    Networks we don't have time for are skipped and reported rather than cut off mid-way."""
+    deadline = deadline or invocation_deadline.current()
     network_data = network_options_check(body)
     network_list = network_data[0]
     stack = network_data[1]
     country_code = network_data[2]
     country_name = find_country_name(country_code)
     carrier_list = [carrier["carrier"] for carrier in network_list]
-    response = (
-        f"Sending SMS tests from the {stack} stack to the following carriers in {country_name}:\n"
-    )
-    for carrier in carrier_list:
-        response += f"{carrier}, "
-    response = response.rstrip(", ")  # Strip the last comma and space
-    response += ".\n\nThis make take up to 10 seconds per test."
-    respond(text=response, delete_original=True, response_type="in_channel")
+    response = f"Sending SMS tests from the {stack} stack to the following carriers in {country_name}.\n\nThis make take up to 10 seconds per test."
+    # Turn the network selection form into the test status, with a line per carrier as its test goes out
+    print(f"Doing progress update: {response}")
+    progress_message = progress.ProgressMessage.replace(body, response, carrier_list, say)
     telq_token = obtain_bearer_token()
     contact_error = False
     contact_results = []
     contact_ids = []
-    for network in network_list:
+    skipped_networks = []
+    for index, network in enumerate(network_list):
+        if deadline.expired(needed=SECONDS_PER_NETWORK):
+            skipped_networks = network_list[index:]
+            print(f"Running out of time ({deadline}), skipping networks: {skipped_networks}")
+            for skipped_network in skipped_networks:
+                progress_message.set(skipped_network["carrier"], ":no_entry_sign: Not tested, out of time")
+            break
+        progress_message.set(network["carrier"], ":arrows_counterclockwise: Sending test...")
         try:
             telq_test = create_test(telq_token, network["mcc"], network["mnc"])
             test_data = telq_test[0]
         except:
             response = f"There has been an error creating a test in TelQ. Here is the response received:\n{telq_test}\n\nThis error is fatal. Giving up."
-            do_say(response, say)
+            progress_message.set(network["carrier"], ":x: Failed to create the TelQ test")
+            progress_message.finish(response)
             return
         try:
-            create_contact_response = create_contact(stack, country_code, test_data["phoneNumber"])
+            create_contact_response = regions.run(
+                stack, "scripts.telq:create_contact", stack, country_code, test_data["phoneNumber"]
+            )
             contact_id = create_contact_response["id"]
             contact_ids.append(contact_id)
         except:
             response = f"There has been an error creating the contact in ***. Here is the response received:\n{create_contact_response}\n\nThis error is fatal. Giving up."
-            do_say(response, say)
+            progress_message.set(network["carrier"], ":x: Failed to create the *** contact")
+            progress_message.finish(response)
             return
         try:
-            notification_response = send_notification(
-                stack, country_code, test_data["testIdText"], contact_id
+            notification_response = regions.run(
+                stack, "scripts.telq:send_notification", stack, country_code, test_data["testIdText"], contact_id
             )
             notification_id = notification_response["id"]
             print(f"Successfully sent notification: {notification_id}")
         except:
             response = f"There has been an error sending the notification in ***. Here is the response received:\n{notification_response}\n\nThis error is fatal. Giving up."
-            do_say(response, say)
+            progress_message.set(network["carrier"], ":x: Failed to send the notification")
+            progress_message.finish(response)
             return notification_response
-
-    response = "All tests successfully sent from ***! :data_party:\n\nCheck TelQ for results:\nhttps://app.telqtele.com/#/manual-testing"
-    respond(text=response, delete_original=True, response_type="in_channel", unfurl_links=False)
+        progress_message.set(network["carrier"], ":white_check_mark: Test sent")
+
+    if skipped_networks:
+        skipped = ", ".join([network["carrier"] for network in skipped_networks])
+        response = f"I ran out of time before I could test every network, so the following were *not* tested:\n{skipped}\n\nAny other networks were sent successfully from ***. Check TelQ for results:\nhttps://app.telqtele.com/#/manual-testing"
+    else:
+        response = "All tests successfully sent from ***! :data_party:\n\nCheck TelQ for results:\nhttps://app.telqtele.com/#/manual-testing"
+    print(f"Doing progress update: {response}")
+    progress_message.finish(response)
     # Wait 15 seconds after triggering notifications to ensure 
     # that contact is not deleted before notification is initiated.
     # It's possible this may need to be increased but this already 
     # dramatically increases function time so careful balance is needed.
-    time.sleep(15)
+    if deadline.sleep(CONTACT_DELETE_DELAY) is False:
+        # Deleting now could pull the contact before the notification goes out, so leave them.
+        report_leftover_contacts(contact_ids, respond)
+        return
     print("Starting contact delete")
-    for contact in contact_ids:
-        time.sleep(2)  # 2 second delay keeps *** API from rate limiting us (hopefully)
+    for index, contact in enumerate(contact_ids):
+        if deadline.expired(needed=SECONDS_PER_DELETE):
+            report_leftover_contacts(contact_ids[index:], respond)
+            break
         try:
-            delete_contact_response = delete_contact(stack, contact)
+            delete_contact_response = regions.run(stack, "scripts.telq:delete_contact", stack, contact)
             if delete_contact_response["message"].casefold() != "ok":
                 contact_error = True
                 contact_results.append(delete_contact_response)
@@ -552,7 +674,16 @@ def handle_submit_networks(body, respond, say):
         )
 
 
-def handle_network_selection(options, say):
+def report_leftover_contacts(contact_ids: list, respond: object) -> None:
+    """Tells the channel which TelQ contacts we had no time left to delete"""
+    print(f"Out of time, leaving contacts in ***: {contact_ids}")
+    newline = "\n"
+    respond(
+        f"I ran out of time before I could delete the following *** contact(s) created for this test:\n{newline.join([str(contact) for contact in contact_ids])}\n\nThis does not affect the test, but you might want to manually clean up these contacts."
+    )
+
+
+def handle_network_selection(options, user_id, channel, say):
     """Takes user input, parses options, queries telq for available test networks,
     sends that information in block form to the user."""
     say_response = do_say(
@@ -572,17 +703,12 @@ def handle_network_selection(options, say):
         return
     stack = options[2].upper()
 
-    telq_token = obtain_bearer_token()
-    network_list = get_networks(telq_token)
+    network_list = get_network_catalog()
     country_networks = get_country_networks(country_name, network_list)
+    # The selector asks for matching networks as the user types (see network_options) rather than
+    # carrying every network in the message, which keeps it small however many networks there are.
+    share_country_networks(country_code, country_networks)
 
-    block_options = []
-    for network in country_networks:
-        list_item = {
-            "text": {"type": "plain_text", "text": network["providerName"], "emoji": True},
-            "value": network["mcc"] + network["mnc"],
-        }
-        block_options.append(list_item)
     blocks = [
         {
             "type": "header",
@@ -602,11 +728,12 @@ def handle_network_selection(options, say):
         {"type": "divider"},
         {
             "type": "section",
+            "block_id": f"networks:{country_code}",
             "text": {"type": "mrkdwn", "text": "Select Networks:"},
             "accessory": {
-                "type": "multi_static_select",
-                "placeholder": {"type": "plain_text", "text": "Select Networks", "emoji": True},
-                "options": block_options,
+                "type": "multi_external_select",
+                "placeholder": {"type": "plain_text", "text": "Type a network name or MCC/MNC", "emoji": True},
+                "min_query_length": 0,
                 "action_id": "network_select_action",
             },
         },
@@ -622,5 +749,5 @@ def handle_network_selection(options, say):
             ],
         },
     ]
-    delete_slack_message(message_id, channel_id)
-    say(blocks=blocks)
+    # Swap the "Obtaining list" message for the form instead of deleting it and posting again
+    progress.update_message(channel_id, message_id, f"{stack} Stack: {country_code} Network Selection", blocks)
@@ -0,0 +1,96 @@
+"""Cheap argument checks for keywords. Nothing in here does any I/O or imports anything heavy,
+so lambda_function can run these inside the ack path and answer mistakes without a lazy invocation.
+Each check returns the response to send the user, or None if the arguments look usable."""
+import re
+
+
+def index_in_list(a_list: list, index: int) -> bool:
+    """Verifies if a given index exists in a list"""
+    return index < len(a_list)
+
+
+def telq_options(options: list, user_id: str) -> str:
+    """Checks `@AutoBot telq STACK COUNTRY_CODE`"""
+    if index_in_list(options, 3) is False or index_in_list(options, 4) is True:
+        return f"Sorry <@{user_id}>, the TelQ tool takes *exactly 2* arguments:\n1) An *** Production stack: [*US*, *EU*, *STG*] to send from.\n2) A 2 letter country code. \n\nExample: `@AutoBot telq US IN`\nTry `@AutoBot telq help` for help."
+    if len(options[3]) != 2:
+        return f"Sorry <@{user_id}>, you can only enter *2* letters for your country code. Example: `@AutoBot telq US IN`\nTry `@AutoBot telq help` for help."
+    if options[2].casefold() not in ["us", "eu", "stg"]:
+        return f"Sorry <@{user_id}>, You must use one of the following for your choice of *** Production stack: [*US*, *EU*, *STG*]. Example: `@AutoBot telq US IN`\nTry `@AutoBot telq help` for help."
+    return None
+
+
+def primary_options(options: list, user_id: str) -> str:
+    """Checks `@AutoBot primary STACK COUNTRY_CODE`"""
+    # Options[0] = "@AutoBot"
+    # Options[1] = "primary"
+    # Options[2] = Stack
+    # Options[3] = Country Code
+    if index_in_list(options, 3) is False or index_in_list(options, 4) is True:
+        return f"Sorry <@{user_id}>, You seem to have provided the wrong number of options!\n\nThis keyword takes *exactly 2* arguments:\n1) An *** Production stack: [*US*, *EU*, *STG*] to check.\n2) A 2 letter country code.\n\nExample: `@AutoBot primary EU IN`\n\nTry `@AutoBot primary help` for help."
+    if options[2].casefold() not in ["us", "eu", "stg"]:
+        return f"Sorry <@{user_id}>, You have specified an invalid application stack. Valid options are [*US*, *EU*, *STG*].\n\nExample: `@AutoBot primary STG IN`\nTry `@AutoBot primary help` for help."
+    if options[2].casefold() == "stg":
+        return f"Sorry <@{user_id}>, I cannot currently look up the primary/secondary in stage. Please contact CloudOps for assistance."
+    if len(options[3]) != 2:
+        return f"Sorry <@{user_id}>, You must specify the 2 letter country code.\n\nExample: `@AutoBot primary us us`\n\nTry `@AutoBot primary help` for help."
+    return None
+
+
+def primary_switch_options(options: list, user_id: str) -> str:
+    """Checks `@AutoBot primary switch STACK COUNTRY_CODE`"""
+    # Options[0] = "@AutoBot"
+    # Options[1] = "primary"
+    # Options[2] = "switch"
+    # Options[3] = Stack
+    # Options[4] = Country Code
+    if index_in_list(options, 4) is False or index_in_list(options, 5) is True:
+        return f"Sorry <@{user_id}>, You seem to have provided the wrong number of options!\n\nThis action takes *exactly 2* arguments:\n1) An *** Production stack: [*US*, *EU*, *STG*] to send from.\n2) A 2 letter country code.\n\nExample: `@AutoBot primary switch EU IN`\n\nTry `@AutoBot primary help` for help."
+    if options[3].casefold() == "stg":
+        return f"Sorry <@{user_id}>, I cannot currently switch the primary/secondary in stage."
+    if options[3].casefold() not in ["us", "eu"]:
+        return f"Sorry <@{user_id}>, You have specified an invalid application stack. Valid options are [*US*, *EU*].\n\nExample: `@AutoBot primary switch US MX`\nTry `@AutoBot primary help` for help."
+    if len(options[4]) != 2:
+        return f"Sorry <@{user_id}>, You must specify a 2 letter country code.\n\nExample: `@AutoBot primary switch us us`\n\nTry `@AutoBot primary help` for help."
+    return None
+
+
+def boarding_email(options: list) -> str:
+    """Returns the custom email address given as the optional third argument, or None"""
+    if index_in_list(options, 4) is False:
+        return None
+    # Slack sends email addresses as <mailto:address|address>
+    email = re.search("mailto:(.+)\|", options[4].lower())  # pylint: disable=anomalous-backslash-in-string
+    if email is None:
+        return None
+    return email.group(1)
+
+
+def boarding_options(options: list, user_id: str, keyword: str) -> str:
+    """Checks `@AutoBot onboard|offboard FIRST LAST [EMAIL]`. keyword is "onboard" or "offboard"."""
+    if index_in_list(options, 3) is False or index_in_list(options, 5) is True:
+        return f"Sorry <@{user_id}>, You seem to have provided the wrong number of options!\n\nThis keyword takes two (2) arguments: *First Name* and *Last Name*.\n\nExample: `@AutoBot {keyword} Billie Jean.`\n\nYou can optionally supply a custom email address as a third argument if different than usual.`\nTry `@AutoBot {keyword} help` for help."
+    if index_in_list(options, 4) is False:  # options[4] is likely to be a custom email address
+        return None
+    first_name = options[2].title()
+    last_name = options[3].title()
+    email = boarding_email(options)
+    if email is None:
+        return f"Sorry <@{user_id}>, I'm having trouble deciphering the email you've specified. Note that you may only {keyword} `@*****************.com` email addresses.\n\nYou specified: {options[4]}\n\nExample: `@AutoBot {keyword} Billie Jean billie.jean@*****************.com`\n\nTry `@AutoBot {keyword} help` for help."
+    if "@*****************.com" not in email[-15:].casefold():
+        return f"Sorry <@{user_id}>, You may only {keyword} `@*****************.com` email addresses!\nYou specified '{options[4]}'\n\nExample: `@AutoBot {keyword} Billie Jean billie.jean@*****************.com`\n\nTry `@AutoBot {keyword} help` for help."
+    if "@" in options[2] or "@" in options[3]:
+        return f"Sorry <@{user_id}>, You may possibly be trying to specify things in the wrong order...\nYou specified the following values, please double check and try again:\nFirst Name: {first_name}\nLast Name: {last_name}\nEmail Address: {email}\n\nExample: `@AutoBot {keyword} Billie Jean billie.jean@*****************.com`\n\nTry `@AutoBot {keyword} help` for help."
+    if email == "*****************":
+        return f"Sorry <@{user_id}>, I cannot on/offboard *****************, it would break stuff."
+    return None
+
+
+def onboard_options(options: list, user_id: str) -> str:
+    """Checks `@AutoBot onboard FIRST LAST [EMAIL]`"""
+    return boarding_options(options, user_id, "onboard")
+
+
+def offboard_options(options: list, user_id: str) -> str:
+    """Checks `@AutoBot offboard FIRST LAST [EMAIL]`"""
+    return boarding_options(options, user_id, "offboard")
@@ -0,0 +1,49 @@
+"""Warm-up pings and init-phase cache priming for the lambda handlers"""
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+WARMUP_RESPONSE = {"statusCode": 200, "body": "warm"}
+
+
+def is_warmup_event(event: object) -> bool:
+    """True for scheduled keep-warm pings (EventBridge schedules or a {"warmup": true} payload)"""
+    if not isinstance(event, dict):
+        return False
+    if event.get("warmup") is True:
+        return True
+    return event.get("source") == "aws.events" and event.get("detail-type") == "Scheduled Event"
+
+
+def is_provisioned_init() -> bool:
+    """True while lambda is initializing a provisioned concurrency environment"""
+    return os.environ.get("AWS_LAMBDA_INITIALIZATION_TYPE") == "provisioned-concurrency"
+
+
+def resolve_hosts(hosts: list) -> None:
+    """Looks up upstream hosts so the DNS answers are cached before the first real request"""
+    for host in hosts:
+        socket.getaddrinfo(host, 443, proto=socket.IPPROTO_TCP)
+
+
+def prime(tasks: dict) -> dict:
+    """Runs every priming task in parallel. Failures are logged and reported but never raised,
+    since anything not primed will simply be fetched inline by the first real request."""
+    results = {}
+
+    def run(name, task):
+        start = time.perf_counter()
+        try:
+            task()
+        except BaseException as err:
+            results[name] = f"failed: {err}"
+        else:
+            results[name] = "ok"
+        results[name] += f" ({(time.perf_counter() - start) * 1000:.0f}ms)"
+
+    with ThreadPoolExecutor(max_workers=max(len(tasks), 1)) as executor:
+        for name, task in tasks.items():
+            executor.submit(run, name, task)
+    print(f"Cache priming results: {results}")
+    return results
@@ -0,0 +1,57 @@
+"""Runs AutoBot as a long lived process instead of on lambda.
+
+The same handlers from lambda_function.py are bound to a second Bolt App that acks immediately and
+runs the lazy work on a bounded worker pool. Secrets, caches, HTTP/AWS clients and MongoDB
+connections live for the life of the process, so there are no cold starts or second invocations.
+
+Socket Mode (needs an app level token, `xapp-...`, and the websocket-client package):
+    SLACK_APP_TOKEN=xapp-... python server.py --mode socket
+Plain HTTP server (point the Slack request URL at http://host:PORT/slack/events):
+    python server.py --mode http --port 3000
+"""
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from slack_bolt import App
+import lambda_function
+from scripts import warmup
+from scripts.get_secret import get_secret
+
+# Upper bound on handlers running at once. Each command mostly waits on upstream APIs.
+WORKERS = int(os.environ.get("AUTOBOT_WORKERS", "8"))
+
+
+def build_app(workers: int) -> App:
+    """Bolt app for a persistent process. Lazy listeners run on our pool rather than new invocations."""
+    secrets = get_secret()
+    app = App(
+        signing_secret=secrets["signing_secret"],
+        authorize=lambda_function.authorize,
+        listener_executor=ThreadPoolExecutor(max_workers=workers, thread_name_prefix="autobot"),
+    )
+    return lambda_function.register_listeners(app)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["socket", "http"], default=os.environ.get("AUTOBOT_MODE", "socket"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "3000")))
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    app = build_app(args.workers)
+    warmup.prime(lambda_function.priming_tasks())
+
+    if args.mode == "socket":
+        from slack_bolt.adapter.socket_mode import SocketModeHandler  # pylint: disable=import-outside-toplevel
+
+        app_token = os.environ.get("SLACK_APP_TOKEN") or get_secret().get("app_token")
+        print(f"Starting AutoBot in Socket Mode with {args.workers} workers")
+        SocketModeHandler(app, app_token).start()
+    else:
+        print(f"Starting AutoBot HTTP server on port {args.port} with {args.workers} workers")
+        app.start(port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Shared test setup. The bot's modules are imported from the repository root, as they are on lambda."""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts import deadline, get_secret, state  # pylint: disable=import-error,wrong-import-position
+
+# What Secrets Manager hands out in tests
+FAKE_SECRETS = {"token": "xoxb-test", "signing_secret": "test-signing-secret"}
+
+
+@pytest.fixture
+def fake_secrets(monkeypatch):
+    """Serves FAKE_SECRETS instead of calling Secrets Manager. Most modules fetch their secrets on import."""
+    monkeypatch.setattr(get_secret, "_fetch_secret", lambda: dict(FAKE_SECRETS))
+    return FAKE_SECRETS
+
+
+@pytest.fixture(autouse=True)
+def no_deadline(monkeypatch):
+    """Runs every test without a time limit, as outside of lambda, unless it sets one itself"""
+    monkeypatch.setitem(deadline._current, "deadline", deadline.Deadline())
+
+
+@pytest.fixture(autouse=True)
+def local_state(monkeypatch):
+    """Keeps the shared state store in memory (AUTOBOT_STATE_BACKEND=local), empty for every test"""
+    monkeypatch.setattr(state, "BACKEND", "local")
+    monkeypatch.setattr(state, "_local", {})
+    return state._local
@@ -0,0 +1,82 @@
+import pytest
+from scripts import circuit  # pylint: disable=import-error
+
+
+def trip(breaker):
+    for _ in range(circuit.MIN_CALLS):
+        breaker.record(False, 0.1)
+
+
+def test_stays_closed_until_enough_calls():
+    breaker = circuit.CircuitBreaker("test")
+    for _ in range(circuit.MIN_CALLS - 1):
+        breaker.record(False, 0.1)
+    assert breaker.state == circuit.CLOSED
+    breaker.before_call()
+
+
+def test_stays_closed_below_error_rate():
+    breaker = circuit.CircuitBreaker("test")
+    for index in range(10):
+        breaker.record(index % 3 == 0 or index % 3 == 1, 0.1)
+    assert breaker.state == circuit.CLOSED
+
+
+def test_opens_on_errors_and_rejects_calls():
+    breaker = circuit.CircuitBreaker("test")
+    trip(breaker)
+    assert breaker.state == circuit.OPEN
+    with pytest.raises(circuit.CircuitOpenError) as err:
+        breaker.before_call()
+    assert 0 < err.value.retry_in <= circuit.OPEN_SECONDS
+
+
+def test_opens_on_slow_calls():
+    breaker = circuit.CircuitBreaker("test")
+    for _ in range(circuit.MIN_CALLS):
+        breaker.record(True, circuit.SLOW_CALL)
+    assert breaker.state == circuit.OPEN
+
+
+def test_half_open_lets_one_probe_through(monkeypatch):
+    breaker = circuit.CircuitBreaker("test")
+    trip(breaker)
+    monkeypatch.setattr(circuit, "OPEN_SECONDS", 0)
+    breaker.before_call()
+    assert breaker.state == circuit.HALF_OPEN
+    with pytest.raises(circuit.CircuitOpenError):
+        breaker.before_call()
+
+
+def test_good_probe_closes(monkeypatch):
+    breaker = circuit.CircuitBreaker("test")
+    trip(breaker)
+    monkeypatch.setattr(circuit, "OPEN_SECONDS", 0)
+    breaker.before_call()
+    breaker.record(True, 0.1)
+    assert breaker.state == circuit.CLOSED
+    # Earlier failures are forgotten, so one more doesn't reopen it
+    breaker.record(False, 0.1)
+    assert breaker.state == circuit.CLOSED
+
+
+def test_bad_probe_reopens(monkeypatch):
+    breaker = circuit.CircuitBreaker("test")
+    trip(breaker)
+    monkeypatch.setattr(circuit, "OPEN_SECONDS", 0)
+    breaker.before_call()
+    breaker.record(False, 0.1)
+    assert breaker.state == circuit.OPEN
+
+
+def test_call_records_exceptions():
+    breaker = circuit.CircuitBreaker("test")
+
+    def fail():
+        raise ValueError("upstream down")
+
+    for _ in range(circuit.MIN_CALLS):
+        with pytest.raises(ValueError):
+            breaker.call(fail)
+    with pytest.raises(circuit.CircuitOpenError):
+        breaker.call(lambda: "not called")
@@ -0,0 +1,61 @@
+from scripts import confirmations  # pylint: disable=import-error
+
+
+def test_first_confirmation_in_window_reports(monkeypatch):
+    monkeypatch.setattr(confirmations, "DEBOUNCE", 2.0)
+    monkeypatch.setattr(confirmations, "_now", lambda: 1000.5)
+    assert confirmations.claim_report("run") == 1.5
+    assert confirmations.claim_report("run") is None
+
+
+def test_next_window_reports_again(monkeypatch):
+    now = [1000.5]
+    monkeypatch.setattr(confirmations, "DEBOUNCE", 2.0)
+    monkeypatch.setattr(confirmations, "_now", lambda: now[0])
+    assert confirmations.claim_report("run") is not None
+    now[0] = 1002.0
+    assert confirmations.claim_report("run") == 2.0
+
+
+def test_runs_are_claimed_separately(monkeypatch):
+    monkeypatch.setattr(confirmations, "_now", lambda: 1000.0)
+    assert confirmations.claim_report("one") is not None
+    assert confirmations.claim_report("two") is not None
+
+
+def test_responders_are_collected_per_run():
+    confirmations.record("run", "C1", "US", "SMS", ["U1", "U2"])
+    confirmations.set_thread("run", "C1", "1700000000.000100")
+    confirmations.record("run", "C1", "EU", "Voice", ["U1"])
+    item = confirmations.state.get(confirmations.run_key("run"))
+    assert item["responses"] == {"US|SMS|U1", "US|SMS|U2", "EU|Voice|U1"}
+    assert (item["channel"], item["thread_ts"]) == ("C1", "1700000000.000100")
+    assert confirmations.render(item) == (
+        "Received confirmation responses from 2 user(s) :meowparty:\n"
+        "*EU Stack Voice*: 1 confirmation(s) from <@U1>\n"
+        "*US Stack SMS*: 2 confirmation(s) from <@U1>, <@U2>"
+    )
+
+
+def test_only_one_invocation_posts_the_message():
+    assert confirmations.claim_message("run") is True
+    assert confirmations.claim_message("run") is False
+
+
+def test_waits_for_the_message_to_be_posted():
+    confirmations.claim_message("run")
+    confirmations.save_message("run", "1700000000.000200")
+    assert confirmations.wait_for_message("run")["message_ts"] == "1700000000.000200"
+
+
+def test_gives_up_waiting_for_a_message_that_is_never_posted(monkeypatch):
+    monkeypatch.setattr(confirmations, "MESSAGE_WAIT", 0.05)
+    confirmations.claim_message("run")
+    assert confirmations.wait_for_message("run") is None
+
+
+def test_released_claim_can_be_taken_again():
+    confirmations.claim_message("run")
+    confirmations.release_message("run")
+    assert confirmations.wait_for_message("run") is None
+    assert confirmations.claim_message("run") is True
@@ -0,0 +1,43 @@
+import math
+import time
+from scripts import deadline  # pylint: disable=import-error
+
+
+class FakeContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def test_no_limit_outside_lambda():
+    limit = deadline.Deadline.from_context(None)
+    assert limit.remaining() == math.inf
+    assert limit.expired(needed=3600) is False
+
+
+def test_remaining_time_comes_from_the_context():
+    limit = deadline.Deadline.from_context(FakeContext(30000))
+    assert 29 < limit.remaining() <= 30
+
+
+def test_reserve_is_kept_back():
+    limit = deadline.Deadline(time.monotonic() + 10, reserve=5)
+    assert limit.expired() is False
+    assert limit.expired(needed=4) is False
+    assert limit.expired(needed=6) is True
+
+
+def test_sleep_stops_at_the_reserve():
+    limit = deadline.Deadline(time.monotonic() + 5.05, reserve=5)
+    started = time.monotonic()
+    assert limit.sleep(10) is False
+    assert time.monotonic() - started < 1
+    assert deadline.Deadline().sleep(0.01) is True
+
+
+def test_start_sets_the_current_deadline():
+    started = deadline.start(FakeContext(20000))
+    assert deadline.current() is started
+    assert started.remaining() <= 20
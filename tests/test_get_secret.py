@@ -0,0 +1,110 @@
+import threading
+import time
+import pytest
+from scripts import get_secret  # pylint: disable=import-error
+
+
+class FakeFetch:
+    """_fetch_secret that hands out each of `values` in turn (repeating the last one) and counts calls"""
+
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+        self.fetched = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        value = self.values[min(self.calls, len(self.values)) - 1]
+        self.fetched.set()
+        if isinstance(value, BaseException):
+            raise value
+        return dict(value)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    """Starts every test with nothing fetched, and puts the process-wide cache back afterwards"""
+    saved = dict(get_secret._secrets)
+    monkeypatch.setattr(
+        get_secret, "_state", {"fetched_at": None, "refreshing": False, "rotation_refreshed_at": None}
+    )
+    monkeypatch.setattr(get_secret, "_stats", dict.fromkeys(get_secret._stats, 0))
+    get_secret._secrets.clear()
+    yield
+    get_secret._secrets.clear()
+    get_secret._secrets.update(saved)
+
+
+def wait_for_refresh():
+    give_up_at = time.monotonic() + 5
+    while get_secret._state["refreshing"] and time.monotonic() < give_up_at:
+        time.sleep(0.01)
+    assert get_secret._state["refreshing"] is False
+
+
+def test_fetched_once_and_shared(monkeypatch):
+    fetch = FakeFetch({"token": "one"})
+    monkeypatch.setattr(get_secret, "_fetch_secret", fetch)
+    first = get_secret.get_secret()
+    assert first == {"token": "one"}
+    assert get_secret.get_secret() is first
+    assert fetch.calls == 1
+
+
+def test_stale_secrets_refresh_in_background(monkeypatch):
+    fetch = FakeFetch({"token": "one"}, {"token": "two"})
+    monkeypatch.setattr(get_secret, "_fetch_secret", fetch)
+    secrets = get_secret.get_secret()
+    fetch.fetched.clear()
+    get_secret._state["fetched_at"] -= get_secret.SECRET_TTL + 1
+    # The cached values are served straight away, and updated in place once the refresh is done
+    assert get_secret.get_secret()["token"] in ["one", "two"]
+    assert fetch.fetched.wait(5)
+    wait_for_refresh()
+    assert secrets == {"token": "two"}
+    assert fetch.calls == 2
+
+
+def test_failed_background_refresh_keeps_old_values(monkeypatch):
+    fetch = FakeFetch({"token": "one"}, RuntimeError("secrets manager down"))
+    monkeypatch.setattr(get_secret, "_fetch_secret", fetch)
+    secrets = get_secret.get_secret()
+    get_secret._state["fetched_at"] -= get_secret.SECRET_TTL + 1
+    get_secret.get_secret()
+    wait_for_refresh()
+    assert secrets == {"token": "one"}
+    assert fetch.calls == 2
+
+
+def test_auth_failure_refresh_reports_changes(monkeypatch):
+    fetch = FakeFetch({"token": "one"}, {"token": "two"})
+    monkeypatch.setattr(get_secret, "_fetch_secret", fetch)
+    secrets = get_secret.get_secret()
+    assert get_secret.refresh_secret_after_auth_failure() is True
+    assert secrets == {"token": "two"}
+
+
+def test_auth_failure_refresh_has_a_cooldown(monkeypatch):
+    fetch = FakeFetch({"token": "one"})
+    monkeypatch.setattr(get_secret, "_fetch_secret", fetch)
+    get_secret.get_secret()
+    # Nothing changed, so a retry wouldn't help
+    assert get_secret.refresh_secret_after_auth_failure() is False
+    assert get_secret.refresh_secret_after_auth_failure() is False
+    assert fetch.calls == 2
+    get_secret._state["rotation_refreshed_at"] -= get_secret.ROTATION_COOLDOWN + 1
+    get_secret.refresh_secret_after_auth_failure()
+    assert fetch.calls == 3
+
+
+def test_stats_count_every_fetch(monkeypatch):
+    fetch = FakeFetch({"token": "one"}, {"token": "two"}, RuntimeError("secrets manager down"))
+    monkeypatch.setattr(get_secret, "_fetch_secret", fetch)
+    get_secret.get_secret()
+    get_secret.get_secret()
+    get_secret.refresh_secret_after_auth_failure()
+    get_secret._state["fetched_at"] -= get_secret.SECRET_TTL + 1
+    get_secret.get_secret()
+    wait_for_refresh()
+    stats = get_secret.get_secret_stats()
+    assert (stats["fetches"], stats["hits"], stats["rotation_refreshes"], stats["errors"]) == (2, 2, 1, 1)
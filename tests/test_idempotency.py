@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+from scripts import idempotency, state  # pylint: disable=import-error
+
+
+def test_first_delivery_claims_event():
+    assert idempotency.claim({"event_id": "Ev1"}) is True
+    assert idempotency.claim({"event_id": "Ev1"}) is False
+    assert idempotency.claim({"event_id": "Ev2"}) is True
+
+
+def test_actions_are_claimed_by_trigger():
+    assert idempotency.claim({"trigger_id": "T1"}) is True
+    assert idempotency.claim({"trigger_id": "T1"}) is False
+
+
+def test_deliveries_without_an_id_are_always_handled():
+    assert idempotency.claim({}) is True
+    assert idempotency.claim({}) is True
+
+
+def test_handled_anyway_when_the_store_is_down(monkeypatch):
+    def broken(*args):
+        raise RuntimeError("table missing")
+
+    monkeypatch.setattr(state, "put_if_absent", broken)
+    assert idempotency.claim({"event_id": "Ev1"}) is True
+
+
+def test_once_only_runs_the_first_delivery():
+    calls = []
+
+    def handle_mention(body, say):
+        calls.append(body["event_id"])
+
+    listener = idempotency.once(handle_mention)
+    args = SimpleNamespace(body={"event_id": "Ev1"}, say=print)
+    listener(args)
+    listener(args)
+    assert calls == ["Ev1"]
+    # Bolt finds lazy listeners by name
+    assert listener.__name__ == "handle_mention"
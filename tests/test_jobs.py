@@ -0,0 +1,50 @@
+import pytest
+from scripts import jobs, resources  # pylint: disable=import-error
+
+
+@pytest.fixture(autouse=True)
+def sqlite_queue(monkeypatch, tmp_path):
+    """A fresh SQLite job queue for every test"""
+    monkeypatch.setattr(jobs, "BACKEND", "sqlite")
+    monkeypatch.setattr(jobs, "JOB_DB", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(resources, "_clients", {})
+
+
+def test_enqueued_jobs_are_received_once():
+    job_id = jobs.enqueue("update", "C1", "U1", options=["<@bot>", "update"], flight=["update"])
+    [(job, attempt, receipt)] = jobs.receive(10, wait=0)
+    assert job["id"] == job_id
+    assert (job["type"], job["channel"], job["user_id"], job["options"]) == ("update", "C1", "U1", ["<@bot>", "update"])
+    assert attempt == 1
+    # Hidden from other workers until it's completed or its visibility timeout runs out
+    assert jobs.receive(10, wait=0) == []
+    jobs.complete(receipt)
+    assert jobs.receive(10, wait=0) == []
+
+
+def test_receive_takes_at_most_max_jobs():
+    for user in ["U1", "U2", "U3"]:
+        jobs.enqueue("update", "C1", user, options=[], flight=[])
+    assert len(jobs.receive(2, wait=0)) == 2
+    assert len(jobs.receive(2, wait=0)) == 1
+
+
+def test_failed_jobs_come_back_for_another_attempt():
+    jobs.enqueue("update", "C1", "U1", options=[], flight=[])
+    [(job, attempt, receipt)] = jobs.receive(1, wait=0)
+    jobs.retry_later(receipt, 0)
+    [(retried, attempt, receipt)] = jobs.receive(1, wait=0)
+    assert retried["id"] == job["id"]
+    assert attempt == 2
+
+
+def test_retries_wait_for_their_delay():
+    jobs.enqueue("update", "C1", "U1", options=[], flight=[])
+    [(_, _, receipt)] = jobs.receive(1, wait=0)
+    jobs.retry_later(receipt, 60)
+    assert jobs.receive(1, wait=0) == []
+
+
+def test_jobs_that_cant_be_repeated_are_not_retried():
+    for job_type in ["rollout", "test", "telq_submit", "onboard"]:
+        assert jobs.JOB_TYPES[job_type]["retries"] == 0
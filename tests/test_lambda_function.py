@@ -0,0 +1,62 @@
+import pytest
+
+# The mention Slack puts first when someone tags the bot, as quick_response expects it
+BOT = "<@*****************"
+
+
+@pytest.fixture
+def bot(fake_secrets, monkeypatch):
+    import lambda_function as module  # pylint: disable=import-error,import-outside-toplevel
+
+    def not_expected(user):
+        raise AssertionError(f"looked up CloudOps membership for {user}")
+
+    monkeypatch.setattr(module, "check_user_is_noc", not_expected)
+    return module
+
+
+def test_help_and_easter_egg(bot):
+    assert "<@U1>" in bot.quick_response([BOT, "help"], "U1")
+    assert bot.quick_response([BOT, "jes"], "U1") == "mmjes"
+
+
+def test_unknown_or_misplaced_keywords(bot):
+    assert "following keywords" in bot.quick_response([BOT], "U1")
+    assert "following keywords" in bot.quick_response([BOT, "launch"], "U1")
+    assert "very first thing" in bot.quick_response(["hey", BOT, "help"], "U1")
+
+
+def test_open_commands_are_answered_inline(bot):
+    assert bot.quick_response([BOT, "rollout", "help"], "U1") == bot.ROLLOUT_HELP_MESSAGE
+    assert bot.quick_response([BOT, "primary", "help"], "U1") == bot.PRIMARY_HELP_MESSAGE
+    assert "invalid application stack" in bot.quick_response([BOT, "primary", "ap", "GB"], "U1")
+    assert bot.quick_response([BOT, "primary", "EU", "GB"], "U1") is None
+    assert bot.quick_response([BOT, "test", "sms"], "U1") is None
+
+
+def test_telq_help_is_for_everyone(bot):
+    assert bot.quick_response([BOT, "telq", "help"], "U1") == bot.TELQ_HELP_MESSAGE
+
+
+def test_cloudops_commands_wait_for_the_membership_check(bot):
+    assert bot.quick_response([BOT, "telq", "us"], "U1") is None
+    assert bot.quick_response([BOT, "onboard", "help"], "U1") is None
+    assert bot.quick_response([BOT, "offboard"], "U1") is None
+    assert bot.quick_response([BOT, "primary", "switch", "us"], "U1") is None
+
+
+def test_command_response(bot):
+    assert bot.command_response([BOT, "onboard", "help"], "U1") == bot.ONBOARD_HELP_MESSAGE
+    assert "*exactly 2*" in bot.command_response([BOT, "telq", "us"], "U1")
+    assert "wrong number" in bot.command_response([BOT, "primary", "switch", "us"], "U1")
+    assert bot.command_response([BOT, "onboard", "billie", "jean"], "U1") is None
+
+
+def test_warm_up_does_not_wait_for_the_telq_catalog(bot, monkeypatch):
+    from scripts import telq  # pylint: disable=import-error,import-outside-toplevel
+
+    fetched = []
+    monkeypatch.setattr(telq, "obtain_bearer_token", lambda: fetched.append("token"))
+    monkeypatch.setattr(telq, "get_network_catalog", lambda: fetched.append("catalog"))
+    bot.priming_tasks()["telq_token"]()
+    assert fetched == ["token"]
@@ -0,0 +1,77 @@
+import pytest
+from scripts import messages  # pylint: disable=import-error
+
+
+class FakeSay:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text="", **kwargs):
+        self.calls.append(dict(kwargs, text=text))
+        return {"ok": True}
+
+
+def test_short_text_is_one_section():
+    assert messages.sections("hello") == ["hello"]
+
+
+def test_long_text_splits_on_lines():
+    line = "x" * 1000
+    chunks = messages.sections("\n".join([line] * 5))
+    assert chunks == ["\n".join([line] * 2), "\n".join([line] * 2), line]
+    assert all(len(chunk) <= messages.MAX_SECTION for chunk in chunks)
+
+
+def test_text_without_lines_is_cut_at_limit():
+    chunks = messages.sections("x" * (messages.MAX_SECTION + 10))
+    assert [len(chunk) for chunk in chunks] == [messages.MAX_SECTION, 10]
+
+
+def test_single_part_is_plain_text(monkeypatch):
+    monkeypatch.setattr(messages, "ENABLED", True)
+    say = FakeSay()
+    buffer = messages.MessageBuffer(say)
+    buffer("one")
+    assert say.calls == []
+    buffer.flush()
+    assert say.calls == [{"text": "one"}]
+    assert buffer.flush() is None
+
+
+def test_parts_are_batched_into_blocks(monkeypatch):
+    monkeypatch.setattr(messages, "ENABLED", True)
+    say = FakeSay()
+    with messages.MessageBuffer(say) as buffer:
+        for index in range(messages.MAX_BLOCKS + 1):
+            buffer(f"line {index}")
+    assert len(say.calls) == 2
+    assert len(say.calls[0]["blocks"]) == messages.MAX_BLOCKS
+    assert say.calls[0]["text"] == "line 0"
+    assert say.calls[1]["blocks"] == [{"type": "section", "text": {"type": "mrkdwn", "text": f"line {messages.MAX_BLOCKS}"}}]
+
+
+def test_other_messages_keep_their_order(monkeypatch):
+    monkeypatch.setattr(messages, "ENABLED", True)
+    say = FakeSay()
+    buffer = messages.MessageBuffer(say)
+    buffer("first")
+    buffer(blocks=[{"type": "divider"}])
+    assert say.calls == [{"text": "first"}, {"text": "", "blocks": [{"type": "divider"}]}]
+
+
+def test_buffered_commands_post_once_even_if_they_fail(monkeypatch):
+    monkeypatch.setattr(messages, "ENABLED", True)
+    say = FakeSay()
+
+    @messages.buffered
+    def command(options, say):
+        say("starting")
+        messages.checkpoint(say)
+        say("step one")
+        say("step two")
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        command([], say)
+    assert say.calls[0] == {"text": "starting"}
+    assert [block["text"]["text"] for block in say.calls[1]["blocks"]] == ["step one", "step two"]
@@ -0,0 +1,76 @@
+import pytest
+
+
+class FakeUserGroup:
+    """get_noc_user_list that answers like usergroups.users.list and counts calls"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.responses[min(self.calls, len(self.responses)) - 1]
+
+
+@pytest.fixture
+def nocteam(fake_secrets, monkeypatch):
+    from scripts import nocteam as module  # pylint: disable=import-error,import-outside-toplevel
+
+    monkeypatch.setattr(module, "_cache", {"users": None, "fetched_at": None})
+    return module
+
+
+def test_members_are_cached_in_memory(nocteam, monkeypatch):
+    slack = FakeUserGroup({"ok": True, "users": ["U1", "U2"]})
+    monkeypatch.setattr(nocteam, "get_noc_user_list", slack)
+    assert nocteam.check_user_is_noc("U1") is True
+    assert nocteam.check_user_is_noc("U3") is False
+    assert slack.calls == 1
+
+
+def test_other_containers_read_the_shared_copy(nocteam, monkeypatch):
+    slack = FakeUserGroup({"ok": True, "users": ["U1", "U2"]})
+    monkeypatch.setattr(nocteam, "get_noc_user_list", slack)
+    nocteam.get_noc_users()
+    # A new container starts with nothing in memory
+    monkeypatch.setattr(nocteam, "_cache", {"users": None, "fetched_at": None})
+    assert nocteam.get_noc_users() == {"U1", "U2"}
+    assert slack.calls == 1
+
+
+def test_expired_memory_cache_looks_again(nocteam, monkeypatch):
+    slack = FakeUserGroup({"ok": True, "users": ["U1"]}, {"ok": True, "users": ["U1", "U2"]})
+    monkeypatch.setattr(nocteam, "get_noc_user_list", slack)
+    nocteam.get_noc_users()
+    nocteam.state.delete(nocteam.SHARED_KEY)
+    assert nocteam.get_noc_users() == {"U1"}
+    nocteam._cache["fetched_at"] -= nocteam.MEMBERSHIP_TTL + 1
+    assert nocteam.get_noc_users() == {"U1", "U2"}
+
+
+def test_membership_changes_invalidate_both_copies(nocteam, monkeypatch):
+    slack = FakeUserGroup({"ok": True, "users": ["U1"]}, {"ok": True, "users": ["U1", "U2"]})
+    monkeypatch.setattr(nocteam, "get_noc_user_list", slack)
+    assert nocteam.check_user_is_noc("U2") is False
+    nocteam.invalidate({"subteam_id": nocteam.NOC_GROUP, "added_users": ["U2"]})
+    assert nocteam.state.get(nocteam.SHARED_KEY) is None
+    assert nocteam.check_user_is_noc("U2") is True
+    assert slack.calls == 2
+
+
+def test_changes_to_other_groups_are_ignored(nocteam, monkeypatch):
+    slack = FakeUserGroup({"ok": True, "users": ["U1"]})
+    monkeypatch.setattr(nocteam, "get_noc_user_list", slack)
+    nocteam.get_noc_users()
+    nocteam.invalidate({"subteam_id": "S_OTHER"})
+    nocteam.get_noc_users()
+    assert slack.calls == 1
+
+
+def test_rotated_token_is_refetched_once(nocteam, monkeypatch):
+    slack = FakeUserGroup({"ok": False, "error": "invalid_auth"}, {"ok": True, "users": ["U1"]})
+    monkeypatch.setattr(nocteam, "get_noc_user_list", slack)
+    monkeypatch.setattr(nocteam, "refresh_secret_after_auth_failure", lambda: True)
+    assert nocteam.get_noc_users() == {"U1"}
+    assert slack.calls == 2
@@ -0,0 +1,85 @@
+import pytest
+from scripts import resources  # pylint: disable=import-error
+
+
+@pytest.fixture
+def pathtest(fake_secrets, monkeypatch):
+    from scripts import pathtest as module  # pylint: disable=import-error,import-outside-toplevel
+
+    monkeypatch.setattr(module.ratelimit, "backoff_delay", lambda attempt: 0)
+    return module
+
+
+class FakeDynamoDB:
+    """batch_write_item that leaves the first `unprocessed` items of each call unprocessed, `throttled` times"""
+
+    def __init__(self, table, throttled, unprocessed=1):
+        self.table = table
+        self.throttled = throttled
+        self.unprocessed = unprocessed
+        self.calls = []
+
+    def batch_write_item(self, RequestItems):  # pylint: disable=invalid-name
+        requests = RequestItems[self.table]
+        self.calls.append(requests)
+        if len(self.calls) > self.throttled:
+            return {"UnprocessedItems": {}}
+        return {"UnprocessedItems": {self.table: requests[: self.unprocessed]}}
+
+
+def test_retries_unprocessed_items(pathtest, monkeypatch):
+    dynamodb = FakeDynamoDB(pathtest.TRACKING_TABLE, throttled=2)
+    monkeypatch.setattr(resources, "get_dynamodb", lambda: dynamodb)
+    writer = pathtest.TestInfoWriter("run")
+    writer.add(1, "https://delivery/1", "C1")
+    writer.add(2, "https://delivery/2", "C1")
+    assert writer.flush() == []
+    assert [len(call) for call in dynamodb.calls] == [2, 1, 1]
+    assert dynamodb.calls[1][0]["PutRequest"]["Item"]["id"] == 1
+    assert writer.unwritten == []
+
+
+def test_gives_up_after_batch_attempts(pathtest, monkeypatch):
+    dynamodb = FakeDynamoDB(pathtest.TRACKING_TABLE, throttled=pathtest.BATCH_ATTEMPTS)
+    monkeypatch.setattr(resources, "get_dynamodb", lambda: dynamodb)
+    writer = pathtest.TestInfoWriter("run")
+    writer.add(1, "https://delivery/1", "C1")
+    writer.add(2, "https://delivery/2", "C1")
+    unwritten = writer.flush()
+    assert [item["id"] for item in unwritten] == [1]
+    assert len(dynamodb.calls) == pathtest.BATCH_ATTEMPTS
+    # Records are flushed one notification at a time, so failures are kept for the end of the run
+    writer.add(3, "https://delivery/3", "C1")
+    writer.flush()
+    assert writer.unwritten == unwritten
+
+
+def test_splits_into_batches(pathtest, monkeypatch):
+    dynamodb = FakeDynamoDB(pathtest.TRACKING_TABLE, throttled=0)
+    monkeypatch.setattr(resources, "get_dynamodb", lambda: dynamodb)
+    writer = pathtest.TestInfoWriter("run")
+    for ebid in range(pathtest.BATCH_SIZE + 3):
+        writer.add(ebid, f"https://delivery/{ebid}", "C1")
+    assert writer.flush() == []
+    assert [len(call) for call in dynamodb.calls] == [pathtest.BATCH_SIZE, 3]
+    assert dynamodb.calls[1][0]["PutRequest"]["Item"]["run_id"] == "run"
+    # Flushed items aren't written again
+    assert writer.flush() == []
+    assert len(dynamodb.calls) == 2
+
+
+def test_nothing_queued_makes_no_calls(pathtest, monkeypatch):
+    dynamodb = FakeDynamoDB(pathtest.TRACKING_TABLE, throttled=0)
+    monkeypatch.setattr(resources, "get_dynamodb", lambda: dynamodb)
+    assert pathtest.TestInfoWriter("run").flush() == []
+    assert dynamodb.calls == []
+
+
+def test_errors_leave_items_unwritten(pathtest, monkeypatch):
+    def broken():
+        raise RuntimeError("table missing")
+
+    monkeypatch.setattr(resources, "get_dynamodb", broken)
+    writer = pathtest.TestInfoWriter("run")
+    writer.add(1, "https://delivery/1", "C1")
+    assert [item["id"] for item in writer.flush()] == [1]
@@ -0,0 +1,81 @@
+import time
+import pytest
+from scripts import circuit, deadline, polling  # pylint: disable=import-error
+
+FAST = {"initial_interval": 0.002, "max_interval": 0.004}
+
+
+@pytest.fixture(autouse=True)
+def fresh_histograms(monkeypatch):
+    monkeypatch.setattr(polling, "_histograms", {})
+
+
+def results(*values):
+    """fetch() handing out each of values in turn (raising the exceptions), repeating the last one"""
+    calls = []
+
+    def fetch():
+        calls.append(None)
+        value = values[min(len(calls), len(values)) - 1]
+        if isinstance(value, BaseException):
+            raise value
+        return value
+
+    return fetch
+
+
+def classify(result):
+    return {"done": polling.READY, "broken": polling.FAILED}.get(result, polling.PENDING)
+
+
+def test_polls_until_ready():
+    outcome = polling.poll("incident", results("creating", "creating", "done"), classify, timeout=5, **FAST)
+    assert (outcome["status"], outcome["result"], outcome["attempts"]) == (polling.READY, "done", 3)
+    assert sum(sum(counts.values()) for counts in polling.get_histograms()["incident"].values()) == 3
+
+
+def test_stops_when_it_fails():
+    outcome = polling.poll("incident", results("creating", "broken", "done"), classify, timeout=5, **FAST)
+    assert (outcome["status"], outcome["attempts"]) == (polling.FAILED, 2)
+
+
+def test_times_out():
+    outcome = polling.poll("incident", results("creating"), classify, timeout=0.05, **FAST)
+    assert outcome["status"] == polling.TIMED_OUT
+    assert outcome["result"] == "creating"
+    assert outcome["seconds"] < 1
+
+
+def test_errors_are_retried():
+    outcome = polling.poll("incident", results(RuntimeError("502"), "done"), classify, timeout=5, **FAST)
+    assert (outcome["status"], outcome["error"], outcome["attempts"]) == (polling.READY, None, 2)
+
+
+def test_only_errors_is_an_error():
+    outcome = polling.poll("incident", results(RuntimeError("502")), classify, timeout=0.05, **FAST)
+    assert outcome["status"] == polling.ERROR
+    assert str(outcome["error"]) == "502"
+
+
+def test_open_breaker_stops_the_poll():
+    fetch = results("creating", circuit.CircuitOpenError("*****", 30), "done")
+    outcome = polling.poll("incident", fetch, classify, timeout=5, **FAST)
+    assert (outcome["status"], outcome["attempts"]) == (polling.ERROR, 2)
+    assert isinstance(outcome["error"], circuit.CircuitOpenError)
+
+
+def test_interrupts_are_not_swallowed():
+    with pytest.raises(KeyboardInterrupt):
+        polling.poll("incident", results(KeyboardInterrupt()), classify, timeout=5, **FAST)
+
+
+def test_stops_before_the_deadline(monkeypatch):
+    monkeypatch.setitem(deadline._current, "deadline", deadline.Deadline(time.monotonic() + 1, reserve=5))
+    outcome = polling.poll("incident", results("done"), classify, timeout=5, **FAST)
+    assert (outcome["status"], outcome["attempts"]) == (polling.TIMED_OUT, 0)
+
+
+def test_histogram_buckets():
+    assert polling.bucket_label(0.2) == "<=0.5s"
+    assert polling.bucket_label(3) == "<=4s"
+    assert polling.bucket_label(100) == ">32s"
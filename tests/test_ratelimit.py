@@ -0,0 +1,123 @@
+from email.utils import formatdate
+import time
+import pytest
+from scripts import deadline, ratelimit  # pylint: disable=import-error
+
+TELQ = "https://api.telqtele.com/v2/tests"
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+@pytest.fixture(autouse=True)
+def fresh_buckets(monkeypatch):
+    """Every test starts with full buckets and no other containers seen"""
+    monkeypatch.setattr(ratelimit, "_buckets", {})
+    monkeypatch.setattr(ratelimit, "_callers", {})
+
+
+def test_bucket_allows_burst_then_waits():
+    bucket = ratelimit.TokenBucket(rate=2, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # The fourth call has to wait for half a second's worth of refill at 2 per second
+    assert 0.4 < bucket.reserve() <= 0.5
+
+
+def test_bucket_refills_over_time():
+    bucket = ratelimit.TokenBucket(rate=1, burst=2)
+    bucket.reserve()
+    bucket.reserve()
+    bucket.updated_at -= 1
+    assert bucket.reserve() == 0.0
+    assert 0.9 < bucket.reserve() <= 1.0
+
+
+def test_bucket_never_holds_more_than_burst():
+    bucket = ratelimit.TokenBucket(rate=1, burst=2)
+    bucket.updated_at -= 60
+    assert [bucket.reserve() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.reserve() > 0
+
+
+def test_bucket_pause_holds_everyone_off():
+    bucket = ratelimit.TokenBucket(rate=1, burst=5)
+    bucket.pause(7)
+    assert 6.9 < bucket.reserve() <= 7.0
+    # A shorter pause doesn't cut the longer one short
+    bucket.pause(2)
+    assert bucket.reserve() > 6.9
+
+
+def test_buckets_are_per_host():
+    assert ratelimit.get_bucket(TELQ) is ratelimit.get_bucket("https://api.telqtele.com/v2/other")
+    assert ratelimit.get_bucket("https://api.*****************.net/rest") is not ratelimit.get_bucket(
+        "https://api.*****************.eu/rest"
+    )
+    assert ratelimit.get_bucket("https://example.com/") is None
+
+
+def test_shared_budget_runs_out_per_window(monkeypatch):
+    monkeypatch.setitem(ratelimit.LIMITS, "test", (1, 2))
+    monkeypatch.setattr(ratelimit, "_now", lambda: 1001.0)
+    assert ratelimit.take_shared("test:example.com", "test") == 0.0
+    assert ratelimit.take_shared("test:example.com", "test") == 0.0
+    # The window (1000-1002) is used up, so wait for the next one, plus some jitter
+    assert 1.0 <= ratelimit.take_shared("test:example.com", "test") <= 2.0
+
+
+def test_shared_budget_is_split_between_containers(monkeypatch):
+    monkeypatch.setitem(ratelimit.LIMITS, "test", (1, 4))
+    monkeypatch.setattr(ratelimit, "_now", lambda: 1001.0)
+    monkeypatch.setattr(ratelimit, "CALLER_ID", "first")
+    assert ratelimit.take_shared("test:example.com", "test") == 0.0
+    monkeypatch.setattr(ratelimit, "CALLER_ID", "second")
+    assert ratelimit.take_shared("test:example.com", "test") == 0.0
+    assert ratelimit.take_shared("test:example.com", "test") == 0.0
+    # Two containers have now been seen, so each gets half of the window's 4 calls
+    assert ratelimit.take_shared("test:example.com", "test") > 0
+    monkeypatch.setattr(ratelimit, "CALLER_ID", "first")
+    assert ratelimit.take_shared("test:example.com", "test") == 0.0
+
+
+def test_falls_back_to_own_bucket_when_the_store_is_down(monkeypatch):
+    def broken(*args):
+        raise RuntimeError("table missing")
+
+    monkeypatch.setattr(ratelimit.state, "take", broken)
+    assert ratelimit.acquire_shared(TELQ, ratelimit.get_bucket(TELQ)) is False
+
+
+def test_retry_delay_ignores_success_and_used_up_retries():
+    assert ratelimit.retry_delay("GET", TELQ, FakeResponse(200), 0) is None
+    assert ratelimit.retry_delay("GET", TELQ, FakeResponse(404), 0) is None
+    assert ratelimit.retry_delay("GET", TELQ, FakeResponse(503), ratelimit.MAX_RETRIES) is None
+
+
+def test_retry_delay_only_repeats_unsafe_methods_on_429(monkeypatch):
+    monkeypatch.setattr(ratelimit, "backoff_delay", lambda attempt: 0.25)
+    assert ratelimit.retry_delay("POST", TELQ, FakeResponse(503), 0) is None
+    assert ratelimit.retry_delay("GET", TELQ, FakeResponse(503), 0) == 0.25
+    assert ratelimit.retry_delay("POST", TELQ, FakeResponse(429), 0) == 0.25
+
+
+def test_retry_delay_honours_retry_after_and_pauses_bucket():
+    assert ratelimit.retry_delay("POST", TELQ, FakeResponse(429, {"Retry-After": "3"}), 0) == 3.0
+    assert 2.9 < ratelimit.get_bucket(TELQ).reserve() <= 3.0
+
+
+def test_retry_after_as_a_date():
+    response = FakeResponse(503, {"Retry-After": formatdate(time.time() + 120, usegmt=True)})
+    assert 118 < ratelimit.retry_after(response) <= 120
+    assert ratelimit.retry_after(FakeResponse(503, {"Retry-After": "soon"})) is None
+
+
+def test_backoff_is_capped():
+    assert all(0 <= ratelimit.backoff_delay(attempt) <= ratelimit.BACKOFF_CAP for attempt in range(20))
+
+
+def test_retry_delay_gives_up_without_time_left(monkeypatch):
+    monkeypatch.setitem(deadline._current, "deadline", deadline.Deadline(time.monotonic() + 4, reserve=1))
+    assert ratelimit.retry_delay("GET", TELQ, FakeResponse(503, {"Retry-After": "10"}), 0) is None
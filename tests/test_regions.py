@@ -0,0 +1,99 @@
+import io
+import json
+import time
+import pytest
+from botocore.exceptions import ClientError, ReadTimeoutError
+from scripts import deadline, regions, resources  # pylint: disable=import-error
+
+
+@pytest.fixture(autouse=True)
+def local_worker(monkeypatch):
+    """An EU worker that runs in-process but still round trips the call through JSON"""
+    monkeypatch.setitem(regions.REGION_WORKERS["EU"], "function", "local")
+    monkeypatch.setattr(regions, "ROUTABLE", regions.ROUTABLE + ["builtins:divmod", "builtins:ValueError"])
+
+
+def test_round_trip_through_json():
+    # The tuple comes back as a JSON list, as it would from the worker lambda
+    assert regions.run("EU", "builtins:divmod", 7, 2) == [3, 1]
+
+
+def test_exceptions_in_results_travel_as_text():
+    assert regions.run("EU", "builtins:ValueError", "boom") == "boom"
+
+
+def test_stacks_without_a_worker_run_in_process():
+    assert regions.run("US", "builtins:divmod", 7, 2) == (3, 1)
+
+
+def test_only_routable_targets_are_sent():
+    assert regions.run("EU", "builtins:max", 1, 2) == 2
+    with pytest.raises(ValueError):
+        regions.handle({"target": "builtins:max", "args": [1, 2]})
+
+
+class FakeLambda:
+    """Lambda client whose invoke answers with the given outcome, recording every call"""
+
+    def __init__(self, outcome):
+        self.outcome = outcome
+        self.calls = []
+
+    def invoke(self, **kwargs):
+        self.calls.append(kwargs)
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return {"Payload": io.BytesIO(json.dumps(self.outcome).encode())}
+
+
+@pytest.fixture
+def remote_worker(monkeypatch):
+    """An EU worker behind a fake lambda client. Returns the timeouts the client was asked for."""
+    monkeypatch.setitem(regions.REGION_WORKERS["EU"], "function", "autobot-eu-worker")
+    timeouts = []
+
+    def use(client):
+        def get_lambda_client(region_name, read_timeout):
+            timeouts.append(read_timeout)
+            return client
+
+        monkeypatch.setattr(resources, "get_lambda_client", get_lambda_client)
+        return client
+
+    use.timeouts = timeouts
+    return use
+
+
+def test_remote_results(remote_worker):
+    client = remote_worker(FakeLambda({"result": [3, 1]}))
+    assert regions.run("EU", "builtins:divmod", 7, 2) == [3, 1]
+    assert json.loads(client.calls[0]["Payload"]) == {"region_call": {"target": "builtins:divmod", "args": [7, 2]}}
+    assert remote_worker.timeouts == [regions.WORKER_TIMEOUT]
+
+
+def test_read_timeout_follows_the_deadline(remote_worker, monkeypatch):
+    monkeypatch.setitem(deadline._current, "deadline", deadline.Deadline(time.monotonic() + 100))
+    remote_worker(FakeLambda({"result": None}))
+    regions.run("EU", "builtins:divmod", 7, 2)
+    assert remote_worker.timeouts == [90]
+
+
+def test_no_answer_is_an_unknown_outcome(remote_worker, monkeypatch):
+    client = remote_worker(FakeLambda(ReadTimeoutError(endpoint_url="https://lambda")))
+    ran_locally = []
+    monkeypatch.setattr(regions, "resolve", lambda target: lambda *args: ran_locally.append(args))
+    with pytest.raises(regions.RegionCallUnknownError):
+        regions.run("EU", "scripts.smsprimary:swap_routes", "IN", "EU")
+    assert len(client.calls) == 1
+    assert ran_locally == []
+
+
+def test_unreachable_worker(remote_worker, monkeypatch):
+    remote_worker(FakeLambda(ClientError({"Error": {"Code": "TooManyRequestsException"}}, "Invoke")))
+    ran_locally = []
+    monkeypatch.setattr(regions, "resolve", lambda target: lambda *args: ran_locally.append(target))
+    with pytest.raises(regions.RegionCallError):
+        regions.run("EU", "scripts.smsprimary:swap_routes", "IN", "EU")
+    # Lookups are safe to run here instead
+    regions.run("EU", "scripts.smsprimary:find_routes", "IN", "EU")
+    assert ran_locally == ["scripts.smsprimary:find_routes"]
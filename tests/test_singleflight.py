@@ -0,0 +1,84 @@
+import pytest
+from scripts import singleflight, state  # pylint: disable=import-error
+
+
+class FakeSay:
+    def __init__(self):
+        self.said = []
+
+    def __call__(self, text):
+        self.said.append(text)
+
+
+def test_leader_runs_and_releases():
+    say = FakeSay()
+    calls = []
+    singleflight.run("C1", ("test", "sms"), "U1", say, lambda: calls.append("U1"))
+    singleflight.run("C1", ("test", "sms"), "U2", say, lambda: calls.append("U2"))
+    assert calls == ["U1", "U2"]
+    assert say.said == []
+    assert state.get(singleflight.flight_key("C1", ("test", "sms"))) is None
+
+
+def test_identical_request_joins_the_running_one():
+    say = FakeSay()
+    calls = []
+
+    def leader():
+        calls.append("U1")
+        # Someone asks for the same thing while this is running
+        singleflight.run("C1", ("test", "sms"), "U2", say, lambda: calls.append("U2"))
+
+    singleflight.run("C1", ("test", "sms"), "U1", say, leader)
+    assert calls == ["U1"]
+    assert "<@U2>, <@U1> is already running that" in say.said[0]
+    assert say.said[1].startswith("<@U2> you asked for the same thing")
+
+
+def test_different_channel_or_arguments_run_separately():
+    say = FakeSay()
+    calls = []
+
+    def leader():
+        calls.append("leader")
+        singleflight.run("C2", ("test", "sms"), "U2", say, lambda: calls.append("other channel"))
+        singleflight.run("C1", ("test", "voice"), "U3", say, lambda: calls.append("other arguments"))
+
+    singleflight.run("C1", ("test", "sms"), "U1", say, leader)
+    assert calls == ["leader", "other channel", "other arguments"]
+
+
+def test_failed_run_still_releases_the_lock():
+    def leader():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        singleflight.run("C1", ("test", "sms"), "U1", FakeSay(), leader)
+    assert state.get(singleflight.flight_key("C1", ("test", "sms"))) is None
+
+
+def test_joiners_are_told_to_retry_after_a_failed_run():
+    say = FakeSay()
+
+    def leader():
+        singleflight.run("C1", ("test", "sms"), "U2", say, lambda: None)
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        singleflight.run("C1", ("test", "sms"), "U1", say, leader)
+    assert "<@U2>" in say.said[1]
+    assert "failed before finishing. Please try your request again." in say.said[1]
+    # and the retry runs as the new leader
+    calls = []
+    singleflight.run("C1", ("test", "sms"), "U2", say, lambda: calls.append("U2"))
+    assert calls == ["U2"]
+
+
+def test_runs_anyway_when_the_store_is_down(monkeypatch):
+    def broken(*args):
+        raise RuntimeError("table missing")
+
+    monkeypatch.setattr(state, "put_if_absent", broken)
+    calls = []
+    singleflight.run("C1", ("test", "sms"), "U1", FakeSay(), lambda: calls.append("U1"))
+    assert calls == ["U1"]
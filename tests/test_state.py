@@ -0,0 +1,64 @@
+from scripts import state  # pylint: disable=import-error
+
+
+def test_put_if_absent_claims_once():
+    assert state.put_if_absent("key", {"status": "claimed"}, 60) is True
+    assert state.put_if_absent("key", {"status": "second"}, 60) is False
+    assert state.get("key")["status"] == "claimed"
+
+
+def test_expired_items_count_as_absent():
+    assert state.put_if_absent("key", {"status": "old"}, -1) is True
+    assert state.get("key") is None
+    assert state.put_if_absent("key", {"status": "new"}, 60) is True
+    assert state.get("key")["status"] == "new"
+
+
+def test_put_replaces_and_delete_removes():
+    state.put("key", {"value": 1}, 60)
+    state.put("key", {"value": 2}, 60)
+    assert state.get("key")["value"] == 2
+    assert state.delete("key")["value"] == 2
+    assert state.get("key") is None
+    assert state.delete("key") is None
+
+
+def test_update_needs_an_unexpired_item():
+    assert state.update("key", {"value": 1}) is None
+    state.put("key", {"value": 1, "other": "kept"}, 60)
+    assert state.update("key", {"value": 2}) == dict(state.get("key"), value=2, other="kept")
+    state.put("old", {"value": 1}, -1)
+    assert state.update("old", {"value": 2}) is None
+
+
+def test_add_to_set_needs_an_unexpired_item():
+    assert state.add_to_set("key", "joiners", "U1") is None
+    state.put("key", {"leader": "U0"}, 60)
+    state.add_to_set("key", "joiners", "U1")
+    assert state.add_to_set("key", "joiners", "U1")["joiners"] == {"U1"}
+    assert state.add_to_set("key", "joiners", "U2")["joiners"] == {"U1", "U2"}
+    state.put("old", {"leader": "U0"}, -1)
+    assert state.add_to_set("old", "joiners", "U1") is None
+
+
+def test_take_counts_against_both_limits():
+    assert state.take("window", 3, "a", 2, 60)["used"] == 1
+    assert state.take("window", 3, "a", 2, 60)["m_a"] == 2
+    # "a" has had its share
+    assert state.take("window", 3, "a", 2, 60) is None
+    assert state.take("window", 3, "b", 2, 60)["used"] == 3
+    # and the window is used up
+    assert state.take("window", 3, "c", 2, 60) is None
+
+
+def test_take_starts_over_once_expired():
+    state.take("window", 1, "a", 1, -1)
+    assert state.take("next", 1, "a", 1, 60) is not None
+    # Expired counters are cleared out as new ones come along
+    assert "window" not in state._local
+
+
+def test_table_keys_never_collide_with_incident_ids():
+    assert state.table_key("event:1") < 0
+    assert state.table_key("event:1") == state.table_key("event:1")
+    assert state.table_key("event:1") != state.table_key("event:2")
@@ -0,0 +1,61 @@
+import pytest
+
+NETWORKS = [
+    {"providerName": "Vodafone UK", "mcc": "234", "mnc": "15"},
+    {"providerName": "EE (Everything Everywhere)", "mcc": "234", "mnc": "30"},
+    {"providerName": "Telefonica O2 UK", "mcc": "234", "mnc": "10"},
+    {"providerName": "Three UK", "mcc": "234", "mnc": "20"},
+]
+
+
+@pytest.fixture
+def telq(fake_secrets, monkeypatch):
+    from scripts import telq as module  # pylint: disable=import-error,import-outside-toplevel
+
+    monkeypatch.setattr(module, "_index_cache", {})
+    monkeypatch.setattr(module, "_catalog_cache", {"networks": None, "fetched_at": None})
+    return module
+
+
+def names(networks):
+    return [network["providerName"] for network in networks]
+
+
+def test_empty_query_lists_everything_in_name_order(telq):
+    index = telq.NetworkIndex(NETWORKS)
+    assert names(index.search("")) == ["EE (Everything Everywhere)", "Telefonica O2 UK", "Three UK", "Vodafone UK"]
+    assert len(index.search("", limit=2)) == 2
+
+
+def test_search_matches_word_prefixes(telq):
+    index = telq.NetworkIndex(NETWORKS)
+    assert names(index.search("voda")) == ["Vodafone UK"]
+    assert names(index.search("every")) == ["EE (Everything Everywhere)"]
+    assert names(index.search("T")) == ["Telefonica O2 UK", "Three UK"]
+
+
+def test_every_word_has_to_match(telq):
+    index = telq.NetworkIndex(NETWORKS)
+    assert names(index.search("uk three")) == ["Three UK"]
+    assert index.search("vodafone three") == []
+
+
+def test_search_by_mcc_and_mnc(telq):
+    index = telq.NetworkIndex(NETWORKS)
+    assert len(index.search("234")) == 4
+    assert names(index.search("23420")) == ["Three UK"]
+
+
+def test_words_longer_than_the_index_are_checked_in_full(telq):
+    index = telq.NetworkIndex(NETWORKS)
+    assert names(index.search("telefonica")) == ["Telefonica O2 UK"]
+    assert index.search("telefonicax") == []
+
+
+def test_type_ahead_reads_the_shared_store(telq):
+    assert telq.network_options({"block_id": "networks:GB", "value": "three"}) == []
+    telq.share_country_networks("GB", NETWORKS)
+    # Another container, with nothing in memory
+    telq._index_cache.clear()
+    options = telq.network_options({"block_id": "networks:GB", "value": "three"})
+    assert options == [{"text": {"type": "plain_text", "text": "Three UK", "emoji": True}, "value": "23420"}]
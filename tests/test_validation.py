@@ -0,0 +1,29 @@
+from scripts import validation  # pylint: disable=import-error
+
+BOT = "<@*****************>"
+
+
+def test_telq_options():
+    assert validation.telq_options([BOT, "telq", "us", "in"], "U1") is None
+    assert "*exactly 2*" in validation.telq_options([BOT, "telq", "us"], "U1")
+    assert "*2* letters" in validation.telq_options([BOT, "telq", "us", "ind"], "U1")
+    assert "Production stack" in validation.telq_options([BOT, "telq", "ap", "in"], "U1")
+
+
+def test_primary_options():
+    assert validation.primary_options([BOT, "primary", "EU", "GB"], "U1") is None
+    assert "stage" in validation.primary_options([BOT, "primary", "stg", "GB"], "U1")
+    assert "invalid application stack" in validation.primary_options([BOT, "primary", "ap", "GB"], "U1")
+
+
+def test_primary_switch_options():
+    assert validation.primary_switch_options([BOT, "primary", "switch", "us", "in"], "U1") is None
+    assert "wrong number" in validation.primary_switch_options([BOT, "primary", "switch", "us"], "U1")
+    assert "stage" in validation.primary_switch_options([BOT, "primary", "switch", "stg", "in"], "U1")
+
+
+def test_boarding_options():
+    assert validation.onboard_options([BOT, "onboard", "billie", "jean"], "U1") is None
+    assert "wrong number" in validation.offboard_options([BOT, "offboard", "billie"], "U1")
+    assert "trouble deciphering" in validation.onboard_options([BOT, "onboard", "billie", "jean", "billie"], "U1")
+    assert "`@AutoBot offboard" in validation.offboard_options([BOT, "offboard"], "U1")
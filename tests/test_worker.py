@@ -0,0 +1,35 @@
+import json
+import pytest
+from scripts import jobs  # pylint: disable=import-error
+
+
+@pytest.fixture
+def worker(fake_secrets):
+    import worker as module  # pylint: disable=import-error,import-outside-toplevel
+
+    return module
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """The (receipt, delay) of every retry_later call"""
+    calls = []
+    monkeypatch.setattr(jobs, "retry_later", lambda receipt, delay: calls.append((receipt, delay)))
+    return calls
+
+
+def sqs_record(message_id, job_type, receive_count):
+    """A record as SQS hands it to the lambda"""
+    return {
+        "messageId": message_id,
+        "receiptHandle": f"receipt-{message_id}",
+        "body": json.dumps({"id": message_id, "type": job_type}),
+        "attributes": {"ApproximateReceiveCount": str(receive_count)},
+    }
+
+
+def test_failed_jobs_are_retried_after_their_delay(worker, delays, monkeypatch):
+    monkeypatch.setattr(jobs, "process", lambda job, attempt: job["type"] == "rollout")
+    event = {"Records": [sqs_record("m1", "rollout", 1), sqs_record("m2", "update", 2)]}
+    assert worker.handler(event, None) == {"batchItemFailures": [{"itemIdentifier": "m2"}]}
+    assert delays == [("receipt-m2", jobs.RETRY_DELAY * 2)]
@@ -0,0 +1,87 @@
+"""Runs queued AutoBot jobs (see scripts/jobs.py).
+
+As a lambda, subscribed to the SQS job queue with ReportBatchItemFailures enabled:
+    handler: worker.handler
+As a long lived process polling the configured queue (SQS or SQLite):
+    AUTOBOT_JOB_BACKEND=sqlite python worker.py --workers 4
+"""
+import argparse
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from scripts import deadline, jobs, resources, warmup  # pylint: disable=import-error
+from scripts.get_secret import get_secret  # pylint: disable=import-error
+
+# Need to have secrets available before any other execution happens.
+secrets = get_secret()
+
+# Upper bound on jobs running at once in one worker. Each job mostly waits on upstream APIs.
+WORKERS = int(os.environ.get("AUTOBOT_WORKERS", "4"))
+
+
+def handler(event, context):
+    """Handler for AWS lambda, fed batches of jobs by SQS. Jobs to be retried are hidden for
+    jobs.RETRY_DELAY seconds per attempt and reported back as batch item failures, so SQS hands them out
+    again once that runs out."""
+    if warmup.is_warmup_event(event):
+        print("Received warm-up ping")
+        return warmup.WARMUP_RESPONSE
+    deadline.start(context)
+    records = event.get("Records", [])
+
+    def run(record):
+        attempt = int(record["attributes"]["ApproximateReceiveCount"])
+        done = jobs.process(json.loads(record["body"]), attempt)
+        if done is False:
+            try:
+                jobs.retry_later(record["receiptHandle"], jobs.RETRY_DELAY * attempt)
+            except BaseException as err:
+                # Still retried, just as soon as the queue's own visibility timeout runs out
+                print(f"Unable to delay the retry of {record['messageId']}:\n{err}")
+        return done
+
+    with ThreadPoolExecutor(max_workers=max(min(len(records), WORKERS), 1)) as executor:
+        results = list(executor.map(run, records))
+    failures = [record["messageId"] for record, done in zip(records, results) if done is False]
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failures]}
+
+
+def work(workers: int) -> None:
+    """Polls the queue forever, keeping up to `workers` jobs running"""
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="autobot-job") as executor:
+        running = set()
+
+        def run(job, attempt, receipt):
+            try:
+                if jobs.process(job, attempt) is True:
+                    jobs.complete(receipt)
+                else:
+                    jobs.retry_later(receipt, jobs.RETRY_DELAY * attempt)
+            except BaseException as err:
+                # Left on the queue, so it's handed out again after the visibility timeout
+                print(f"Unable to finish {job['type']} job {job['id']}:\n{err}")
+
+        while True:
+            running = {future for future in running if not future.done()}
+            free = workers - len(running)
+            if free == 0:
+                # Wait for one of the running jobs to finish before taking more
+                wait(running, return_when=FIRST_COMPLETED)
+                continue
+            for job, attempt, receipt in jobs.receive(free):
+                running.add(executor.submit(run, job, attempt, receipt))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+    if jobs.enabled() is False:
+        parser.error("No job queue configured, set AUTOBOT_JOB_BACKEND to sqs or sqlite")
+    resources.get_web_client()
+    print(f"Starting AutoBot job worker ({jobs.BACKEND}) with {args.workers} workers")
+    work(args.workers)
+
+
+if __name__ == "__main__":
+    main()